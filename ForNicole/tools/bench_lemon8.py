@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the Lemon8 crawler.
+
+    python bench_lemon8.py extract debug/*.html
+    python bench_lemon8.py extract --synthetic 300
+    python bench_lemon8.py replay --dir debug --json bench.json
+    python bench_lemon8.py write --rows 50000 --per-post 40
+    python bench_lemon8.py rules --n 1000000 [--rules rules.json]
+    python bench_lemon8.py stream --posts 40 --per-post 500 --collect --max-rss-mb 400
+
+``extract`` loads each HTML fixture with ``page.set_content`` (no network)
+and compares the single-evaluate bulk extraction with the per-locator path.
+With no fixtures it falls back to the snapshots in debug/.
+
+``replay`` runs the crawler stages against every page recorded in
+debug/manifest.jsonl (see ``--snapshot`` in monitor_lemon8.py), served
+through l8_replay, and reports wall time, CDP calls, comments/s and peak
+RSS per stage.
+
+``write`` stores synthetic comment rows in a scratch DB twice: one
+``upsert_comments`` call per post (the old per-post path) and through the
+l8_store background writer, and reports rows/s for each.
+
+``rules`` scores a synthetic corpus with the compiled l8_rules engine and
+with one regex search per rule (and ``rules.rule_score`` on a sample), and
+prints texts/s plus the top per-rule hit counts.
+
+``stream`` runs ``crawl_profile`` over replayed pages (a synthetic profile
+linking ``--posts`` posts of ``--per-post`` comments, or ``--dir`` with
+``--profile-url`` for recorded snapshots) with the rows streamed to the
+background writer through ``on_rows``.  ``--collect`` also runs the
+collect-everything path, whose rows then go through the same writer in
+the same ROW_BATCH chunks, so both modes do the same DB work.  Each mode
+runs in its own process and reports wall time, rows/s and the growth of
+that Python process's peak RSS (the browser runs in separate processes).
+With ``--max-rss-mb`` it exits non-zero when the streamed peak goes over.
+This is a manual gate: CI only byte-compiles the tree (no Chromium), so
+run it before merging changes to the crawl or write path.
+"""
+import argparse
+import glob
+import json
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from playwright.sync_api import sync_playwright
+
+import monitor_lemon8 as m8
+from db import connect, upsert_comments
+from l8_metrics import CallCounter, Counted
+from l8_replay import ReplayBrowser, ReplayStore, record_snapshot
+from l8_rules import RuleEngine
+from l8_store import BatchWriter
+
+
+# ---------- Fixtures ----------
+def synthetic_post_html(n_comments: int, replies_every: int = 5) -> str:
+    items = []
+    for i in range(n_comments):
+        replies = ""
+        if replies_every and i % replies_every == 0:
+            replies = (
+                '<div class="comment-reply-list">'
+                f'<div class="article-comment-item"><span class="author">reply_user{i}</span>'
+                f'<p>reply to comment {i}</p><time datetime="2024-01-01T00:00:{i % 60:02d}Z">1d</time></div>'
+                '</div>'
+            )
+        items.append(
+            '<div class="article-comment-item-wrapper">'
+            f'<div class="article-comment-item"><span class="author">user{i}</span>'
+            f'<p>comment number {i} with some text</p>'
+            f'<time datetime="2024-01-01T00:00:{i % 60:02d}Z">1d</time></div>{replies}</div>'
+        )
+    return (
+        "<html><head><title>synthetic post</title></head><body>"
+        f"<section class='comment-list'>{''.join(items)}</section></body></html>"
+    )
+
+
+def load_fixtures(paths: List[str], synthetic: int):
+    fixtures = []
+    for p in paths or sorted(glob.glob("debug/*.html")):
+        with open(p, encoding="utf-8") as f:
+            fixtures.append((p, f.read()))
+    if synthetic or not fixtures:
+        n = synthetic or 300
+        fixtures.append((f"synthetic-{n}", synthetic_post_html(n)))
+    return fixtures
+
+
+# ---------- Timing ----------
+def time_it(fn: Callable, repeat: int):
+    samples, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), result
+
+
+def peak_rss_mb(children: bool = True) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS; covers this process plus (optionally) reaped children
+    scale = 1 / (1024 * 1024) if sys.platform == "darwin" else 1 / 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if children else 0
+    return round(max(own, kids) * scale, 1)
+
+
+class StageStats:
+    def __init__(self):
+        self.rows: List[Dict] = []
+
+    def run(self, counter: CallCounter, page_label: str, stage: str, fn: Callable, count_items=None):
+        before = counter.calls
+        t0 = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - t0
+        n = count_items(result) if count_items else None
+        self.rows.append({
+            "page": page_label, "stage": stage,
+            "wall_ms": round(wall * 1000, 1),
+            "cdp_calls": counter.calls - before,
+            "items": n,
+            "items_per_s": round(n / wall, 1) if n and wall else None,
+            "peak_rss_mb": peak_rss_mb(),
+        })
+        return result
+
+    def print_table(self):
+        print(f"{'page':32} {'stage':18} {'wall ms':>9} {'cdp':>6} {'items':>6} {'items/s':>9} {'rss MB':>8}")
+        for r in self.rows:
+            print(f"{r['page'][-32:]:32} {r['stage']:18} {r['wall_ms']:9.1f} {r['cdp_calls']:6d} "
+                  f"{'' if r['items'] is None else r['items']:>6} "
+                  f"{'' if r['items_per_s'] is None else r['items_per_s']:>9} {r['peak_rss_mb']:8.1f}")
+
+
+# ---------- Benchmarks ----------
+def bench_extract(args):
+    fixtures = load_fixtures(args.html, args.synthetic)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_context(**m8.context_options()).new_page()
+        print(f"{'fixture':40} {'bulk n':>7} {'bulk ms':>9} {'loc n':>7} {'loc ms':>9} {'speedup':>8}")
+        for name, html in fixtures:
+            page.set_content(html, wait_until="domcontentloaded")
+            bulk_s, bulk = time_it(lambda: m8.extract_comments_bulk(page), args.repeat)
+            loc_s, loc = time_it(lambda: m8.extract_comments_per_locator(page), args.repeat)
+            speedup = loc_s / bulk_s if bulk_s else float("inf")
+            print(f"{name[-40:]:40} {len(bulk):7d} {bulk_s * 1000:9.1f} "
+                  f"{len(loc):7d} {loc_s * 1000:9.1f} {speedup:7.1f}x")
+        browser.close()
+
+
+def bench_replay(args):
+    store = ReplayStore(args.dir, keep_scripts=args.keep_scripts)
+    if not len(store):
+        print(f"No snapshots in {args.dir}/manifest.jsonl; crawl with --snapshot first.")
+        return
+    log = m8.get_logger("WARNING")
+    stats = StageStats()
+    with sync_playwright() as p:
+        browser = ReplayBrowser(p.chromium.launch(headless=True), store)
+        for entry in store.entries.values():
+            ctx = m8.make_context(browser)
+            counter = CallCounter()
+            page = Counted(ctx.new_page(), counter)
+            m8.install_appwall_blockers(ctx, page, log)
+            label = entry["html"]
+            stats.run(counter, label, "goto", lambda: page.goto(entry["url"], wait_until="domcontentloaded"))
+            if entry.get("label", "").endswith("post-links") or entry.get("label") == "profile":
+                stats.run(counter, label, "harvest_links",
+                          lambda: m8.get_post_links_from_profile(page, args.max_posts, log), len)
+            else:
+                stats.run(counter, label, "load_more_comments", lambda: m8.load_more_comments(page))
+                stats.run(counter, label, "expand_all_comments", lambda: m8.expand_all_comments(page))
+                stats.run(counter, label, "extract_comments",
+                          lambda: m8.extract_comments(page), lambda r: len(r[1]))
+            ctx.close()
+        browser.close()
+    stats.print_table()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(stats.rows, f, indent=2)
+
+
+def synthetic_rows(n: int, per_post: int) -> List[List[Dict]]:
+    posts, rows = [], []
+    for i in range(n):
+        rows.append({
+            "id": f"c{i}", "post_url": f"https://www.lemon8-app.com/@u/{i // per_post}",
+            "post_title": "synthetic", "author": f"user{i % 997}", "text": f"comment number {i} " * 4,
+            "scraped_at": f"2024-01-{1 + i % 28:02d}T00:00:00", "model_scores": None,
+            "rule_score": float(i % 5), "flagged": int(i % 11 == 0),
+        })
+        if len(rows) == per_post:
+            posts.append(rows)
+            rows = []
+    if rows:
+        posts.append(rows)
+    return posts
+
+
+def bench_write(args):
+    posts = synthetic_rows(args.rows, args.per_post)
+    log = m8.get_logger("WARNING")
+    with tempfile.TemporaryDirectory() as tmp:
+        old_db = str(Path(tmp) / "per_post.sqlite")
+        conn = connect(old_db)
+        t0 = time.perf_counter()
+        for rows in posts:
+            upsert_comments(conn, rows)
+        old_s = time.perf_counter() - t0
+        conn.close()
+
+        new_db = str(Path(tmp) / "batched.sqlite")
+        t0 = time.perf_counter()
+        with BatchWriter(new_db, log, args.batch_rows, args.interval) as writer:
+            for rows in posts:
+                writer.put(rows)
+        new_s = time.perf_counter() - t0
+
+    print(f"{'path':24} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+    print(f"{'upsert_comments/post':24} {args.rows:8d} {old_s:9.2f} {args.rows / old_s:10.0f}")
+    print(f"{'BatchWriter':24} {writer.rows_written:8d} {new_s:9.2f} {writer.rows_written / new_s:10.0f}"
+          f"   ({writer.commits} commits)")
+
+
+WORDS = ("love this look so cute where did you get it great post thanks for sharing the "
+         "color is amazing omg need this my skin would never honestly kind of meh").split()
+
+
+def synthetic_rules(n_keyword_rules: int = 50, words_per_rule: int = 20, n_regex: int = 10) -> Dict:
+    rng = random.Random(7)
+    rules = []
+    for i in range(n_keyword_rules):
+        kws = [f"bad{i}x{j}" for j in range(words_per_rule - 1)] + [f"slur{i}"]
+        rules.append({"name": f"kw{i}", "keywords": kws, "weight": rng.choice([1, 2, 3])})
+    for i in range(n_regex):
+        rules.append({"name": f"rx{i}", "regex": rf"(?:dm|message) me .{{0,20}}promo{i}\b", "weight": 2, "cap": 1})
+    return {"rules": rules}
+
+
+def synthetic_corpus(n: int, spec: Dict, hit_rate: float = 0.05) -> List[str]:
+    rng = random.Random(11)
+    kws = [k for r in spec["rules"] for k in r.get("keywords", ())]
+    out = []
+    for _ in range(n):
+        words = rng.choices(WORDS, k=rng.randint(4, 24))
+        if kws and rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(kws))
+        out.append(" ".join(words))
+    return out
+
+
+def bench_rules(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.rules
+        if not path:
+            path = str(Path(tmp) / "rules.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(synthetic_rules(), f)
+        engine = RuleEngine(path)
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    spec = spec if isinstance(spec, dict) else {"rules": spec}
+    texts = synthetic_corpus(args.n, spec)
+    print(f"{len(engine.compiled.rules)} rules, {len(texts)} texts")
+
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), args.batch):
+        engine.score_batch(texts[i:i + args.batch])
+    compiled_s = time.perf_counter() - t0
+
+    # one compiled regex per rule, searched separately (what a rule loop does)
+    per_rule = []
+    for r in spec["rules"]:
+        pat = r.get("regex") or r"\b(?:" + "|".join(map(re.escape, r["keywords"])) + r")\b"
+        per_rule.append((re.compile(pat, re.I), r.get("weight", 1.0)))
+    sample = texts[:args.baseline_sample]
+    t0 = time.perf_counter()
+    for t in sample:
+        sum(w * len(rx.findall(t)) for rx, w in per_rule)
+    loop_s = time.perf_counter() - t0
+
+    print(f"{'path':28} {'texts':>9} {'seconds':>9} {'texts/s':>11}")
+    print(f"{'compiled alternation':28} {len(texts):9d} {compiled_s:9.2f} {len(texts) / compiled_s:11.0f}")
+    print(f"{'regex per rule':28} {len(sample):9d} {loop_s:9.2f} {len(sample) / loop_s:11.0f}")
+    try:
+        from rules import rule_score
+        t0 = time.perf_counter()
+        for t in sample:
+            rule_score(t)
+        base_s = time.perf_counter() - t0
+        print(f"{'rules.rule_score':28} {len(sample):9d} {base_s:9.2f} {len(sample) / base_s:11.0f}")
+    except ImportError:
+        pass
+    print(f"top hits: {engine.summary()['top_hits']}")
+
+
+BENCH_PROFILE = "https://www.lemon8-app.com/@bench"
+
+
+def write_stream_fixtures(out: Path, posts: int, per_post: int) -> str:
+    """A profile page linking `posts` synthetic posts, recorded for ReplayStore; returns the profile URL."""
+    out.mkdir(parents=True, exist_ok=True)
+    links = "".join(f'<a href="{BENCH_PROFILE}/post/{i}">post {i}</a>' for i in range(posts))
+    pages = [(BENCH_PROFILE, "profile", f"<html><head><title>bench</title></head><body>{links}</body></html>")]
+    pages += [(f"{BENCH_PROFILE}/post/{i}", "post", synthetic_post_html(per_post)) for i in range(posts)]
+    for i, (url, label, html) in enumerate(pages):
+        path = out / f"bench-{i:05d}.html"
+        path.write_text(html, encoding="utf-8")
+        record_snapshot(out, url, label, path, "bench")
+    return BENCH_PROFILE
+
+
+def run_stream_mode(args) -> Dict:
+    """One crawl of args.profile_url over the replay dir, in this process; rows end up in a scratch DB."""
+    cfg = m8.load_env()
+    cfg.update({"USE_DETOX": False, "RULES_FILE": None, "ROW_BATCH": args.row_batch,
+                "METRICS_FILE": None, "PROM_FILE": None, "MAX_POSTS": args.posts,
+                "STATE_FETCH": False, "SNAPSHOT_PAGES": False, "SCROLL_WAIT_MS": args.scroll_wait_ms})
+    m8.jitter_sleep = lambda *a, **k: None  # replayed pages: no politeness delay between posts
+    log = m8.get_logger("WARNING")
+    store = ReplayStore(args.dir)
+    with tempfile.TemporaryDirectory() as tmp, sync_playwright() as p:
+        browser = ReplayBrowser(p.chromium.launch(headless=True), store)
+        base = peak_rss_mb(children=False)
+        t0 = time.perf_counter()
+        with BatchWriter(str(Path(tmp) / "stream.sqlite"), log, args.batch_rows, 2.0, args.queue) as writer:
+            if args.mode == "streamed":
+                m8.crawl_profile(cfg, browser, args.profile_url, log, on_rows=writer)
+            else:
+                # the pre-streaming shape: every row held until the crawl ends, then the same writes
+                rows = m8.crawl_profile(cfg, browser, args.profile_url, log)
+                for i in range(0, len(rows), args.row_batch):
+                    writer.put(rows[i:i + args.row_batch])
+        elapsed = time.perf_counter() - t0
+        browser.close()
+    return {"mode": args.mode, "rows": writer.rows_written, "seconds": round(elapsed, 2),
+            "rows_per_s": round(writer.rows_written / elapsed) if elapsed else None,
+            "peak_mb": peak_rss_mb(children=False), "peak_growth_mb": round(peak_rss_mb(children=False) - base, 1),
+            "replay_misses": store.misses}
+
+
+def bench_stream(args):
+    if args.mode:
+        print(json.dumps(run_stream_mode(args)))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            if not args.profile_url:
+                sys.exit("--dir needs --profile-url (a profile page recorded in that dir)")
+            fixtures, profile_url = args.dir, args.profile_url
+        else:
+            fixtures, profile_url = tmp, write_stream_fixtures(Path(tmp), args.posts, args.per_post)
+        results = []
+        for mode in ["streamed"] + (["collected"] if args.collect else []):
+            # own process per mode: ru_maxrss only ever grows
+            cmd = [sys.executable, __file__, "stream", "--mode", mode, "--dir", fixtures,
+                   "--profile-url", profile_url, "--posts", str(args.posts),
+                   "--row-batch", str(args.row_batch), "--batch-rows", str(args.batch_rows),
+                   "--queue", str(args.queue), "--scroll-wait-ms", str(args.scroll_wait_ms)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+    print(f"{'path':12} {'rows':>10} {'seconds':>9} {'rows/s':>9} {'peak MB':>9} {'peak +MB':>9}")
+    for r in results:
+        print(f"{r['mode']:12} {r['rows']:10d} {r['seconds']:9.2f} {r['rows_per_s'] or 0:9d} "
+              f"{r['peak_mb']:9.1f} {r['peak_growth_mb']:9.1f}")
+    if any(r["replay_misses"] for r in results):
+        print(f"replay misses: {[r['replay_misses'] for r in results]} (pages not in the snapshot dir)")
+    stream_peak = results[0]["peak_mb"]
+    if args.max_rss_mb and stream_peak > args.max_rss_mb:
+        print(f"peak RSS {stream_peak} MB over the {args.max_rss_mb} MB ceiling")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lemon8 crawler micro-benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("extract", help="bulk vs per-locator comment extraction")
+    ex.add_argument("html", nargs="*", help="HTML fixtures (default: debug/*.html)")
+    ex.add_argument("--synthetic", type=int, default=0, help="also bench a generated post with N comments")
+    ex.add_argument("--repeat", type=int, default=5)
+    ex.set_defaults(func=bench_extract)
+
+    rp = sub.add_parser("replay", help="per-stage timings over replayed debug/ snapshots")
+    rp.add_argument("--dir", default="debug", help="snapshot dir with manifest.jsonl")
+    rp.add_argument("--max-posts", type=int, default=12)
+    rp.add_argument("--keep-scripts", action="store_true", help="keep executable <script> tags")
+    rp.add_argument("--json", help="also write the results to this file")
+    rp.set_defaults(func=bench_replay)
+
+    wr = sub.add_parser("write", help="rows/s: per-post upsert_comments vs the batched writer")
+    wr.add_argument("--rows", type=int, default=50000)
+    wr.add_argument("--per-post", type=int, default=40, help="rows handed over per post")
+    wr.add_argument("--batch-rows", type=int, default=500)
+    wr.add_argument("--interval", type=float, default=2.0)
+    wr.set_defaults(func=bench_write)
+
+    ru = sub.add_parser("rules", help="texts/s: compiled rule engine vs a per-rule loop")
+    ru.add_argument("--n", type=int, default=1_000_000, help="synthetic comments")
+    ru.add_argument("--rules", help="rules JSON (default: 50 keyword + 10 regex synthetic rules)")
+    ru.add_argument("--batch", type=int, default=5000)
+    ru.add_argument("--baseline-sample", type=int, default=100_000,
+                    help="texts scored by the slower baselines")
+    ru.set_defaults(func=bench_rules)
+
+    st = sub.add_parser("stream", help="peak RSS of a replayed profile crawl streamed to the writer vs collected")
+    st.add_argument("--posts", type=int, default=40, help="synthetic posts (also MAX_POSTS)")
+    st.add_argument("--per-post", type=int, default=500, help="comments per synthetic post")
+    st.add_argument("--dir", help="recorded snapshot dir instead of synthetic pages (needs --profile-url)")
+    st.add_argument("--profile-url", help="profile page recorded in --dir")
+    st.add_argument("--scroll-wait-ms", type=int, default=300, help="SCROLL_WAIT_MS (pages are local)")
+    st.add_argument("--row-batch", type=int, default=200, help="ROW_BATCH")
+    st.add_argument("--batch-rows", type=int, default=500, help="writer rows per transaction")
+    st.add_argument("--queue", type=int, default=64, help="writer queue depth (batches)")
+    st.add_argument("--max-rss-mb", type=float, default=0, help="fail when peak RSS exceeds this")
+    st.add_argument("--collect", action="store_true", help="also run the collect-all-rows path")
+    st.add_argument("--mode", choices=["streamed", "collected"], help=argparse.SUPPRESS)
+    st.set_defaults(func=bench_stream)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
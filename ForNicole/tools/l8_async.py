@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+"""
+Concurrent Lemon8 crawler built on Playwright's async API.
+
+Same extraction logic as monitor_lemon8.py, but posts are crawled in
+parallel over a pool of reusable browser contexts.  Concurrency is bounded
+by the pool width, a per-host limit and a global token-bucket rate limit
+(which replaces the per-post jitter sleeps of the sync crawler).  Rows are
+handed to ``on_rows`` as soon as each post finishes.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import async_playwright, Error as PWError, TimeoutError as PWTimeoutError
+
+import l8_embedded as embedded
+import monitor_lemon8 as m8
+import l8_selectors as sel
+from l8_cache import model_version
+from l8_metrics import get_metrics
+from l8_replay import AsyncReplayBrowser, record_snapshot
+from l8_scoring import AsyncScorer, get_scorer
+from l8_scroll import ScrollEngine, StopCriteria, COUNT_JS, SCROLL_JS, WAIT_FOR_GROWTH_JS
+from l8_state import COMMENT_COUNT_JS, COMMENT_TEXTS_JS, parse_count, comment_ids, expected_new
+from l8_store import BatchWriter, after_write, write_mark
+from l8_variants import record_variant, variant_order
+from utils import utc_now_iso
+
+
+# ---------- Limits ----------
+class RateLimiter:
+    # token bucket shared by every worker; rate <= 0 disables it
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HostLimiter:
+    def __init__(self, per_host: int):
+        self.per_host = max(1, per_host)
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        host = urlsplit(url).netloc.lower()
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.per_host)
+        async with sem:
+            yield
+
+
+# ---------- Context pool ----------
+_CLOSED_MARKERS = ("has been closed", "Target closed", "crashed", "Browser closed", "Connection closed")
+
+
+def slot_broken(page, exc: BaseException) -> bool:
+    # only a dead page/context/browser needs replacing; a goto timeout leaves a usable context
+    if isinstance(exc, PWTimeoutError):
+        return False
+    try:
+        if page.is_closed():
+            return True
+    except Exception:
+        return True
+    return isinstance(exc, PWError) and any(m in str(exc) for m in _CLOSED_MARKERS)
+
+
+class ContextPool:
+    # up to `size` contexts (one page each), created lazily and reused across posts
+    def __init__(self, browser, size: int, log, desktop: bool = False, policy=None):
+        self.browser = browser
+        self.policy = policy
+        self.size = max(1, size)
+        self.desktop = desktop
+        self.log = log
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._created = 0
+        self._all: List[Tuple[Any, Any]] = []
+        self._lock = asyncio.Lock()
+
+    async def _new_slot(self):
+        ctx = await self.browser.new_context(**m8.context_options(self.desktop))
+        page = await ctx.new_page()
+        page.set_default_timeout(12000)
+        await install_appwall_blockers(ctx, page, self.log, self.policy)
+        slot = (ctx, page)
+        self._all.append(slot)
+        return slot
+
+    async def acquire(self):
+        async with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                try:
+                    return await self._new_slot()
+                except Exception:
+                    self._created -= 1
+                    raise
+        slot = await self._idle.get()
+        if slot is None:
+            # placeholder for a context that couldn't be recreated: try again now
+            try:
+                return await self._new_slot()
+            except Exception:
+                self._idle.put_nowait(None)  # keep the slot for the next waiter
+                raise
+        return slot
+
+    async def release(self, slot, broken: bool = False):
+        if not broken:
+            self._idle.put_nowait(slot)
+            return
+        # replace a crashed/wedged context instead of handing it out again
+        ctx, _ = slot
+        if slot in self._all:
+            self._all.remove(slot)
+        try:
+            await ctx.close()
+        except Exception:
+            pass
+        try:
+            self._idle.put_nowait(await self._new_slot())
+        except Exception as e:
+            # waiters block on _idle, so hand back a placeholder rather than nothing
+            self.log.warning(f"Could not recreate a browser context ({e}); retrying on next lease.")
+            self._idle.put_nowait(None)
+
+    @asynccontextmanager
+    async def lease(self):
+        slot = await self.acquire()
+        broken = False
+        try:
+            yield slot[1]
+        except Exception as e:
+            broken = slot_broken(slot[1], e)
+            raise
+        finally:
+            await self.release(slot, broken=broken)
+
+    async def close(self):
+        for ctx, _ in self._all:
+            try:
+                await ctx.close()
+            except Exception:
+                pass
+        self._all.clear()
+
+
+# ---------- App-wall killer ----------
+async def install_appwall_blockers(context, page, log, policy=None):
+    policy = policy or m8.resource_policy()
+
+    async def route_handler(route):
+        req = route.request
+        if policy.should_block(req.url, req.resource_type):
+            return await route.abort()
+        return await route.fallback()
+    try:
+        await context.route("**/*", route_handler)
+    except Exception:
+        pass
+    try:
+        await context.add_init_script(m8.OVERLAY_GUARD_JS)
+    except Exception:
+        pass
+
+
+async def nuke_overlays(page):
+    try:
+        await page.evaluate(m8.OVERLAY_GUARD_JS)
+    except Exception:
+        pass
+    try:
+        await page.keyboard.press("Escape")
+    except Exception:
+        pass
+
+
+async def overlays_removed(page) -> int:
+    try:
+        return int(await page.evaluate("() => (window.__l8OverlayGuard || {}).removed || 0"))
+    except Exception:
+        return 0
+
+
+async def save_debug(page, label: str, log, screenshot=True):
+    debug_dir = m8.ensure_debug_dir()
+    stamp = m8.ts()
+    base = f"{label}-{stamp}"
+    html_path = debug_dir / f"{base}.html"
+    png_path = debug_dir / f"{base}.png"
+    try:
+        html_path.write_text(await page.content(), encoding="utf-8")
+        record_snapshot(debug_dir, page.url, label, html_path, stamp)
+        if not screenshot:
+            log.info(f"[DEBUG] Saved snapshot: {html_path}")
+            return
+        await page.screenshot(path=str(png_path), full_page=True)
+        log.warning(f"[DEBUG] Saved snapshot: {html_path} and {png_path}")
+    except Exception as e:
+        log.error(f"[DEBUG] Failed to save snapshot: {e}")
+
+
+async def goto(page, url: str, pm):
+    with pm.stage("goto"):
+        await page.goto(url, wait_until="domcontentloaded", timeout=35000)
+    try:
+        with pm.stage("networkidle"):
+            await page.wait_for_load_state("networkidle", timeout=15000)
+    except PWTimeoutError:
+        pass
+    try:
+        await page.add_style_tag(content=m8.CSS_SUPPRESS)
+    except Exception:
+        pass
+
+
+# ---------- Adaptive waits ----------
+async def wait_for_growth(page, engine, loop: str, sels: List[str], prev: int,
+                          timeout_ms=None, settle_ms=None) -> int:
+    t0 = time.perf_counter()
+    try:
+        res = await page.evaluate(WAIT_FOR_GROWTH_JS, engine.wait_args(sels, prev, timeout_ms, settle_ms))
+    except Exception:
+        res = None
+    engine.record_wait(loop, time.perf_counter() - t0, res["why"] if res else "error")
+    return int(res["count"]) if res else prev
+
+async def count_matches(page, sels: List[str]) -> int:
+    try:
+        return int(await page.evaluate(COUNT_JS, sels))
+    except Exception:
+        return 0
+
+
+# ---------- Link harvesting ----------
+async def fetch_state_scripts(cfg, context, url: str, variant: str) -> List[Dict[str, str]]:
+    # async twin of m8.fetch_state_scripts
+    if not cfg.get("STATE_FETCH"):
+        return []
+    try:
+        resp = await context.request.get(url, timeout=15000, headers={
+            "User-Agent": m8.context_options(variant == "desktop")["user_agent"]})
+        if not resp.ok:
+            return []
+        return embedded.scripts_from_html(await resp.text())
+    except Exception:
+        return []
+
+
+async def _extract_links_from_dom(page, patterns: List[str]) -> List[str]:
+    try:
+        return await page.evaluate(m8.NEW_POST_HREFS_JS, patterns) or []
+    except Exception:
+        return []
+
+async def script_bodies(page, new_only: bool = False) -> List[Dict[str, str]]:
+    js = embedded.NEW_SCRIPT_BODIES_JS if new_only else embedded.SCRIPT_BODIES_JS
+    try:
+        return await page.evaluate(js, embedded.MAX_SCRIPT_CHARS) or []
+    except Exception:
+        return []
+
+async def _extract_links_from_json_scripts(page, patterns: List[str], max_scripts: int = 40,
+                                           scripts=None) -> List[str]:
+    if scripts is None:
+        scripts = await script_bodies(page, new_only=True)
+    return m8.links_from_scripts(scripts, patterns, max_scripts)
+
+async def get_post_links_from_profile(page, max_posts: int, log, engine=None) -> List[str]:
+    patterns = m8.POST_LINK_PATTERNS
+    engine = engine or ScrollEngine()
+
+    with engine.loop("harvest"):
+        anchors = await wait_for_growth(page, engine, "harvest", m8.LINK_SELECTORS, 0, timeout_ms=600)
+        await nuke_overlays(page)
+
+        stop = StopCriteria(max_cycles=22, stale_limit=3, target=max_posts)
+        scripts = await script_bodies(page, new_only=True)
+        blobs = embedded.parse_blobs(scripts)
+        seen = m8.LinkSet(embedded.post_links(blobs, patterns))
+        if seen and (len(seen) >= max_posts or not embedded.has_more(blobs)):
+            log.info(f"Found {len(seen)} post links in embedded state; skipping scroll.")
+            stop.reason = "state"
+            engine.record_stop("harvest", stop)
+            return m8.finalize_post_links(seen, max_posts)
+
+        while True:
+            seen.update(await _extract_links_from_dom(page, patterns))
+            seen.update(await _extract_links_from_json_scripts(page, patterns, scripts=scripts))
+            scripts = None
+
+            if not stop.observe(len(seen)):
+                break
+
+            await page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
+            anchors = await wait_for_growth(page, engine, "harvest", m8.LINK_SELECTORS, anchors)
+            await nuke_overlays(page)
+
+            if stop.stale:
+                await page.evaluate("window.scrollBy(0, -Math.floor(window.innerHeight*0.4));")
+                anchors = await wait_for_growth(page, engine, "harvest", m8.LINK_SELECTORS, anchors)
+                await nuke_overlays(page)
+        engine.record_stop("harvest", stop)
+
+    return m8.finalize_post_links(seen, max_posts)
+
+
+# ---------- Comments ----------
+async def try_open_comments_tab(page):
+    for s in m8.COMMENTS_TAB_CHOICES:
+        try:
+            el = page.locator(s).first
+            if el and await el.is_visible():
+                await el.click()
+                await page.wait_for_timeout(400)
+                return True
+        except Exception:
+            continue
+    return False
+
+async def scroll_comments(page, frac: float):
+    try:
+        await page.evaluate(SCROLL_JS, {"sels": m8.COMMENT_CONTAINERS, "frac": frac})
+    except Exception:
+        pass
+
+async def read_comment_count(page):
+    try:
+        return parse_count(await page.evaluate(COMMENT_COUNT_JS))
+    except Exception:
+        return None
+
+async def loaded_all_new(page, url: str, known: set, want: int) -> bool:
+    # see monitor_lemon8.loaded_all_new
+    try:
+        texts = await page.evaluate(COMMENT_TEXTS_JS, sel.COMMENT_ITEMS)
+    except Exception:
+        return False
+    return len(m8.loaded_ids(url, texts) - known) >= want
+
+async def loaded_only_known(page, url: str, known: set, loaded: set) -> bool:
+    # see monitor_lemon8.loaded_only_known
+    try:
+        texts = await page.evaluate(COMMENT_TEXTS_JS, sel.COMMENT_ITEMS)
+    except Exception:
+        return False
+    return m8.batch_all_known(m8.loaded_ids(url, texts), known, loaded)
+
+async def load_more_comments(page, target_min=60, max_cycles=32, stop_when=None, engine=None):
+    engine = engine or ScrollEngine()
+    sels = m8.COMMENT_COUNT_SELECTORS
+    with engine.loop("comments"):
+        stop = StopCriteria(max_cycles=max_cycles, stale_limit=1, target=target_min)
+        cur = await count_matches(page, sels)
+        while True:
+            await scroll_comments(page, 0.9)
+            grown = await wait_for_growth(page, engine, "comments", sels, cur)
+            await nuke_overlays(page)
+            if grown <= cur:
+                await scroll_comments(page, -0.4)
+                grown = await wait_for_growth(page, engine, "comments", sels, cur)
+                await nuke_overlays(page)
+            cur = grown
+            if not stop.observe(cur):
+                break
+            if stop_when and await stop_when():
+                stop.reason = "known"
+                break
+        engine.record_stop("comments", stop)
+
+async def expand_all_comments(page, engine=None, max_clicks=60):
+    engine = engine or ScrollEngine()
+    sels = m8.COMMENT_COUNT_SELECTORS
+    with engine.loop("expand"):
+        n = await count_matches(page, sels)
+        for ex in sel.EXPANDERS:
+            stop = StopCriteria(max_cycles=max_clicks, stale_limit=3)
+            try:
+                while await page.locator(ex).first.is_visible():
+                    await page.locator(ex).first.click()
+                    n = await wait_for_growth(page, engine, "expand", sels, n, timeout_ms=1500, settle_ms=250)
+                    if not stop.observe(n - await page.locator(ex).count()):
+                        break
+            except Exception:
+                pass
+            engine.record_stop("expand", stop)
+
+async def extract_comments_per_locator(page) -> List[Dict[str, Any]]:
+    comments: List[Dict[str, Any]] = []
+    for css in sel.COMMENT_ITEMS:
+        loc = page.locator(css)
+        try:
+            count = await loc.count()
+        except Exception:
+            count = 0
+        for i in range(count):
+            try:
+                c = m8.comment_from_text(await loc.nth(i).inner_text(timeout=1500))
+            except Exception:
+                continue
+            if c:
+                comments.append(c)
+    return comments
+
+async def page_title(page):
+    try:
+        return await page.title()
+    except Exception:
+        return None
+
+async def extract_comments(page, bulk=True) -> Tuple[str, List[Dict[str, Any]]]:
+    post_title = await page_title(page)
+
+    comments: List[Dict[str, Any]] = []
+    if bulk:
+        try:
+            comments = m8.comments_from_bulk(await page.evaluate(m8.BULK_EXTRACT_JS, sel.COMMENT_ITEMS))
+        except Exception:
+            comments = []
+    if not comments:
+        comments = await extract_comments_per_locator(page)
+    if comments:
+        return post_title, comments
+
+    # JSON-LD fallback
+    scripts = page.locator('script[type="application/ld+json"]')
+    try:
+        scount = await scripts.count()
+    except Exception:
+        scount = 0
+    for i in range(scount):
+        try:
+            comments.extend(m8.comments_from_ld_json(await scripts.nth(i).inner_text(timeout=800)))
+        except Exception:
+            continue
+    return post_title, comments
+
+
+# ---------- Crawler ----------
+class ConcurrentCrawler:
+    def __init__(self, cfg, browser, log, on_rows: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                 state=None, cache=None):
+        self.cfg = cfg
+        self.state = state
+        self.cache = cache
+        self.browser = browser
+        self.log = log
+        self.on_rows = on_rows
+        policy = m8.resource_policy(cfg)
+        self.pool = ContextPool(browser, cfg["POOL_SIZE"], log, policy=policy)
+        # contexts are created on demand, so a full-width desktop pool only costs what the learned order uses
+        self.desktop_pool = ContextPool(browser, cfg["POOL_SIZE"], log, desktop=True, policy=policy)
+        self.pools = {"mobile": self.pool, "desktop": self.desktop_pool}
+        self.rate = RateLimiter(cfg["RATE_LIMIT_RPS"], burst=cfg["POOL_SIZE"])
+        self.hosts = HostLimiter(cfg["PER_HOST_LIMIT"])
+        self.scorer = AsyncScorer(get_scorer(cfg, log)) if cfg["USE_DETOX"] else None
+        self.metrics = get_metrics(cfg)
+        self.saved = 0
+
+    async def close(self):
+        if self.scorer:
+            await self.scorer.close()
+        await self.pool.close()
+        await self.desktop_pool.close()
+
+    async def _scrape_post(self, pool: ContextPool, url: str, label: str, pm, prev=None):
+        # returns (title, comments, visible_count, full); comments is None when the post is unchanged
+        # and full says the whole list was loaded (only then may the count be stored)
+        async with self.hosts.limit(url):
+            with pm.stage("rate_wait"):
+                await self.rate.acquire()
+            async with pool.lease() as page:
+                page = pm.wrap(page)
+                await goto(page, url, pm)
+                await nuke_overlays(page)
+                with pm.stage("state"):
+                    blobs = embedded.parse_blobs(await script_bodies(page))
+                    state_comments = embedded.comments(blobs)
+                    state_done = bool(state_comments) and not embedded.has_more(blobs, "comment")
+                if not state_done:
+                    await try_open_comments_tab(page)
+                visible = await read_comment_count(page) if self.state else None
+                if prev and visible is not None and prev["comment_count"] == visible:
+                    return None, None, visible, False
+                known = prev["seen_ids"] if prev else set()
+                if state_done:
+                    self.log.info(f"Found {len(state_comments)} comments in embedded state on {url}; skipping scroll.")
+                    pm.inc("state_hits")
+                    post_title, comments, full = await page_title(page), state_comments, True
+                else:
+                    post_title, comments, full = await self._scroll_and_extract(
+                        page, url, known, expected_new(prev, visible), pm)
+                    if not comments and state_comments:
+                        comments = state_comments
+                if self.cfg.get("SNAPSHOT_PAGES"):
+                    await save_debug(page, "post", self.log, screenshot=False)
+                if not comments and label:
+                    self.log.warning("No comments found via DOM/JSON-LD; saving snapshot.")
+                    await save_debug(page, label, self.log)
+                return post_title, comments, visible, full
+
+    async def _scroll_and_extract(self, page, url: str, known: set, want: Optional[int], pm):
+        engine = ScrollEngine.from_cfg(self.cfg)
+        with pm.stage("scroll"):
+            with engine.loop("comments"):
+                n = await count_matches(page, m8.COMMENT_COUNT_SELECTORS)
+                for _ in range(3):
+                    await page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
+                    n = await wait_for_growth(page, engine, "comments", m8.COMMENT_COUNT_SELECTORS, n,
+                                              timeout_ms=800)
+                    await nuke_overlays(page)
+            stop_when = None
+            if want:
+                stop_when = lambda: loaded_all_new(page, url, known, want)
+            elif known:
+                loaded: set = set()
+                stop_when = lambda: loaded_only_known(page, url, known, loaded)
+            # incremental runs load the whole list (no 60-comment target) so the count can be stored,
+            # unless they can tell every new comment is already loaded
+            await load_more_comments(page, target_min=None if self.state is not None else 60, max_cycles=32,
+                                     stop_when=stop_when, engine=engine)
+        full = engine.summary()["comments"]["stop"] == "stale"
+        with pm.stage("expand"):
+            await expand_all_comments(page, engine=engine)
+        self.log.info(f"Scroll timing for {url}: {engine.summary()}")
+        self.log.debug(f"Overlay guard removed {await overlays_removed(page)} elements on {url}")
+        with pm.stage("extract"):
+            post_title, comments = await extract_comments(page)
+        return post_title, comments, full
+
+    async def crawl_post(self, url: str, profile: Optional[str] = None) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """
+        (post_title, rows); with `on_rows` the rows are streamed there in batches and not
+        returned.  Returned rows leave the crawl state untouched (see l8_store.after_write).
+        """
+        post_title, rows, _ = await self._post(url, profile)
+        return post_title, rows
+
+    async def _post(self, url: str, profile: Optional[str] = None):
+        url = m8.normalize_post_url(url)
+        pm = self.metrics.post(url, profile)
+        n = 0
+        try:
+            post_title, rows, n = await self._crawl_post(url, pm, profile)
+            return post_title, rows, n
+        finally:
+            pm.close(comments=n)
+
+    async def _fetch_state(self, url: str, variant: str, pm) -> List[Dict[str, str]]:
+        # the fallback variant's page HTML over plain HTTP: no render, no scroll
+        if not self.cfg.get("STATE_FETCH"):
+            return []
+        async with self.hosts.limit(url):
+            with pm.stage("rate_wait"):
+                await self.rate.acquire()
+            async with self.pools[variant].lease() as page:
+                with pm.stage("state_fetch"):
+                    return await fetch_state_scripts(self.cfg, page.context, url, variant)
+
+    async def _crawl_post(self, url: str, pm, profile: Optional[str] = None
+                          ) -> Tuple[Optional[str], List[Dict[str, Any]], int]:
+        prev = self.state.get(url) if self.state else None
+        variants = variant_order(self.cfg, url, profile)
+        variant = variants[0]
+        post_title, comments, visible, full = await self._scrape_post(self.pools[variant], url, "", pm, prev)
+        if comments is None:
+            self.log.info(f"Comment count unchanged ({visible}); skipping {url}")
+            pm.inc("unchanged_skips")
+            return None, [], 0
+        for fallback in variants[1:]:
+            if comments:
+                break
+            record_variant(self.cfg, url, profile, variant, False)
+            pm.inc(f"{fallback}_fallbacks")
+            variant, full = fallback, False
+            comments = embedded.state_comments(await self._fetch_state(url, fallback, pm))
+            if comments:
+                self.log.info(f"Found {len(comments)} comments in {fallback} page state on {url}; "
+                              f"skipping a second page load.")
+                pm.inc("state_fetch_hits")
+                break
+            self.log.info(f"No comments found on {url}; retrying with {fallback} UA fallback.")
+            post_title, comments, visible, full = await self._scrape_post(self.pools[fallback], url, "no-comments",
+                                                                          pm)
+        record_variant(self.cfg, url, profile, variant, bool(comments))
+        if not comments:
+            return post_title, [], 0
+        commit = None
+        if self.state is not None:
+            known = prev["seen_ids"] if prev else set()
+            ids = comment_ids(url, comments)
+            full = full or (visible is not None and len(comments) >= visible)
+            count = visible if full else None
+            commit = lambda conn=None: self.state.update(url, ids, count, conn)
+            comments = [c for c, cid in zip(comments, ids) if cid not in known]
+            if not comments:
+                self.log.info(f"No new comments on {url}.")
+        mark = write_mark(self.on_rows)
+        # score and hand over ROW_BATCH comments at a time; model scores are still
+        # batched across posts by the shared queue, and the sqlite-backed cache is
+        # only touched from the loop thread
+        rows: List[Dict[str, Any]] = []
+        n = 0
+        step = max(1, self.cfg.get("ROW_BATCH") or len(comments))
+        scraped_at = utc_now_iso()
+        for i in range(0, len(comments), step):
+            chunk = comments[i:i + step]
+            ml_scores = None
+            with pm.stage("score"):
+                if self.scorer:
+                    ml_scores = await self._model_scores([c.get("text") or "" for c in chunk])
+                batch = m8.build_rows(self.cfg, url, post_title, chunk, ml_scores, self.cache, scraped_at)
+            n += len(batch)
+            if self.on_rows:
+                with pm.stage("write_wait"):
+                    await self._emit(batch)
+                self.saved += len(batch)
+            else:
+                rows.extend(batch)
+        if commit is not None:
+            # crawl state only once the rows are stored; after() can block like put()
+            if isinstance(self.on_rows, BatchWriter):
+                await asyncio.get_running_loop().run_in_executor(None, self.on_rows.after, commit, mark)
+            else:
+                after_write(self.on_rows, commit, mark)
+        return post_title, rows, n
+
+    async def _emit(self, rows: List[Dict[str, Any]]):
+        # a BatchWriter blocks while its queue is full; wait in a thread so
+        # that backpressure pauses this post without stalling the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.on_rows, rows)
+
+    async def _model_scores(self, texts: List[str]):
+        # copy-paste comments in one chunk go to the cache and the model once
+        uniq = list(dict.fromkeys(texts))
+        if self.cache is None:
+            values = await self.scorer.score(uniq)
+        else:
+            version = model_version(self.cfg["DETOX_MODEL"])
+            values, misses = self.cache.lookup("detox", version, uniq)
+            if misses:
+                todo = [uniq[i] for i in misses]
+                fresh = await self.scorer.score(todo)
+                self.cache.store("detox", version, todo, fresh)
+                for i, v in zip(misses, fresh):
+                    values[i] = v
+        by_text = dict(zip(uniq, values))
+        return [by_text[t] for t in texts]
+
+    async def harvest_profile(self, profile_url: str) -> List[str]:
+        pm = self.metrics.post(profile_url, profile_url)
+        try:
+            return await self._harvest_profile(profile_url, pm)
+        finally:
+            pm.close(kind="profile")
+
+    async def _harvest_profile(self, profile_url: str, pm) -> List[str]:
+        variants = variant_order(self.cfg, profile_url, profile_url)
+        for i, variant in enumerate(variants):
+            if i:
+                pm.inc(f"{variant}_fallbacks")
+                blobs = embedded.parse_blobs(await self._fetch_state(profile_url, variant, pm))
+                posts = m8.finalize_post_links(embedded.post_links(blobs, m8.POST_LINK_PATTERNS),
+                                               self.cfg["MAX_POSTS"])
+                if posts:
+                    self.log.info(f"Found {len(posts)} post links in {variant} page state; "
+                                  f"skipping a second page load.")
+                    pm.inc("state_fetch_hits")
+                    record_variant(self.cfg, profile_url, profile_url, variant, True)
+                    return posts
+                self.log.info(f"No post links; retrying profile with {variant} UA fallback.")
+            async with self.pools[variant].lease() as page:
+                page = pm.wrap(page)
+                try:
+                    await goto(page, profile_url, pm)
+                except PWTimeoutError:
+                    pm.inc("retries")
+                    sep = "&" if "?" in profile_url else "?"
+                    await goto(page, f"{profile_url}{sep}region=US", pm)
+                await nuke_overlays(page)
+                engine = ScrollEngine.from_cfg(self.cfg)
+                with pm.stage("harvest"):
+                    posts = await get_post_links_from_profile(page, self.cfg["MAX_POSTS"], self.log, engine=engine)
+                self.log.info(f"Scroll timing for {profile_url}: {engine.summary()}")
+                if self.cfg.get("SNAPSHOT_PAGES"):
+                    await save_debug(page, "profile", self.log, screenshot=False)
+                record_variant(self.cfg, profile_url, profile_url, variant, bool(posts))
+                if posts:
+                    return posts
+                if i == len(variants) - 1:
+                    self.log.warning("No post links found after scroll/parsing; saving snapshot.")
+                    await save_debug(page, "no-post-links", self.log)
+        return []
+
+    async def crawl_profile(self, profile_url: str) -> int:
+        posts = await self.harvest_profile(profile_url)
+        if not posts:
+            return 0
+        self.log.info("Found post links:\n" + "\n".join(posts))
+        tasks = [asyncio.create_task(self._post(p, profile_url)) for p in posts]
+        saved = 0
+        for fut in asyncio.as_completed(tasks):
+            try:
+                _, _, n = await fut
+                saved += n
+            except Exception as e:
+                self.log.error(f"Post crawl failed: {e}")
+        return saved
+
+
+async def run_profile(cfg, profile_url: str, log, on_rows, headless: bool = True,
+                      state=None, cache=None, replay=None) -> int:
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        if replay is not None:
+            browser = AsyncReplayBrowser(browser, replay)
+        crawler = ConcurrentCrawler(cfg, browser, log, on_rows=on_rows, state=state, cache=cache)
+        try:
+            return await crawler.crawl_profile(profile_url)
+        finally:
+            await crawler.close()
+            await browser.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Content-hash score cache.
+
+Copy-paste and spam comments repeat word for word, so scores are cached by
+a hash of the exact text plus the scorer version (rules file or Detoxify
+model).  The text is not normalized: regex rules can match on whitespace,
+so two texts only share an entry if every scorer sees the same input.
+Entries live in a ``score_cache`` table in the comments DB and in a
+bounded in-memory LRU for the current run.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, List, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS score_cache (
+    text_hash TEXT NOT NULL,
+    scorer TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (text_hash, scorer, version)
+)
+"""
+
+_MISS = object()
+# bumped when the key changes, so entries stored under an older key scheme
+# (whitespace-collapsed text) are never served for a different text
+_KEY_PREFIX = b"exact\0"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(_KEY_PREFIX + (text or "").encode("utf-8", "surrogatepass")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def rules_version() -> str:
+    import rules
+    v = getattr(rules, "RULES_VERSION", None)
+    if v:
+        return str(v)
+    try:
+        with open(rules.__file__, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except Exception:
+        return "unknown"
+
+
+@lru_cache(maxsize=None)
+def model_version(model_name: str) -> str:
+    try:
+        from importlib.metadata import version
+        return f"{model_name}@{version('detoxify')}"
+    except Exception:
+        return model_name
+
+
+class ScoreCache:
+    def __init__(self, conn, capacity: int = 50000):
+        self.conn = conn
+        self.capacity = capacity
+        self._lru: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        conn.execute(SCHEMA)
+        conn.commit()
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate(), 3)}
+
+    def _remember(self, key, value):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def lookup(self, scorer: str, version: str, texts: List[str]) -> Tuple[List[Any], List[int]]:
+        """Returns (values, miss_indices); missing values are None."""
+        hashes = [text_hash(t) for t in texts]
+        values: List[Any] = [_MISS] * len(texts)
+        pending = {}
+        for i, h in enumerate(hashes):
+            key = (h, scorer, version)
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                values[i] = self._lru[key]
+            else:
+                pending.setdefault(h, []).append(i)
+        keys = list(pending)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            q = ("SELECT text_hash, value FROM score_cache WHERE scorer = ? AND version = ? "
+                 f"AND text_hash IN ({','.join('?' * len(chunk))})")
+            for h, raw in self.conn.execute(q, [scorer, version, *chunk]):
+                v = json.loads(raw)
+                self._remember((h, scorer, version), v)
+                for i in pending[h]:
+                    values[i] = v
+        misses = [i for i, v in enumerate(values) if v is _MISS]
+        self.hits += len(texts) - len(misses)
+        self.misses += len(misses)
+        return [None if v is _MISS else v for v in values], misses
+
+    def store(self, scorer: str, version: str, texts: List[str], values: List[Any]):
+        rows = []
+        for t, v in zip(texts, values):
+            if v is None:
+                continue  # failed model call; let the next run retry
+            h = text_hash(t)
+            self._remember((h, scorer, version), v)
+            rows.append((h, scorer, version, json.dumps(v)))
+        if rows:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO score_cache (text_hash, scorer, version, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+
+    def cached(self, scorer: str, version: str, texts: List[str],
+               compute: Callable[[List[str]], List[Any]]) -> List[Any]:
+        values, misses = self.lookup(scorer, version, texts)
+        if misses:
+            # identical texts inside one call are computed once
+            todo, index = [], {}
+            for i in misses:
+                h = text_hash(texts[i])
+                if h not in index:
+                    index[h] = len(todo)
+                    todo.append(texts[i])
+            fresh = compute(todo)
+            self.store(scorer, version, todo, fresh)
+            for i in misses:
+                values[i] = fresh[index[text_hash(texts[i])]]
+        return values
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Long-running scheduler for monitoring many Lemon8 profiles.
+
+One Chromium instance and one ConcurrentCrawler (and so one context pool)
+are shared by every profile.  Profiles come from a file, one per line:
+
+    # url                                   interval_min  priority
+    https://www.lemon8-app.com/@someone     30            5
+    https://www.lemon8-app.com/@other                     # defaults
+
+or a JSON list of ``{"url": ..., "interval_min": ..., "priority": ...}``.
+
+A profile's next crawl is due ``interval * factor`` after its last one:
+the factor is MIN_FACTOR when the last crawl stored new comments and grows
+with the time since the profile last had activity, up to
+``DAEMON_MAX_BACKOFF``.  Due profiles are queued by priority, then by how
+overdue they are, and ``DAEMON_WORKERS`` crawls run at once.  The browser
+is restarted between crawls when the process tree (this process, the
+Playwright driver and Chromium) exceeds ``MAX_BROWSER_RSS_MB``.  Queue
+depth, lag and memory are logged every status tick and, with
+``DAEMON_STATUS_FILE``, written there as JSON.  ``max_lag_s`` is the worst
+start lag (due -> crawl start) among profiles whose last crawl finished;
+``process_rss_mb`` is that whole tree, not a per-page figure.
+"""
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from playwright.async_api import async_playwright
+
+from l8_async import ConcurrentCrawler
+from l8_metrics import get_metrics
+from l8_replay import AsyncReplayBrowser
+
+MIN_FACTOR = 0.5          # interval multiplier right after a crawl found new comments
+IDLE_SCALE_S = 24 * 3600  # idle time that adds 1.0 to the factor
+TICK_S = 5.0
+
+
+class Profile:
+    def __init__(self, url: str, interval_s: float, priority: int = 0):
+        self.url = url
+        self.interval_s = interval_s
+        self.priority = priority
+        self.due = 0.0                 # monotonic time of the next crawl; 0 = now
+        self.last_run: Optional[float] = None
+        self.last_activity: Optional[float] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_saved = 0
+        self.last_error: Optional[str] = None
+        self.last_lag_s: Optional[float] = None   # start lag of the last finished crawl
+        self.pending = False           # queued or running
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "priority": self.priority,
+            "interval_s": self.interval_s,
+            "due_in_s": round(self.due - now, 1),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_saved": self.last_saved,
+            "last_lag_s": round(self.last_lag_s, 1) if self.last_lag_s is not None else None,
+            "idle_s": round(now - self.last_activity, 1) if self.last_activity is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+def load_profiles(path: str, default_interval_min: float) -> List[Profile]:
+    text = Path(path).read_text(encoding="utf-8")
+    out: Dict[str, Profile] = {}
+    if text.lstrip().startswith("["):
+        for e in json.loads(text):
+            if isinstance(e, str):
+                e = {"url": e}
+            interval = float(e.get("interval_min") or default_interval_min)
+            out[e["url"]] = Profile(e["url"], interval * 60, int(e.get("priority") or 0))
+        return list(out.values())
+    for line in text.splitlines():
+        parts = line.split("#", 1)[0].split()
+        if not parts:
+            continue
+        interval = float(parts[1]) if len(parts) > 1 else default_interval_min
+        priority = int(parts[2]) if len(parts) > 2 else 0
+        out[parts[0]] = Profile(parts[0], interval * 60, priority)
+    return list(out.values())
+
+
+class Scheduler:
+    def __init__(self, profiles: List[Profile], max_backoff: float = 4.0):
+        self.profiles = profiles
+        self.max_backoff = max(1.0, max_backoff)
+        self.started_at = time.monotonic()
+
+    def factor(self, p: Profile, now: float) -> float:
+        if p.last_saved:
+            return MIN_FACTOR
+        since = p.last_activity if p.last_activity is not None else self.started_at
+        return min(self.max_backoff, 1.0 + (now - since) / IDLE_SCALE_S)
+
+    def due(self, now: float) -> List[Profile]:
+        ready = [p for p in self.profiles if not p.pending and p.due <= now]
+        ready.sort(key=lambda p: (-p.priority, p.due))
+        return ready
+
+    def finished(self, p: Profile, saved: int, now: float, error: Optional[str] = None,
+                 lag_s: Optional[float] = None):
+        p.pending = False
+        p.last_lag_s = lag_s
+        p.runs += 1
+        p.last_run = now
+        p.last_saved = saved
+        p.last_error = error
+        if error:
+            p.failures += 1
+        if saved:
+            p.last_activity = now
+        p.due = now + p.interval_s * self.factor(p, now)
+
+
+def process_tree_rss_mb(root_pid: Optional[int] = None) -> float:
+    """RSS of `root_pid` (default: this process) and all its descendants, i.e. driver + Chromium."""
+    root_pid = root_pid or os.getpid()
+    try:
+        import psutil
+        proc = psutil.Process(root_pid)
+        procs = [proc] + proc.children(recursive=True)
+        total = 0
+        for pr in procs:
+            try:
+                total += pr.memory_info().rss
+            except psutil.Error:
+                pass
+        return round(total / (1024 * 1024), 1)
+    except ImportError:
+        pass
+    # Linux fallback: walk /proc for the parent/child tree
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    page_kb = os.sysconf("SC_PAGE_SIZE") // 1024
+    for d in Path("/proc").glob("[0-9]*"):
+        try:
+            ppid = int((d / "stat").read_text().rsplit(")", 1)[1].split()[1])
+            pages = int((d / "statm").read_text().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        pid = int(d.name)
+        children.setdefault(ppid, []).append(pid)
+        rss[pid] = pages * page_kb
+    total_kb, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total_kb += rss.get(pid, 0)
+        stack.extend(children.get(pid, ()))
+    return round(total_kb / 1024, 1)
+
+
+class Daemon:
+    def __init__(self, cfg, profiles: List[Profile], log, on_rows, headless: bool = True,
+                 state=None, cache=None, replay=None):
+        self.cfg = cfg
+        self.log = log
+        self.on_rows = on_rows
+        self.headless = headless
+        self.state = state
+        self.cache = cache
+        self.replay = replay
+        self.scheduler = Scheduler(profiles, cfg["DAEMON_MAX_BACKOFF"])
+        self.workers = max(1, cfg["DAEMON_WORKERS"])
+        self.max_rss_mb = cfg["MAX_BROWSER_RSS_MB"]
+        self.status_file = cfg["DAEMON_STATUS_FILE"]
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.running = 0
+        self.restarts = 0
+        self.crawls = 0
+        self.last_lag_s = 0.0
+        self.rss_mb = 0.0
+        self._open = asyncio.Event()   # cleared while the browser restarts
+        self._pw = None
+        self.browser = None
+        self.crawler: Optional[ConcurrentCrawler] = None
+
+    async def _launch(self):
+        browser = await self._pw.chromium.launch(headless=self.headless)
+        self.browser = AsyncReplayBrowser(browser, self.replay) if self.replay is not None else browser
+        self.crawler = ConcurrentCrawler(self.cfg, self.browser, self.log, on_rows=self.on_rows,
+                                         state=self.state, cache=self.cache)
+        self._open.set()
+
+    async def _shutdown_browser(self):
+        if self.crawler is not None:
+            await self.crawler.close()
+        if self.browser is not None:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        self.crawler = self.browser = None
+
+    async def _restart(self, status_every_s: float):
+        self._open.clear()
+        self.log.warning(f"Process tree at {self.rss_mb} MB (limit {self.max_rss_mb}); "
+                         f"restarting after {self.running} running crawl(s) finish.")
+        # the scheduler loop is parked here: keep the status file fresh (restarting=true)
+        # while long crawls drain, starting with one report right away
+        last_report = 0.0
+        while self.running:
+            now = time.monotonic()
+            if now - last_report >= status_every_s:
+                self.rss_mb = process_tree_rss_mb()
+                self._report()
+                last_report = now
+            await asyncio.sleep(0.5)
+        await self._shutdown_browser()
+        self.restarts += 1
+        await self._launch()
+
+    async def _worker(self):
+        while True:
+            await self._open.wait()
+            p: Profile = await self.queue.get()
+            await self._open.wait()
+            self.running += 1
+            lag = max(0.0, time.monotonic() - p.due)
+            saved, error = 0, None
+            try:
+                saved = await self.crawler.crawl_profile(p.url)
+                self.log.info(f"[daemon] {p.url}: {saved} new comments (lag {lag:.1f}s).")
+            except Exception as e:
+                error = str(e)[:300]
+                self.log.error(f"[daemon] {p.url} failed: {e}")
+            finally:
+                self.running -= 1
+                self.crawls += 1
+                self.last_lag_s = lag
+                self.scheduler.finished(p, saved, time.monotonic(), error, lag)
+                self.queue.task_done()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        waiting = [p for p in self.scheduler.profiles if p.pending]
+        # finished crawls only: a queued or running profile has no final lag yet
+        lags = [p.last_lag_s for p in self.scheduler.profiles if p.last_lag_s is not None]
+        return {
+            "ts": time.time(),
+            "queue_depth": self.queue.qsize(),
+            "running": self.running,
+            "max_lag_s": round(max(lags), 1) if lags else 0.0,
+            "last_start_lag_s": round(self.last_lag_s, 1),
+            "crawls": self.crawls,
+            "process_rss_mb": self.rss_mb,   # whole process tree incl. driver + Chromium
+            "restarts": self.restarts,
+            "restarting": not self._open.is_set(),
+            "pending": len(waiting),
+            "profiles": [p.summary(now) for p in self.scheduler.profiles],
+        }
+
+    def _report(self):
+        st = self.status()
+        self.log.info(f"[daemon] queue={st['queue_depth']} running={st['running']} "
+                      f"max_lag={st['max_lag_s']}s process_rss={st['process_rss_mb']}MB "
+                      f"crawls={st['crawls']} restarts={st['restarts']}")
+        get_metrics(self.cfg).write_prom()
+        if self.status_file:
+            tmp = f"{self.status_file}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(st, f, indent=2)
+                os.replace(tmp, self.status_file)
+            except OSError as e:
+                self.log.error(f"[daemon] could not write status file: {e}")
+
+    async def run(self, status_every_s: float = 60.0):
+        async with async_playwright() as p:
+            self._pw = p
+            await self._launch()
+            tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            last_report = 0.0
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._open.is_set():
+                        for prof in self.scheduler.due(now):
+                            prof.pending = True
+                            self.queue.put_nowait(prof)
+                    self.rss_mb = process_tree_rss_mb()
+                    if self.max_rss_mb and self.rss_mb > self.max_rss_mb and self._open.is_set():
+                        await self._restart(status_every_s)
+                    if now - last_report >= status_every_s:
+                        self._report()
+                        last_report = now
+                    await asyncio.sleep(TICK_S)
+            finally:
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await self._shutdown_browser()
+                self._report()
+
+
+def run_daemon(cfg, profiles_file: str, log, on_rows, headless: bool = True,
+               state=None, cache=None, replay=None):
+    profiles = load_profiles(profiles_file, cfg["DAEMON_INTERVAL_MIN"])
+    if not profiles:
+        log.error(f"No profiles in {profiles_file}.")
+        return
+    log.info(f"[daemon] Monitoring {len(profiles)} profiles with {cfg['DAEMON_WORKERS']} workers.")
+    daemon = Daemon(cfg, profiles, log, on_rows, headless=headless, state=state, cache=cache, replay=replay)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        log.info("[daemon] Stopped.")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+State-first extraction from JSON embedded in the page.
+
+SPA pages ship their initial feed/comment state in ``<script>`` tags
+(``application/json``, JSON-LD, or ``window.__STATE__ = {...}``
+assignments).  All script bodies are fetched with one ``page.evaluate``
+(SCRIPT_BODIES_JS), parsed here, and searched for post links, comment
+lists and pagination cursors, so a crawl only falls back to DOM scrolling
+when the state has nothing useful.
+
+The comment heuristics are schema-agnostic: a comment is a dict with a text
+field that sits under a key mentioning "comment"/"reply" (or carries a
+comment id).  State comments come out in the shape the DOM path produces
+(``monitor_lemon8.comment_from_text``): ``author`` is the handle rendered in
+the comment item (the display nickname is kept as ``nickname``) and
+``text`` has its lines stripped and joined by single spaces, so
+``l8_state.comment_id`` gives the same id whichever path read a comment.
+"""
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Inline script bodies (no src) in one round-trip, JSON-ish ones only.
+SCRIPT_BODIES_JS = """
+(maxChars) => {
+  const out = [];
+  for (const s of document.scripts) {
+    if (s.src) continue;
+    const text = s.textContent || '';
+    if (!text || text.indexOf('{') < 0) continue;
+    out.push({type: (s.type || '').toLowerCase(), id: s.id || '', text: text.slice(0, maxChars)});
+  }
+  return out;
+}
+"""
+
+# Same, but only scripts this document hasn't returned yet (or whose text
+# length changed since), for polling while a feed scrolls.
+NEW_SCRIPT_BODIES_JS = """
+(maxChars) => {
+  const seen = window.__l8Scripts || (window.__l8Scripts = new WeakMap());
+  const out = [];
+  for (const s of document.scripts) {
+    if (s.src) continue;
+    const text = s.textContent || '';
+    if (seen.get(s) === text.length) continue;
+    seen.set(s, text.length);
+    if (!text || text.indexOf('{') < 0) continue;
+    out.push({type: (s.type || '').toLowerCase(), id: s.id || '', text: text.slice(0, maxChars)});
+  }
+  return out;
+}
+"""
+
+MAX_SCRIPT_CHARS = 4_000_000
+MAX_NODES = 200_000
+
+_ASSIGN_RE = re.compile(r"(?:window\.|self\.|var\s+|let\s+|const\s+)?[\w$.\[\]'\"]+\s*=\s*(?=[{\[])")
+_JSON_PARSE_RE = re.compile(r"JSON\.parse\(\s*(\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*')\s*\)")
+
+TEXT_KEYS = ("text", "content", "comment", "commentText", "comment_text", "body", "message")
+AUTHOR_KEYS = ("user", "author", "commenter", "userInfo", "user_info", "owner")
+# handle first: the comment item renders the handle, and ids must match DOM-scraped ones
+HANDLE_KEYS = ("uniqueId", "unique_id", "userName", "user_name", "username", "handle")
+NICK_KEYS = ("nickname", "nickName", "nick_name", "name")
+NAME_KEYS = HANDLE_KEYS + NICK_KEYS
+COMMENT_ID_KEYS = ("commentId", "comment_id", "cid")
+TIME_KEYS = ("createTime", "create_time", "createdAt", "created_at", "publishTime", "time")
+CURSOR_KEYS = ("cursor", "nextCursor", "next_cursor", "maxCursor", "max_cursor", "offset", "nextPage", "next_page")
+HAS_MORE_KEYS = ("hasMore", "has_more", "hasNext", "has_next")
+
+
+_SCRIPT_TAG_RE = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.I | re.S)
+_ATTR_RE = re.compile(r"""\b(type|id|src)\s*=\s*["']?([^"'\s>]*)""", re.I)
+
+
+def scripts_from_html(html: str, max_chars: int = MAX_SCRIPT_CHARS) -> List[Dict[str, str]]:
+    """SCRIPT_BODIES_JS over raw HTML (e.g. a plain HTTP fetch, no rendering)."""
+    out = []
+    for m in _SCRIPT_TAG_RE.finditer(html or ""):
+        attrs = {k.lower(): v for k, v in _ATTR_RE.findall(m.group(1))}
+        text = m.group(2)
+        if attrs.get("src") or "{" not in text:
+            continue
+        out.append({"type": attrs.get("type", "").lower(), "id": attrs.get("id", ""), "text": text[:max_chars]})
+    return out
+
+
+def unescape_urls(raw: str) -> str:
+    return raw.replace("\\/", "/").replace("\\u002F", "/").replace("\\u002f", "/")
+
+
+def parse_blobs(scripts: List[Dict[str, str]]) -> List[Any]:
+    """JSON values found in script bodies (whole-body JSON, assignments, JSON.parse literals)."""
+    dec = json.JSONDecoder()
+    blobs: List[Any] = []
+    for s in scripts or []:
+        text = (s.get("text") or "").strip()
+        if not text:
+            continue
+        if "json" in (s.get("type") or ""):
+            try:
+                blobs.append(json.loads(text))
+                continue
+            except ValueError:
+                pass
+        pos = 0
+        while True:
+            m = _ASSIGN_RE.search(text, pos)
+            if not m:
+                break
+            try:
+                val, pos = dec.raw_decode(text, m.end())  # resume after the decoded value
+            except ValueError:
+                pos = m.end()
+                continue
+            if isinstance(val, (dict, list)) and val:
+                blobs.append(val)
+        for m in _JSON_PARSE_RE.finditer(text):
+            try:
+                inner = json.loads(m.group(1)) if m.group(1)[0] == '"' else m.group(1)[1:-1]
+                blobs.append(json.loads(inner))
+            except (ValueError, TypeError):
+                continue
+    return blobs
+
+
+def walk(obj: Any, max_nodes: int = MAX_NODES) -> Iterator[Tuple[Optional[str], Any]]:
+    """Iterative (parent_key, value) walk, bounded so a huge state can't stall the crawl."""
+    stack: List[Tuple[Optional[str], Any]] = [(None, obj)]
+    seen = 0
+    while stack and seen < max_nodes:
+        key, val = stack.pop()
+        seen += 1
+        yield key, val
+        if isinstance(val, dict):
+            stack.extend(reversed(list(val.items())))
+        elif isinstance(val, list):
+            stack.extend((key, v) for v in reversed(val))
+
+
+def _first(d: Dict[str, Any], keys) -> Any:
+    for k in keys:
+        v = d.get(k)
+        if v not in (None, "", [], {}):
+            return v
+    return None
+
+
+def _author(d: Dict[str, Any]) -> Optional[str]:
+    a = _first(d, AUTHOR_KEYS)
+    if isinstance(a, dict):
+        a = _first(a, NAME_KEYS)
+    if a is None:
+        a = _first(d, NAME_KEYS)
+    # same trimming as comment_from_text's first line
+    a = str(a).strip()[:80] if a is not None else ""
+    return a or None
+
+
+def _nickname(d: Dict[str, Any]) -> Optional[str]:
+    a = _first(d, AUTHOR_KEYS)
+    a = _first(a, NICK_KEYS) if isinstance(a, dict) else None
+    if a is None:
+        a = _first(d, NICK_KEYS)
+    return str(a)[:80] if a is not None else None
+
+
+def dom_text(text: str) -> str:
+    """Comment text as comment_from_text joins the item's lines."""
+    return " ".join(l.strip() for l in text.splitlines() if l.strip())
+
+
+def post_links(blobs: List[Any], patterns: List[str]) -> List[str]:
+    rx = [re.compile(p) for p in patterns]
+    out: Dict[str, None] = {}
+    for blob in blobs:
+        for _, v in walk(blob):
+            if isinstance(v, str) and "http" in v:
+                s = unescape_urls(v)
+                for r in rx:
+                    for m in r.findall(s):
+                        out.setdefault(m, None)
+    return list(out)
+
+
+def comments(blobs: List[Any]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    seen = set()
+    for blob in blobs:
+        for key, v in walk(blob):
+            if not isinstance(v, dict):
+                continue
+            in_comment_list = bool(key) and ("comment" in key.lower() or "repl" in key.lower())
+            if not in_comment_list and _first(v, COMMENT_ID_KEYS) is None:
+                continue
+            text = _first(v, TEXT_KEYS)
+            if not isinstance(text, str) or not text.strip():
+                continue
+            author, text = _author(v), dom_text(text)
+            dedup = (author, text)
+            if dedup in seen:
+                continue
+            seen.add(dedup)
+            out.append({"author": author, "text": text, "nickname": _nickname(v),
+                        "posted_at": _first(v, TIME_KEYS)})
+    return out
+
+
+def state_comments(scripts: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """comments() of script bodies from the page or from a plain fetch (scripts_from_html)."""
+    return comments(parse_blobs(scripts))
+
+
+def cursors(blobs: List[Any]) -> List[Dict[str, Any]]:
+    """Pagination hints: every dict carrying a cursor and/or a has-more flag."""
+    out = []
+    for blob in blobs:
+        for key, v in walk(blob):
+            if not isinstance(v, dict):
+                continue
+            cur = _first(v, CURSOR_KEYS)
+            more = next((v[k] for k in HAS_MORE_KEYS if k in v), None)
+            if cur is None and more is None:
+                continue
+            out.append({
+                "key": key, "cursor": cur,
+                "has_more": bool(more) if more is not None else None,
+                "lists": [k for k, x in v.items() if isinstance(x, list)],
+            })
+    return out
+
+
+def has_more(blobs: List[Any], scope: Optional[str] = None) -> bool:
+    """
+    False only if the state explicitly says there is nothing more to load.
+    With `scope` (e.g. "comment") only flags next to, or keyed by, a matching
+    list count, so a related-posts feed can't end a comment crawl.
+    """
+    flags = []
+    for c in cursors(blobs):
+        if c["has_more"] is None:
+            continue
+        if scope and scope not in (c["key"] or "").lower() and not any(scope in k.lower() for k in c["lists"]):
+            continue
+        flags.append(c["has_more"])
+    return not flags or any(flags)
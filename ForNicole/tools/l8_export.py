@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Incremental columnar export of stored comments for analysis.
+
+    python l8_export.py --out exports/comments                 # Parquet, append new rows
+    python l8_export.py --out exports/comments-ipc --format ipc
+    python l8_export.py --out exports/comments --restart       # from the first row again
+
+Rows are written as a Hive-partitioned dataset, ``day=YYYY-MM-DD/`` (day of
+``scraped_at``; rows without one go to ``day=unknown/``), one file per day
+per chunk.  There is deliberately no per-post level (it meant many tiny
+files per day); filter on ``post_url`` instead.  ``model_scores`` JSON becomes one
+float column per Detoxify label (``tox_toxicity``, ``tox_insult``, ...), so
+readers never parse JSON and can prune to the columns they need:
+
+    import pandas as pd
+    df = pd.read_parquet("exports/comments", columns=["post_url", "tox_toxicity"],
+                         filters=[("day", ">=", "2024-05-01")])
+
+``ipc`` writes uncompressed Arrow IPC files, which ``pyarrow`` can
+memory-map instead of reading.  Runs follow commit order, not
+``scraped_at``: the crawl stamps ``scraped_at`` before scoring and the
+batch writer interleaves posts, so an older timestamp can commit after a
+newer one.  Triggers keep ``export_log`` (``seq AUTOINCREMENT``, one row per
+comment id) bumped to a fresh ``seq`` whenever a comment is inserted,
+replaced or re-stamped; writes are serialized, so ``seq`` order is commit
+order.  Each run continues after the last exported ``seq`` of that output,
+recorded in ``export_checkpoint`` after every chunk.  ``scraped_at`` only
+picks the partition.  Delivery is at-least-once: a re-crawled comment (or
+a chunk interrupted before its checkpoint) appears again in a later file,
+so dedupe on ``id`` keeping the latest ``scraped_at``.  Needs ``pyarrow``.
+"""
+import argparse
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from db import connect
+from l8_store import tune
+from utils import get_logger, utc_now_iso
+
+# Detoxify labels across the original/unbiased/multilingual checkpoints
+TOX_LABELS = ("toxicity", "severe_toxicity", "obscene", "threat", "insult",
+              "identity_attack", "sexual_explicit")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_checkpoint (
+    target TEXT PRIMARY KEY,
+    last_scraped_at TEXT NOT NULL,
+    last_rowid INTEGER NOT NULL,    -- export_log.seq of the last exported row
+    rows INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+)
+"""
+
+LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    row_id TEXT NOT NULL UNIQUE
+)
+"""
+
+_UNSAFE_RE = re.compile(r"[^\w.-]+")
+
+
+def _log_triggers(table: str) -> List[str]:
+    # delete + insert rather than OR REPLACE, which an outer statement's conflict clause would override;
+    # either way a rewritten comment moves to a new, higher seq
+    bump = "DELETE FROM export_log WHERE row_id = NEW.id; INSERT INTO export_log (row_id) VALUES (NEW.id);"
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_export_ai" AFTER INSERT ON "{table}" BEGIN {bump} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_export_au" AFTER UPDATE OF id, scraped_at ON "{table}" '
+        f'BEGIN {bump} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_export_ad" AFTER DELETE ON "{table}" '
+        f'BEGIN DELETE FROM export_log WHERE row_id = OLD.id; END',
+    ]
+
+
+def install(conn, table: str, log=None):
+    """export_log and its triggers; on first install, logs every stored row in rowid order."""
+    fresh = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'export_log'").fetchone() is None
+    conn.execute(SCHEMA)
+    conn.execute(LOG_SCHEMA)
+    for stmt in _log_triggers(table):
+        conn.execute(stmt)
+    conn.commit()
+    if fresh:
+        with conn:
+            conn.execute(f'INSERT OR IGNORE INTO export_log (row_id) SELECT id FROM "{table}" '
+                         f'WHERE id IS NOT NULL ORDER BY rowid')
+            # cursors from before the log counted (scraped_at, rowid); start those outputs over
+            dropped = conn.execute("DELETE FROM export_checkpoint").rowcount
+        if log and dropped:
+            log.warning(f"Reset {dropped} export checkpoint(s) to the new commit-order cursor.")
+
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema(
+        [("id", pa.string()), ("post_url", pa.string()), ("post_title", pa.string()),
+         ("author", pa.string()), ("text", pa.string()),
+         ("scraped_at", pa.timestamp("us", tz="UTC")), ("rule_score", pa.float64()),
+         ("flagged", pa.bool_())]
+        + [(f"tox_{k}", pa.float32()) for k in TOX_LABELS]
+        + [("day", pa.string())])
+
+
+def _ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)  # utc_now_iso is UTC
+
+
+def to_columns(rows: List[Tuple]) -> Dict[str, List[Any]]:
+    """(seq, id, post_url, post_title, author, text, scraped_at, model_scores, rule_score, flagged) -> columns."""
+    cols: Dict[str, List[Any]] = {name: [] for name in arrow_schema().names}
+    for _, cid, url, title, author, text, scraped, ms, rs, flag in rows:
+        cols["id"].append(cid)
+        cols["post_url"].append(url)
+        cols["post_title"].append(title)
+        cols["author"].append(author)
+        cols["text"].append(text)
+        cols["scraped_at"].append(_ts(scraped))
+        cols["rule_score"].append(rs)
+        cols["flagged"].append(None if flag is None else bool(flag))
+        try:
+            scores = json.loads(ms) if ms else {}
+        except ValueError:
+            scores = {}
+        for k in TOX_LABELS:
+            v = scores.get(k) if isinstance(scores, dict) else None
+            cols[f"tox_{k}"].append(float(v) if isinstance(v, (int, float)) else None)
+        cols["day"].append(_UNSAFE_RE.sub("_", (scraped or "")[:10]) or "unknown")
+    return cols
+
+
+class Exporter:
+    def __init__(self, db_path: str, out: str, log, fmt: str = "parquet", chunk: int = 50000):
+        self.out = out
+        self.log = log
+        self.fmt = fmt
+        self.chunk = max(1, chunk)
+        self.target = f"{os.path.abspath(out)}|{fmt}"
+        self.conn = connect(db_path)
+        self.table = tune(self.conn)
+        install(self.conn, self.table, log)
+        self.rows = 0
+        self.files = 0
+
+    def checkpoint(self) -> Tuple[str, int]:
+        row = self.conn.execute("SELECT last_scraped_at, last_rowid, rows, files FROM export_checkpoint "
+                                "WHERE target = ?", (self.target,)).fetchone()
+        if not row:
+            return "", 0
+        self.rows, self.files = row[2], row[3]
+        return row[0], row[1]
+
+    def reset(self):
+        self.conn.execute("DELETE FROM export_checkpoint WHERE target = ?", (self.target,))
+        self.conn.commit()
+
+    def _write(self, rows: List[Tuple], run: str, n: int) -> int:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        schema = arrow_schema()
+        table = pa.Table.from_pydict(to_columns(rows), schema=schema)
+        written: List[str] = []
+        ds.write_dataset(
+            table, self.out, format=self.fmt,
+            partitioning=ds.partitioning(pa.schema([schema.field("day")]), flavor="hive"),
+            basename_template=f"part-{run}-{n:05d}-{{i}}.{'parquet' if self.fmt == 'parquet' else 'arrow'}",
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda f: written.append(f.path),
+        )
+        return len(written)
+
+    def run(self, restart: bool = False) -> Dict[str, Any]:
+        if restart:
+            self.reset()
+        last_at, last_seq = self.checkpoint()
+        run = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.log.info(f"Exporting {self.table} to {self.out} ({self.fmt}) after seq {last_seq} "
+                      f"(scraped_at {last_at or '-'!r}).")
+        t0 = time.perf_counter()
+        done = n = 0
+        while True:
+            rows = self.conn.execute(
+                f'SELECT l.seq, c.id, c.post_url, c.post_title, c.author, c.text, c.scraped_at, c.model_scores, '
+                f'c.rule_score, c.flagged FROM export_log l JOIN "{self.table}" c ON c.id = l.row_id '
+                f'WHERE l.seq > ? ORDER BY l.seq LIMIT ?', (last_seq, self.chunk)).fetchall()
+            if not rows:
+                break
+            files = self._write(rows, run, n)
+            n += 1
+            done += len(rows)
+            last_at, last_seq = rows[-1][6] or "", rows[-1][0]
+            self.rows += len(rows)
+            self.files += files
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO export_checkpoint VALUES (?, ?, ?, ?, ?, ?)",
+                                  (self.target, last_at, last_seq, self.rows, self.files, utc_now_iso()))
+            self.log.info(f"Exported {done} rows ({files} files) up to seq {last_seq}.")
+        elapsed = time.perf_counter() - t0
+        return {"rows": done, "total_rows": self.rows, "total_files": self.files, "seconds": round(elapsed, 1),
+                "rows_per_s": round(done / elapsed) if elapsed and done else None}
+
+
+def load(out: str, columns: Optional[List[str]] = None, since: Optional[str] = None, fmt: str = "parquet"):
+    """
+    DataFrame of an export, reading only `columns` and the day partitions >= `since`
+    (``day=unknown`` sorts after every date, so it is included).
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    # explicit string key: "unknown" next to dates must not break type inference
+    parts = ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+    dataset = ds.dataset(out, format=fmt, partitioning=parts)
+    flt = ds.field("day") >= since if since else None
+    return dataset.to_table(columns=columns, filter=flt).to_pandas()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export Lemon8 comments to a partitioned Parquet/Arrow dataset")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "lemon8_comments.sqlite"))
+    parser.add_argument("--out", default=os.getenv("EXPORT_DIR", "exports/comments"), help="dataset directory")
+    parser.add_argument("--format", choices=["parquet", "ipc"], default="parquet")
+    parser.add_argument("--chunk", type=int, default=50000, help="rows per read and per written file set")
+    parser.add_argument("--restart", action="store_true",
+                        help="export from the first row (existing files are kept)")
+    args = parser.parse_args()
+
+    log = get_logger(os.getenv("LOG_LEVEL", "INFO"))
+    exporter = Exporter(args.db, args.out, log, args.format, args.chunk)
+    log.info(f"Export finished: {exporter.run(args.restart)}")
+
+
+if __name__ == "__main__":
+    main()
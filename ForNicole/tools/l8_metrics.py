@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Lightweight timing/counter instrumentation for the Lemon8 crawl pipeline.
+
+Every post gets a ``PostMetrics`` with per-stage timers (navigation,
+networkidle, state parsing, scroll, expand, extract, score) and counters
+(CDP calls, retries, desktop-UA fallbacks, comments).  Closing it appends
+one ``{"type": "post", ...}`` line to ``METRICS_FILE`` and folds it into
+per-(profile, stage) totals; ``flush`` appends a ``{"type": "run"}``
+summary and, with ``PROM_FILE``, rewrites a Prometheus text-format file
+for the node-exporter textfile collector.
+
+Timers are ``perf_counter`` pairs and counters are dict increments, so this
+stays on in production.  CDP calls are counted by wrapping the page in
+``Counted`` (only when a metrics output is configured): every page/locator
+method that isn't pure client-side selector building counts as one
+round-trip.
+"""
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from utils import utc_now_iso
+
+
+# ---------- CDP call counting ----------
+# Methods that only build a selector client-side; everything else on a
+# page/locator/keyboard is one protocol round-trip.
+_LOCAL = {"locator", "nth", "first", "last", "filter", "keyboard", "mouse",
+          "get_by_text", "get_by_role", "get_by_test_id", "set_default_timeout", "url"}
+
+
+class CallCounter:
+    def __init__(self):
+        self.calls = 0
+
+
+class Counted:
+    def __init__(self, target, counter):
+        self._target = target
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _LOCAL:
+            if callable(attr):
+                return lambda *a, **k: Counted(attr(*_raw(a), **k), self._counter)
+            return Counted(attr, self._counter) if hasattr(attr, "__dict__") else attr
+        if not callable(attr):
+            return attr
+
+        def call(*a, **k):
+            self._counter.calls += 1
+            return attr(*_raw(a), **k)
+        return call
+
+    def __bool__(self):
+        return True
+
+
+def _raw(args):
+    return tuple(a._target if isinstance(a, Counted) else a for a in args)
+
+
+# ---------- Per-post ----------
+class PostMetrics(CallCounter):
+    def __init__(self, metrics: "Metrics", url: str, profile: Optional[str] = None):
+        super().__init__()
+        self.metrics = metrics
+        self.url = url
+        self.profile = profile
+        self.stages: Dict[str, float] = {}
+        self.counters: Counter = Counter()
+        self._t0 = time.perf_counter()
+        self._closed = False
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def inc(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    def wrap(self, page):
+        return Counted(page, self) if self.metrics.enabled else page
+
+    def close(self, **fields):
+        if self._closed:
+            return
+        self._closed = True
+        if self.calls:
+            self.counters["cdp_calls"] += self.calls
+        self.metrics._record_post(self, time.perf_counter() - self._t0, fields)
+
+
+# ---------- Run-wide ----------
+class Metrics:
+    def __init__(self, path: Optional[str] = None, prom_path: Optional[str] = None):
+        self.path = path
+        self.prom_path = prom_path
+        self.enabled = bool(path or prom_path)
+        self._lock = threading.Lock()
+        self._fh = None
+        # (profile, stage) -> [calls, total_s, max_s]
+        self.stages: Dict[Tuple[str, str], list] = {}
+        self.counters: Counter = Counter()   # (profile, name) -> n
+        self.started = time.time()
+
+    def post(self, url: str, profile: Optional[str] = None) -> PostMetrics:
+        return PostMetrics(self, url, profile)
+
+    def observe(self, stage: str, seconds: float, profile: Optional[str] = None):
+        """Stage time measured outside a post (e.g. the DB writer thread)."""
+        with self._lock:
+            self._add_stage(profile or "", stage, seconds)
+
+    def inc(self, name: str, n: int = 1, profile: Optional[str] = None):
+        with self._lock:
+            self.counters[(profile or "", name)] += n
+
+    def _add_stage(self, profile: str, stage: str, seconds: float):
+        st = self.stages.get((profile, stage))
+        if st is None:
+            st = self.stages[(profile, stage)] = [0, 0.0, 0.0]
+        st[0] += 1
+        st[1] += seconds
+        st[2] = max(st[2], seconds)
+
+    def _record_post(self, pm: PostMetrics, total_s: float, fields: Dict[str, Any]):
+        profile = pm.profile or ""
+        with self._lock:
+            for name, s in pm.stages.items():
+                self._add_stage(profile, name, s)
+            self._add_stage(profile, "post_total", total_s)
+            for name, n in pm.counters.items():
+                self.counters[(profile, name)] += n
+            self.counters[(profile, "posts")] += 1
+            self._write({
+                "type": "post", "ts": utc_now_iso(), "url": pm.url, "profile": pm.profile,
+                "total_ms": round(total_s * 1000, 1),
+                "stages_ms": {k: round(v * 1000, 1) for k, v in pm.stages.items()},
+                "counters": dict(pm.counters), **fields,
+            })
+
+    def _write(self, record: Dict[str, Any]):
+        # caller holds the lock
+        if not self.path:
+            return
+        try:
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._fh.write(json.dumps(record, default=str) + "\n")
+        except OSError:
+            self.path = None  # metrics must never break a crawl
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stages: Dict[str, Dict[str, Any]] = {}
+            for (profile, stage), (n, total, mx) in self.stages.items():
+                stages.setdefault(profile or "-", {})[stage] = {
+                    "calls": n, "total_ms": round(total * 1000), "max_ms": round(mx * 1000)}
+            counters: Dict[str, Dict[str, int]] = {}
+            for (profile, name), n in self.counters.items():
+                counters.setdefault(profile or "-", {})[name] = n
+        return {"stages": stages, "counters": counters}
+
+    def write_prom(self):
+        if not self.prom_path:
+            return
+        lines = [
+            "# HELP lemon8_stage_seconds_total Time spent per crawl stage.",
+            "# TYPE lemon8_stage_seconds_total counter",
+        ]
+        with self._lock:
+            stages = sorted(self.stages.items())
+            counters = sorted(self.counters.items())
+        for (profile, stage), (_, total, _) in stages:
+            lines.append(f'lemon8_stage_seconds_total{{profile="{_esc(profile)}",stage="{stage}"}} {total:.6f}')
+        lines += ["# HELP lemon8_stage_calls_total Timed executions per crawl stage.",
+                  "# TYPE lemon8_stage_calls_total counter"]
+        for (profile, stage), (n, _, _) in stages:
+            lines.append(f'lemon8_stage_calls_total{{profile="{_esc(profile)}",stage="{stage}"}} {n}')
+        lines += ["# HELP lemon8_stage_seconds_max Slowest single execution per crawl stage.",
+                  "# TYPE lemon8_stage_seconds_max gauge"]
+        for (profile, stage), (_, _, mx) in stages:
+            lines.append(f'lemon8_stage_seconds_max{{profile="{_esc(profile)}",stage="{stage}"}} {mx:.6f}')
+        lines += ["# HELP lemon8_events_total Crawl counters (cdp_calls, retries, desktop_fallbacks, ...).",
+                  "# TYPE lemon8_events_total counter"]
+        for (profile, name), n in counters:
+            lines.append(f'lemon8_events_total{{profile="{_esc(profile)}",event="{name}"}} {n}')
+        lines.append(f"lemon8_run_started_seconds {self.started:.0f}")
+        tmp = f"{self.prom_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, self.prom_path)
+        except OSError:
+            pass
+
+    def flush(self, **extra):
+        summary = self.summary()
+        with self._lock:
+            self._write({"type": "run", "ts": utc_now_iso(), **summary, **extra})
+        self.write_prom()
+        return summary
+
+    def close(self, **extra):
+        self.flush(**extra)
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def _esc(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+_metrics: Dict[Tuple[Optional[str], Optional[str]], Metrics] = {}
+_metrics_lock = threading.Lock()
+
+def get_metrics(cfg) -> Metrics:
+    # one collector per output pair per process
+    key = (cfg.get("METRICS_FILE"), cfg.get("PROM_FILE"))
+    with _metrics_lock:
+        m = _metrics.get(key)
+        if m is None:
+            m = _metrics[key] = Metrics(*key)
+        return m
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Offline replay of debug/ snapshots.
+
+``save_debug`` records every snapshot in ``debug/manifest.jsonl`` (url,
+label, html path).  ``ReplayStore`` loads that manifest and the replay
+browsers fulfil document requests for known URLs from disk via
+``context.route`` and abort everything else, so the crawler stages can be
+run and benchmarked without network access.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+MANIFEST = "manifest.jsonl"
+
+# executable scripts would re-hydrate the SPA against a dead network; JSON
+# state and JSON-LD are kept because the extractors read them
+_SCRIPT_RE = re.compile(r"<script\b([^>]*)>.*?</script\s*>", re.I | re.S)
+_JSON_TYPE_RE = re.compile(r"type\s*=\s*[\"']?application/(?:ld\+)?json", re.I)
+
+
+def url_key(url: str) -> str:
+    parts = urlsplit(url or "")
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+def record_snapshot(debug_dir: Path, url: str, label: str, html_path: Path, taken_at: str):
+    try:
+        with open(debug_dir / MANIFEST, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "label": label, "html": html_path.name, "ts": taken_at}) + "\n")
+    except Exception:
+        pass
+
+
+def strip_scripts(html: str) -> str:
+    return _SCRIPT_RE.sub(lambda m: m.group(0) if _JSON_TYPE_RE.search(m.group(1)) else "", html)
+
+
+class ReplayStore:
+    def __init__(self, debug_dir="debug", keep_scripts: bool = False):
+        self.dir = Path(debug_dir)
+        self.keep_scripts = keep_scripts
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        manifest = self.dir / MANIFEST
+        if manifest.exists():
+            for line in manifest.read_text(encoding="utf-8").splitlines():
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                if (self.dir / e.get("html", "")).is_file():
+                    # latest snapshot of a URL wins
+                    self.entries[url_key(e["url"])] = e
+
+    def __len__(self):
+        return len(self.entries)
+
+    def html_for(self, url: str) -> Optional[str]:
+        e = self.entries.get(url_key(url))
+        if not e:
+            self.misses += 1
+            return None
+        self.hits += 1
+        html = (self.dir / e["html"]).read_text(encoding="utf-8")
+        return html if self.keep_scripts else strip_scripts(html)
+
+
+def _replay_handler(store: ReplayStore):
+    def handler(route):
+        req = route.request
+        html = store.html_for(req.url) if req.resource_type == "document" else None
+        if html is not None:
+            return route.fulfill(status=200, content_type="text/html; charset=utf-8", body=html)
+        return route.abort()  # offline: nothing else leaves the machine
+    return handler
+
+
+class ReplayBrowser:
+    """Wraps a sync Browser so every new context is served from the store."""
+
+    def __init__(self, browser, store: ReplayStore):
+        self._browser = browser
+        self.store = store
+
+    def new_context(self, **kwargs):
+        ctx = self._browser.new_context(**kwargs)
+        ctx.route("**/*", _replay_handler(self.store))
+        return ctx
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+class AsyncReplayBrowser:
+    def __init__(self, browser, store: ReplayStore):
+        self._browser = browser
+        self.store = store
+
+    async def new_context(self, **kwargs):
+        ctx = await self._browser.new_context(**kwargs)
+        handler = _replay_handler(self.store)
+
+        async def async_handler(route):
+            return await handler(route)
+        await ctx.route("**/*", async_handler)
+        return ctx
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
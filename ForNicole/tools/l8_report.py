@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Reports over the Lemon8 comments DB backed by incrementally maintained aggregates.
+
+    python l8_report.py init                      # install aggregates + FTS, backfill once
+    python l8_report.py posts --limit 20
+    python l8_report.py authors --out authors.csv
+    python l8_report.py daily --since 2024-01-01 --out daily.parquet
+    python l8_report.py search "scam OR fake" --flagged
+    python l8_report.py rebuild                   # recompute aggregates from scratch
+
+Triggers on the comments table keep three small tables current on every
+insert/update/delete: per-post and per-author counts (comments, flagged,
+rule-score and toxicity sums) and a daily histogram, plus an FTS5 index on
+``text``.  Reports then read a few hundred aggregate rows instead of
+scanning the comments table.  A ``BEFORE INSERT`` trigger deletes an
+existing row with the same ``id`` first, so ``INSERT OR REPLACE`` and
+upserts from any connection go through the delete + insert triggers
+exactly once, whatever its ``recursive_triggers`` setting.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from db import connect
+from l8_store import tune
+from utils import get_logger
+
+AGG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg_post (
+    post_url TEXT PRIMARY KEY,
+    post_title TEXT,
+    comments INTEGER NOT NULL DEFAULT 0,
+    flagged INTEGER NOT NULL DEFAULT 0,
+    rule_sum REAL NOT NULL DEFAULT 0,
+    tox_sum REAL NOT NULL DEFAULT 0,
+    last_scraped TEXT
+);
+CREATE TABLE IF NOT EXISTS agg_author (
+    author TEXT PRIMARY KEY,
+    comments INTEGER NOT NULL DEFAULT 0,
+    flagged INTEGER NOT NULL DEFAULT 0,
+    rule_sum REAL NOT NULL DEFAULT 0,
+    tox_sum REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS agg_daily (
+    day TEXT PRIMARY KEY,
+    comments INTEGER NOT NULL DEFAULT 0,
+    flagged INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_agg_post_flagged ON agg_post (flagged);
+CREATE INDEX IF NOT EXISTS idx_agg_author_flagged ON agg_author (flagged);
+"""
+
+AGG_TABLES = ("agg_post", "agg_author", "agg_daily")
+
+
+def _flag(r: str) -> str:
+    return f"(coalesce({r}.flagged, 0) = 1)"
+
+
+def _tox(r: str) -> str:
+    return f"coalesce(json_extract({r}.model_scores, '$.toxicity'), 0)"
+
+
+def _apply(r: str, sign: str) -> str:
+    """Statements adding (sign '+') or removing (sign '-') row alias `r` from the aggregates."""
+    f, t = _flag(r), _tox(r)
+    return f"""
+    INSERT INTO agg_post (post_url, post_title, comments, flagged, rule_sum, tox_sum, last_scraped)
+    VALUES ({r}.post_url, {r}.post_title, {sign}1, {sign}{f}, {sign}coalesce({r}.rule_score, 0), {sign}{t},
+            {r}.scraped_at)
+    ON CONFLICT(post_url) DO UPDATE SET
+        post_title = coalesce(excluded.post_title, post_title),
+        comments = comments {sign} 1, flagged = flagged {sign} {f},
+        rule_sum = rule_sum {sign} coalesce({r}.rule_score, 0), tox_sum = tox_sum {sign} {t},
+        last_scraped = max(coalesce(last_scraped, ''), coalesce(excluded.last_scraped, ''));
+    INSERT INTO agg_author (author, comments, flagged, rule_sum, tox_sum)
+    VALUES (coalesce({r}.author, ''), {sign}1, {sign}{f}, {sign}coalesce({r}.rule_score, 0), {sign}{t})
+    ON CONFLICT(author) DO UPDATE SET
+        comments = comments {sign} 1, flagged = flagged {sign} {f},
+        rule_sum = rule_sum {sign} coalesce({r}.rule_score, 0), tox_sum = tox_sum {sign} {t};
+    INSERT INTO agg_daily (day, comments, flagged)
+    VALUES (substr(coalesce({r}.scraped_at, ''), 1, 10), {sign}1, {sign}{f})
+    ON CONFLICT(day) DO UPDATE SET comments = comments {sign} 1, flagged = flagged {sign} {f};
+"""
+
+
+def _triggers(table: str) -> List[str]:
+    fts = f"{table}_fts"
+    return [
+        # REPLACE only fires delete triggers with recursive_triggers on; an explicit
+        # delete of the conflicting row fires them on every connection
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_agg_bi" BEFORE INSERT ON "{table}" BEGIN '
+        f'DELETE FROM "{table}" WHERE id = NEW.id; END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_agg_ai" AFTER INSERT ON "{table}" BEGIN {_apply("NEW", "+")} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_agg_ad" AFTER DELETE ON "{table}" BEGIN {_apply("OLD", "-")} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_agg_au" AFTER UPDATE ON "{table}" BEGIN '
+        f'{_apply("OLD", "-")} {_apply("NEW", "+")} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_fts_ai" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}" (rowid, text) VALUES (NEW.rowid, NEW.text); END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_fts_ad" AFTER DELETE ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}" ("{fts}", rowid, text) VALUES (\'delete\', OLD.rowid, OLD.text); END',
+        f'CREATE TRIGGER IF NOT EXISTS "{table}_fts_au" AFTER UPDATE OF text ON "{table}" BEGIN '
+        f'INSERT INTO "{fts}" ("{fts}", rowid, text) VALUES (\'delete\', OLD.rowid, OLD.text); '
+        f'INSERT INTO "{fts}" (rowid, text) VALUES (NEW.rowid, NEW.text); END',
+    ]
+
+
+def _has_table(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def has_fts(conn, table: str) -> bool:
+    return _has_table(conn, f"{table}_fts")
+
+
+def rebuild(conn, table: str):
+    """Recompute every aggregate (and the FTS index) from the comments table."""
+    with conn:
+        for t in AGG_TABLES:
+            conn.execute(f"DELETE FROM {t}")
+        f, tx = _flag("c"), _tox("c")
+        conn.execute(f"""
+            INSERT INTO agg_post (post_url, post_title, comments, flagged, rule_sum, tox_sum, last_scraped)
+            SELECT post_url, max(post_title), count(*), sum({f}), sum(coalesce(rule_score, 0)), sum({tx}),
+                   max(scraped_at)
+            FROM "{table}" c GROUP BY post_url""")
+        conn.execute(f"""
+            INSERT INTO agg_author (author, comments, flagged, rule_sum, tox_sum)
+            SELECT coalesce(author, ''), count(*), sum({f}), sum(coalesce(rule_score, 0)), sum({tx})
+            FROM "{table}" c GROUP BY coalesce(author, '')""")
+        conn.execute(f"""
+            INSERT INTO agg_daily (day, comments, flagged)
+            SELECT substr(coalesce(scraped_at, ''), 1, 10), count(*), sum({f})
+            FROM "{table}" c GROUP BY 1""")
+        if has_fts(conn, table):
+            conn.execute(f"INSERT INTO \"{table}_fts\" (\"{table}_fts\") VALUES ('rebuild')")
+
+
+def install(conn, log=None) -> str:
+    """Create aggregates, FTS5 index and triggers if missing; backfills on first install."""
+    table = tune(conn)
+    # installs without the BEFORE INSERT trigger may have double-counted replaced rows
+    fresh = not _has_table(conn, "agg_post") or not _has_table(conn, f"{table}_agg_bi")
+    conn.executescript(AGG_SCHEMA)
+    stmts = _triggers(table)
+    try:
+        conn.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS "{table}_fts" '
+                     f'USING fts5(text, content="{table}", content_rowid="rowid")')
+    except sqlite3.OperationalError as e:
+        # sqlite built without FTS5: aggregates still work, search doesn't
+        stmts = [s for s in stmts if "_fts_" not in s]
+        if log:
+            log.warning(f"FTS5 unavailable ({e}); full-text search disabled.")
+    for s in stmts:
+        conn.execute(s)
+    conn.commit()
+    if fresh:
+        t0 = time.perf_counter()
+        rebuild(conn, table)
+        if log:
+            log.info(f"Backfilled report aggregates in {time.perf_counter() - t0:.1f}s.")
+    return table
+
+
+# ---------- Queries ----------
+def top_posts(conn, limit: int = 20, order: str = "flagged") -> List[Dict[str, Any]]:
+    return _rows(conn, f"""
+        SELECT post_url, post_title, comments, flagged,
+               round(1.0 * flagged / max(comments, 1), 4) AS flag_rate,
+               round(rule_sum / max(comments, 1), 3) AS avg_rule_score,
+               round(tox_sum / max(comments, 1), 4) AS avg_toxicity, last_scraped
+        FROM agg_post WHERE comments > 0 ORDER BY {order} DESC LIMIT ?""", (limit,))
+
+
+def top_authors(conn, limit: int = 20, min_comments: int = 1) -> List[Dict[str, Any]]:
+    return _rows(conn, """
+        SELECT author, comments, flagged,
+               round(1.0 * flagged / max(comments, 1), 4) AS flag_rate,
+               round(rule_sum / max(comments, 1), 3) AS avg_rule_score,
+               round(tox_sum / max(comments, 1), 4) AS avg_toxicity
+        FROM agg_author WHERE comments >= ? ORDER BY flagged DESC, avg_toxicity DESC LIMIT ?""",
+                 (min_comments, limit))
+
+
+def daily(conn, since: Optional[str] = None) -> List[Dict[str, Any]]:
+    return _rows(conn, """
+        SELECT day, comments, flagged, round(1.0 * flagged / max(comments, 1), 4) AS flag_rate
+        FROM agg_daily WHERE comments > 0 AND day >= ? ORDER BY day""", (since or "",))
+
+
+def search(conn, table: str, query: str, limit: int = 50, flagged_only: bool = False) -> List[Dict[str, Any]]:
+    if not has_fts(conn, table):
+        raise RuntimeError("No FTS5 index; run `l8_report.py init` with an FTS5-enabled sqlite.")
+    where = f"AND {_flag('c')}" if flagged_only else ""
+    return _rows(conn, f"""
+        SELECT c.post_url, c.author, c.text, c.scraped_at, c.rule_score, c.flagged
+        FROM "{table}_fts" f JOIN "{table}" c ON c.rowid = f.rowid
+        WHERE "{table}_fts" MATCH ? {where} ORDER BY f.rank LIMIT ?""", (query, limit))
+
+
+def _rows(conn, sql: str, params: Sequence = ()) -> List[Dict[str, Any]]:
+    cur = conn.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+# ---------- Output ----------
+def export(rows: List[Dict[str, Any]], path: str):
+    import pandas as pd
+    df = pd.DataFrame(rows)
+    if path.endswith(".parquet"):
+        df.to_parquet(path, index=False)  # needs pyarrow or fastparquet
+    else:
+        df.to_csv(path, index=False)
+
+
+def print_table(rows: List[Dict[str, Any]], width: int = 60):
+    if not rows:
+        print("(no rows)")
+        return
+    cols = list(rows[0])
+    print("\t".join(cols))
+    for r in rows:
+        print("\t".join("" if r[c] is None else str(r[c]).replace("\n", " ")[:width] for c in cols))
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Lemon8 comment reports")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "lemon8_comments.sqlite"))
+    parser.add_argument("--out", help="export to .csv or .parquet instead of printing")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("init", help="install aggregate tables, FTS index and triggers")
+    sub.add_parser("rebuild", help="recompute aggregates and FTS from the comments table")
+    p = sub.add_parser("posts", help="flagged comments per post")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--order", choices=["flagged", "flag_rate", "comments", "avg_toxicity"], default="flagged")
+    a = sub.add_parser("authors", help="top toxic authors")
+    a.add_argument("--limit", type=int, default=20)
+    a.add_argument("--min-comments", type=int, default=1)
+    d = sub.add_parser("daily", help="flag rate per day")
+    d.add_argument("--since", help="YYYY-MM-DD")
+    s = sub.add_parser("search", help="full-text search over comment text (FTS5 syntax)")
+    s.add_argument("query")
+    s.add_argument("--limit", type=int, default=50)
+    s.add_argument("--flagged", action="store_true")
+    args = parser.parse_args()
+
+    log = get_logger(os.getenv("LOG_LEVEL", "INFO"))
+    conn = connect(args.db)
+    table = install(conn, log)
+    t0 = time.perf_counter()
+    if args.cmd == "init":
+        log.info(f"Report aggregates ready on {table}.")
+        return
+    if args.cmd == "rebuild":
+        rebuild(conn, table)
+        log.info(f"Rebuilt aggregates in {time.perf_counter() - t0:.1f}s.")
+        return
+    if args.cmd == "posts":
+        rows = top_posts(conn, args.limit, args.order)
+    elif args.cmd == "authors":
+        rows = top_authors(conn, args.limit, args.min_comments)
+    elif args.cmd == "daily":
+        rows = daily(conn, args.since)
+    else:
+        try:
+            rows = search(conn, table, args.query, args.limit, args.flagged)
+        except (RuntimeError, sqlite3.OperationalError) as e:
+            log.error(f"Search failed: {e}")
+            sys.exit(2)
+    log.info(f"{args.cmd}: {len(rows)} rows in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    if args.out:
+        export(rows, args.out)
+        log.info(f"Wrote {args.out}")
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
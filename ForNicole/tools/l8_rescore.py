@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Offline re-scoring of stored comments (no browser, no network).
+
+    python l8_rescore.py                          # new thresholds/rules, keep stored model scores
+    python l8_rescore.py --model rescore          # also re-run Detoxify in batches
+    python l8_rescore.py --rule-thresh 2.5 --job thresh-2.5
+    python l8_rescore.py --restart                # ignore the checkpoint for this job
+
+Rows are read in rowid order, ``--chunk`` at a time.  Rule scores are
+computed across a process pool (RULES_FILE engine or ``rules.rule_score``
+in each worker), model scores either come from the stored JSON or from
+the warm Detoxify scorer (through the score cache), and ``flagged`` is
+recomputed with the same test as the crawler.  Only rows whose values
+changed are updated, with one ``executemany`` per chunk; the checkpoint
+(last rowid) is written in the same transaction, so an interrupted run
+resumes exactly where it stopped.  A run that reaches the last row deletes
+its checkpoint, and a checkpoint made with other thresholds, rules or
+model mode is discarded, so the next run always applies its own params to
+every row.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import monitor_lemon8 as m8
+from db import connect
+from l8_cache import ScoreCache, model_version
+from l8_rules import get_rule_engine
+from l8_scoring import get_scorer
+from l8_store import tune
+from utils import utc_now_iso, json_dumps
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rescore_checkpoint (
+    job TEXT PRIMARY KEY,
+    last_rowid INTEGER NOT NULL,
+    rows_seen INTEGER NOT NULL,
+    rows_changed INTEGER NOT NULL,
+    params TEXT,
+    updated_at TEXT NOT NULL
+)
+"""
+
+# ---------- Worker side ----------
+_worker_cfg: Dict[str, Any] = {}
+
+
+def _init_worker(rules_file: Optional[str]):
+    _worker_cfg["RULES_FILE"] = rules_file
+    _worker_cfg["RULES_RELOAD_S"] = 1e9  # a backfill scores against one rules version
+
+
+def _rule_scores(texts: List[str]) -> List[float]:
+    return m8.rule_scores(texts, get_rule_engine(_worker_cfg))
+
+
+# ---------- Driver ----------
+class Rescorer:
+    def __init__(self, cfg, log, chunk: int = 5000, workers: int = 0, model: str = "keep",
+                 job: str = "default"):
+        self.cfg = cfg
+        self.log = log
+        self.chunk = max(1, chunk)
+        self.model = model
+        self.job = job
+        self.conn = connect(cfg["DB_PATH"])
+        self.table = tune(self.conn)
+        self.conn.execute(SCHEMA)
+        self.conn.commit()
+        self.cache = ScoreCache(self.conn, cfg["SCORE_CACHE_SIZE"]) if cfg["SCORE_CACHE"] else None
+        self.pool = ProcessPoolExecutor(workers or None, initializer=_init_worker,
+                                        initargs=(cfg.get("RULES_FILE"),))
+        self.slices = max(1, workers or os.cpu_count() or 1)
+        self.seen = 0
+        self.changed = 0
+
+    def params(self) -> Dict[str, Any]:
+        engine = get_rule_engine(self.cfg)
+        return {"rule_thresh": self.cfg["RULE_THRESH"], "toxic_thresh": self.cfg["TOXIC_THRESH"],
+                "rules": engine.version if engine else "rules.rule_score", "model": self.model}
+
+    def checkpoint(self) -> int:
+        row = self.conn.execute("SELECT last_rowid, rows_seen, rows_changed, params FROM rescore_checkpoint "
+                                "WHERE job = ?", (self.job,)).fetchone()
+        if not row:
+            return 0
+        if row[3] and json.loads(row[3]) != self.params():
+            self.log.warning(f"Checkpoint for job {self.job!r} was made with {row[3]}; "
+                             f"starting over with the new params.")
+            self.reset()
+            return 0
+        self.seen, self.changed = row[1], row[2]
+        return row[0]
+
+    def reset(self):
+        self.conn.execute("DELETE FROM rescore_checkpoint WHERE job = ?", (self.job,))
+        self.conn.commit()
+
+    def _rules(self, texts: List[str]) -> List[float]:
+        step = -(-len(texts) // self.slices)
+        parts = [texts[i:i + step] for i in range(0, len(texts), step)]
+        out: List[float] = []
+        for scores in self.pool.map(_rule_scores, parts):
+            out.extend(scores)
+        return out
+
+    def _models(self, texts: List[str], stored: List[Optional[str]]):
+        if self.model == "drop":
+            return [None] * len(texts)
+        if self.model == "keep":
+            return [json.loads(s) if s else None for s in stored]
+        compute = get_scorer(self.cfg, self.log).predict
+        if self.cache is None:
+            return compute(texts)
+        return self.cache.cached("detox", model_version(self.cfg["DETOX_MODEL"]), texts, compute)
+
+    def _process(self, rows) -> int:
+        texts = [r[1] or "" for r in rows]
+        r_scores = self._rules(texts)
+        ml = self._models(texts, [r[3] for r in rows])
+        rt, tt = self.cfg["RULE_THRESH"], self.cfg["TOXIC_THRESH"]
+        updates = []
+        for (rowid, _, old_rs, old_ms, old_flag), rs, ms in zip(rows, r_scores, ml):
+            rs = float(rs)
+            ms_json = old_ms if self.model == "keep" else (json_dumps(ms) if ms else None)
+            flag = m8.is_flagged(rs, ms, rt, tt)
+            if old_rs != rs or old_ms != ms_json or bool(old_flag) != flag or old_flag is None:
+                updates.append((rs, ms_json, flag, rowid))
+        with self.conn:
+            if updates:
+                self.conn.executemany(f'UPDATE "{self.table}" SET rule_score = ?, model_scores = ?, flagged = ? '
+                                      f'WHERE rowid = ?', updates)
+            self.seen += len(rows)
+            self.changed += len(updates)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rescore_checkpoint VALUES (?, ?, ?, ?, ?, ?)",
+                (self.job, rows[-1][0], self.seen, self.changed, json.dumps(self.params()), utc_now_iso()))
+        return len(updates)
+
+    def run(self, restart: bool = False, progress_every_s: float = 10.0) -> Dict[str, Any]:
+        if restart:
+            self.reset()
+        last = self.checkpoint()
+        total = self.conn.execute(f'SELECT count(*) FROM "{self.table}" WHERE rowid > ?', (last,)).fetchone()[0]
+        self.log.info(f"Rescoring {total} rows of {self.table} from rowid {last} (job {self.job!r}, "
+                      f"{self.params()}).")
+        t0 = last_report = time.perf_counter()
+        done = 0
+        try:
+            while True:
+                rows = self.conn.execute(
+                    f'SELECT rowid, text, rule_score, model_scores, flagged FROM "{self.table}" '
+                    f'WHERE rowid > ? ORDER BY rowid LIMIT ?', (last, self.chunk)).fetchall()
+                if not rows:
+                    break
+                self._process(rows)
+                last = rows[-1][0]
+                done += len(rows)
+                now = time.perf_counter()
+                if now - last_report >= progress_every_s:
+                    rate = done / (now - t0)
+                    eta = (total - done) / rate if rate else 0
+                    self.log.info(f"Rescored {done}/{total} rows ({rate:.0f} rows/s, "
+                                  f"{self.changed} changed, ETA {eta:.0f}s).")
+                    last_report = now
+            self.reset()  # complete: the next run starts from the first row
+        finally:
+            self.pool.shutdown()
+        elapsed = time.perf_counter() - t0
+        return {"rows": done, "changed": self.changed, "seconds": round(elapsed, 1),
+                "rows_per_s": round(done / elapsed) if elapsed else None}
+
+
+def main():
+    cfg = m8.load_env()
+    log = m8.get_logger(cfg["LOG_LEVEL"])
+    parser = argparse.ArgumentParser(description="Re-score stored Lemon8 comments offline")
+    parser.add_argument("--db", default=cfg["DB_PATH"])
+    parser.add_argument("--chunk", type=int, default=5000, help="rows per read/write transaction")
+    parser.add_argument("--workers", type=int, default=0, help="rule-scoring processes (0 = CPU count)")
+    parser.add_argument("--model", choices=["keep", "rescore", "drop"], default="keep",
+                        help="keep stored model scores, re-run Detoxify, or clear them")
+    parser.add_argument("--rule-thresh", type=float, default=cfg["RULE_THRESH"])
+    parser.add_argument("--toxic-thresh", type=float, default=cfg["TOXIC_THRESH"])
+    parser.add_argument("--rules-file", default=cfg["RULES_FILE"], help="compiled rules JSON (l8_rules)")
+    parser.add_argument("--job", default="default", help="checkpoint name")
+    parser.add_argument("--restart", action="store_true", help="start from the first row")
+    args = parser.parse_args()
+
+    cfg.update({"DB_PATH": args.db, "RULE_THRESH": args.rule_thresh, "TOXIC_THRESH": args.toxic_thresh,
+                "RULES_FILE": args.rules_file, "RULES_RELOAD_S": 1e9})
+    if args.model == "rescore":
+        cfg["USE_DETOX"] = True
+    rescorer = Rescorer(cfg, log, args.chunk, args.workers, args.model, args.job)
+    log.info(f"Rescore finished: {rescorer.run(args.restart)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Request-level resource policy for the Lemon8 crawler.
+
+A policy blocks requests by Playwright resource type (image, media, font,
+ping/beacon) and by one precompiled alternation of URL patterns, so the
+route handler does a set lookup and a single regex search per request.
+Presets:
+
+    default       app-wall/deeplink patterns only (previous behaviour)
+    lean          + images, media, fonts, analytics/beacons
+    extract-only  lean + manifests, event streams, websockets and text tracks;
+                  stylesheets still load so visibility checks keep working
+
+Blocked bytes can't be measured (the response never arrives), so
+``est_bytes_saved`` uses TYPICAL_BYTES per resource type.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+ANALYTICS_PATTERNS = [
+    r"google-analytics\.com|googletagmanager\.com|doubleclick\.net|googlesyndication\.com",
+    r"connect\.facebook\.net|analytics\.tiktok\.com|mon\.[a-z0-9-]+\.(?:com|net)/monitor",
+    r"sentry\.io|/log/sentry|/collect\?|/beacon|/slardar|/webid|/monitor_browser",
+]
+
+PRESETS: Dict[str, Dict[str, Iterable[str]]] = {
+    "default": {"types": (), "patterns": ()},
+    "lean": {"types": ("image", "media", "font", "ping"), "patterns": ANALYTICS_PATTERNS},
+    "extract-only": {
+        "types": ("image", "media", "font", "ping", "manifest", "eventsource", "websocket", "texttrack"),
+        "patterns": ANALYTICS_PATTERNS,
+    },
+}
+
+# rough per-request transfer sizes, only used for the bytes-saved estimate
+TYPICAL_BYTES = {
+    "image": 40_000, "media": 400_000, "font": 30_000, "ping": 500,
+    "manifest": 2_000, "eventsource": 1_000, "websocket": 1_000, "texttrack": 5_000,
+    "script": 25_000, "xhr": 5_000, "fetch": 5_000, "document": 50_000,
+}
+
+
+class ResourcePolicy:
+    def __init__(self, name: str = "custom", block_types: Iterable[str] = (),
+                 patterns: Iterable[str] = ()):
+        self.name = name
+        self.block_types = frozenset(block_types)
+        pats = list(patterns)
+        self._rx = re.compile("|".join(f"(?:{p})" for p in pats), re.I) if pats else None
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.blocked = Counter()
+        self.est_bytes_saved = 0
+
+    def reason(self, url: str, resource_type: str = "") -> Optional[str]:
+        if resource_type in self.block_types:
+            return resource_type
+        if self._rx is not None and self._rx.search(url):
+            return "pattern"
+        return None
+
+    def should_block(self, url: str, resource_type: str = "") -> bool:
+        why = self.reason(url, resource_type)
+        with self._lock:
+            if why is None:
+                self.allowed += 1
+                return False
+            self.blocked[why] += 1
+            self.est_bytes_saved += TYPICAL_BYTES.get(resource_type, 0)
+        return True
+
+    def summary(self) -> Dict:
+        return {
+            "policy": self.name,
+            "allowed": self.allowed,
+            "blocked": sum(self.blocked.values()),
+            "blocked_by": dict(self.blocked),
+            "est_kb_saved": round(self.est_bytes_saved / 1024),
+        }
+
+
+_policies: Dict[str, ResourcePolicy] = {}
+_policies_lock = threading.Lock()
+
+def get_policy(name: str, base_patterns: Iterable[str] = ()) -> ResourcePolicy:
+    # one policy (and one set of counters) per preset per process
+    if name not in PRESETS:
+        raise ValueError(f"Unknown resource policy {name!r}; choose from {', '.join(PRESETS)}")
+    with _policies_lock:
+        pol = _policies.get(name)
+        if pol is None:
+            preset = PRESETS[name]
+            pol = _policies[name] = ResourcePolicy(
+                name, preset["types"], list(base_patterns) + list(preset["patterns"]))
+        return pol
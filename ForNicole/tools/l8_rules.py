@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Compiled rule engine for comment rule scores.
+
+Rules live in a JSON file (``RULES_FILE``):
+
+    {"rules": [
+        {"name": "insult", "keywords": ["idiot", "loser"], "weight": 3},
+        {"name": "scam",   "regex": "dm me .{0,20}(?:crypto|btc)", "weight": 2, "cap": 1}
+    ]}
+
+Plain word/phrase keywords are matched through a token index (one dict
+lookup per word of the comment, however many keywords there are).  Regex
+rules and keywords containing symbols are also joined into one compiled
+alternation, used only as a prefilter: most comments hit nothing and cost
+a single scan.  Texts that do match are counted with each regex rule's own
+``finditer``, so overlapping rules all score, exactly as a per-rule loop
+would.  A text's score is the sum over rules of ``weight * min(hits, cap)``.
+Keywords match whole words case-insensitively.
+
+The engine reloads the file when its mtime changes (checked at most every
+``reload_every_s``); a file that fails to compile leaves the old rules in
+place.  Cumulative per-rule hit counts are kept in ``hits``.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+_NAMED_GROUP_RE = re.compile(r"\(\?P<[A-Za-z_]\w*>")
+_TOKEN_RE = re.compile(r"\w+")
+_PHRASE_RE = re.compile(r"\w+(?:\s+\w+)*")
+
+
+class Rule:
+    __slots__ = ("name", "pattern", "phrases", "weight", "cap")
+
+    def __init__(self, name: str, pattern: Optional[str] = None, weight: float = 1.0,
+                 cap: Optional[int] = None, phrases: Tuple[str, ...] = ()):
+        self.name = name
+        self.pattern = pattern    # regex part (matched by the shared alternation)
+        self.phrases = phrases    # plain word/phrase keywords (matched by token lookup)
+        self.weight = float(weight)
+        self.cap = cap
+
+
+def _rule_from_spec(i: int, spec: Dict[str, Any]) -> Rule:
+    name = str(spec.get("name") or f"rule{i}")
+    words = {str(w).strip().lower() for w in spec.get("keywords") or () if str(w).strip()}
+    phrases = tuple(sorted(w for w in words if _PHRASE_RE.fullmatch(w)))
+    odd = sorted(words.difference(phrases), key=len, reverse=True)  # e.g. "f*ck", "$$$"
+    parts = []
+    if odd:
+        # whole words like the token index: no word character on either side, even next to a symbol
+        parts.append("(?<!\\w)(?:" + "|".join(re.escape(w) for w in odd) + ")(?!\\w)")
+    if spec.get("regex"):
+        # user groups become non-capturing so two rules can't clash in the shared prefilter
+        parts.append("(?:" + _NAMED_GROUP_RE.sub("(?:", str(spec["regex"])) + ")")
+    if not parts and not phrases:
+        raise ValueError(f"rule {name!r} needs 'keywords' or 'regex'")
+    pattern = "|".join(parts) or None
+    if pattern:
+        re.compile(pattern)  # report the offending rule by name
+    cap = spec.get("cap")
+    return Rule(name, pattern, spec.get("weight", 1.0), int(cap) if cap else None, phrases)
+
+
+class CompiledRules:
+    """
+    Word/phrase keywords go into a token index (first token -> [(rest, rule)]),
+    so they cost one dict lookup per word regardless of how many there are;
+    regex rules and keywords with symbols share a prefilter scan, then each
+    rule counts its own matches.
+    """
+
+    def __init__(self, rules: List[Rule], flags: int = re.I, version: Optional[str] = None):
+        self.rules = rules
+        self.by_name = {r.name: r for r in rules}
+        self.index: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for r in rules:
+            for ph in r.phrases:
+                toks = ph.split()
+                self.index.setdefault(toks[0], []).append((tuple(toks[1:]), r.name))
+        regex_rules = [r for r in rules if r.pattern]
+        # one alternation finds whether anything matches; a single alternation would
+        # drop the shorter/later of two overlapping matches, so hits are per rule
+        self.per_rule = [(r.name, re.compile(r.pattern, flags)) for r in regex_rules]
+        body = "|".join(f"(?:{r.pattern})" for r in regex_rules)
+        self.rx = re.compile(body, flags) if regex_rules else None
+        digest = body + json.dumps(sorted(self.index.items()))
+        self.version = version or hashlib.sha1(digest.encode("utf-8")).hexdigest()[:12]
+
+    def hits(self, text: str) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        if not text:
+            return out
+        if self.index:
+            index = self.index
+            toks = _TOKEN_RE.findall(text.lower())
+            for i, tok in enumerate(toks):
+                cands = index.get(tok)
+                if not cands:
+                    continue
+                for rest, name in cands:
+                    if rest and tuple(toks[i + 1:i + 1 + len(rest)]) != rest:
+                        continue
+                    out[name] = out.get(name, 0) + 1
+        if self.rx is not None and self.rx.search(text):
+            for name, rx in self.per_rule:
+                n = sum(1 for _ in rx.finditer(text))
+                if n:
+                    out[name] = out.get(name, 0) + n
+        return out
+
+    def score_hits(self, hits: Dict[str, int]) -> float:
+        score = 0.0
+        for name, n in hits.items():
+            r = self.by_name[name]
+            score += r.weight * (min(n, r.cap) if r.cap else n)
+        return score
+
+
+class RuleEngine:
+    def __init__(self, path: str, log=None, reload_every_s: float = 5.0):
+        self.path = path
+        self.log = log
+        self.reload_every_s = reload_every_s
+        self.hits: Counter = Counter()
+        self.scored = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.compiled = self._load()
+
+    def _load(self) -> CompiledRules:
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self._mtime = os.path.getmtime(self.path)
+        spec = json.loads(raw.decode("utf-8"))
+        if isinstance(spec, list):
+            spec = {"rules": spec}
+        rules = [_rule_from_spec(i, r) for i, r in enumerate(spec.get("rules", []))]
+        version = str(spec.get("version") or hashlib.sha1(raw).hexdigest()[:12])
+        if self.log:
+            self.log.info(f"Loaded {len(rules)} rules from {self.path} (version {version}).")
+        return CompiledRules(rules, version=version)
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_every_s:
+            return
+        self._checked = now
+        try:
+            if os.path.getmtime(self.path) == self._mtime:
+                return
+            fresh = self._load()
+        except (OSError, ValueError, re.error) as e:
+            if self.log:
+                self.log.error(f"Rule reload failed, keeping version {self.compiled.version}: {e}")
+            return
+        self.compiled = fresh  # single reference swap; callers keep the set they started with
+
+    @property
+    def version(self) -> str:
+        return self.compiled.version
+
+    def score_batch(self, texts: List[str], explain: bool = False):
+        """Scores for every text; with `explain`, also the per-text {rule: hits}."""
+        self.maybe_reload()
+        compiled = self.compiled
+        scores: List[float] = []
+        details: List[Dict[str, int]] = []
+        batch_hits: Counter = Counter()
+        for t in texts:
+            h = compiled.hits(t or "")
+            scores.append(compiled.score_hits(h) if h else 0.0)
+            if h:
+                batch_hits.update(h)
+            if explain:
+                details.append(h)
+        with self._lock:
+            self.hits.update(batch_hits)
+            self.scored += len(texts)
+        return (scores, details) if explain else scores
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        return {"version": self.version, "rules": len(self.compiled.rules), "scored": self.scored,
+                "top_hits": dict(self.hits.most_common(top))}
+
+
+_engines: Dict[str, RuleEngine] = {}
+_engines_lock = threading.Lock()
+
+def get_rule_engine(cfg, log=None) -> Optional[RuleEngine]:
+    # one engine per rules file per process; None keeps rules.rule_score
+    path = cfg.get("RULES_FILE")
+    if not path:
+        return None
+    with _engines_lock:
+        eng = _engines.get(path)
+        if eng is None:
+            eng = _engines[path] = RuleEngine(path, log, cfg.get("RULES_RELOAD_S", 5.0))
+        return eng
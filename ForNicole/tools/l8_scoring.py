@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Persistent Detoxify scoring service.
+
+The model is loaded once per process (``get_scorer``) and kept warm.  Texts
+are scored in fixed-size batches, either synchronously via
+``DetoxScorer.predict`` or through ``AsyncScorer``, a queue the async
+crawler feeds while other pages are still loading.  Both report throughput
+(texts/s) and per-batch latency.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MODEL = "multilingual"
+DEFAULT_BATCH = 32
+
+
+class ScoringStats:
+    def __init__(self):
+        self.texts = 0
+        self.batches = 0
+        self.busy_s = 0.0
+        self.max_batch_s = 0.0
+        self.load_s = 0.0
+
+    def record(self, n: int, dt: float):
+        self.texts += n
+        self.batches += 1
+        self.busy_s += dt
+        self.max_batch_s = max(self.max_batch_s, dt)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "texts": self.texts,
+            "batches": self.batches,
+            "texts_per_s": round(self.texts / self.busy_s, 1) if self.busy_s else 0.0,
+            "avg_batch_ms": round(1000 * self.busy_s / self.batches, 1) if self.batches else 0.0,
+            "max_batch_ms": round(1000 * self.max_batch_s, 1),
+            "model_load_ms": round(1000 * self.load_s, 1),
+        }
+
+
+class DetoxScorer:
+    def __init__(self, model_name: str = DEFAULT_MODEL, batch_size: int = DEFAULT_BATCH,
+                 threads: int = 0, log=None):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.threads = threads
+        self.log = log
+        self.stats = ScoringStats()
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is not None or self._failed:
+            return self._model
+        t0 = time.perf_counter()
+        try:
+            if self.threads > 0:
+                import torch
+                torch.set_num_threads(self.threads)
+            from detoxify import Detoxify
+            self._model = Detoxify(self.model_name)
+        except Exception as e:
+            # same contract as before: no model -> None scores, crawl continues
+            self._failed = True
+            if self.log:
+                self.log.error(f"Detoxify unavailable: {e}")
+        self.stats.load_s = time.perf_counter() - t0
+        return self._model
+
+    def _predict_batch(self, texts: List[str]) -> List[Optional[Dict[str, float]]]:
+        t0 = time.perf_counter()
+        res = self._model.predict(texts)
+        keys = list(res.keys())
+        out = [{k: float(res[k][i]) for k in keys} for i in range(len(texts))]
+        self.stats.record(len(texts), time.perf_counter() - t0)
+        return out
+
+    def predict(self, texts: List[str]) -> List[Optional[Dict[str, float]]]:
+        if not texts:
+            return []
+        with self._lock:
+            if self._load() is None:
+                return [None for _ in texts]
+            out: List[Optional[Dict[str, float]]] = []
+            for i in range(0, len(texts), self.batch_size):
+                chunk = texts[i:i + self.batch_size]
+                try:
+                    out.extend(self._predict_batch(chunk))
+                except Exception as e:
+                    if self.log:
+                        self.log.error(f"Detoxify batch failed: {e}")
+                    out.extend(None for _ in chunk)
+            return out
+
+
+_scorers: Dict[Any, DetoxScorer] = {}
+_scorers_lock = threading.Lock()
+
+def get_scorer(cfg, log=None) -> DetoxScorer:
+    # one warm model per (model, batch, threads) per process
+    key = (cfg.get("DETOX_MODEL", DEFAULT_MODEL), cfg.get("DETOX_BATCH", DEFAULT_BATCH),
+           cfg.get("DETOX_THREADS", 0))
+    with _scorers_lock:
+        scorer = _scorers.get(key)
+        if scorer is None:
+            scorer = _scorers[key] = DetoxScorer(*key, log=log)
+        return scorer
+
+
+class AsyncScorer:
+    """
+    Queue front-end for a DetoxScorer.  ``await score(texts)`` enqueues the
+    texts; a single worker packs texts from many posts into batches of
+    ``batch_size`` (or whatever arrived within ``max_wait`` seconds) and runs
+    them in a thread so the event loop keeps driving pages.
+    """
+
+    def __init__(self, scorer: DetoxScorer, max_wait: float = 0.05, max_pending: int = 4096):
+        self.scorer = scorer
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        return self
+
+    async def close(self):
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+            self._worker = None
+
+    async def score(self, texts: List[str]) -> List[Optional[Dict[str, float]]]:
+        if not texts:
+            return []
+        self.start()
+        loop = asyncio.get_running_loop()
+        futs = []
+        for t in texts:
+            fut = loop.create_future()
+            await self._queue.put((t, fut))
+            futs.append(fut)
+        return list(await asyncio.gather(*futs))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        size = self.scorer.batch_size
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if nxt is None:
+                    closing = True
+                    break
+                batch.append(nxt)
+            texts = [t for t, _ in batch]
+            try:
+                scores = await loop.run_in_executor(None, self.scorer.predict, texts)
+            except Exception:
+                scores = [None for _ in texts]
+            for (_, fut), s in zip(batch, scores):
+                if not fut.done():
+                    fut.set_result(s)
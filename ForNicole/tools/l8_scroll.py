@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Adaptive scroll/wait engine shared by the Lemon8 scroll loops.
+
+Instead of fixed ``wait_for_timeout`` sleeps, each step waits in the page
+for the watched item count to grow (MutationObserver), for the DOM and
+network to go quiet for ``settle_ms`` (no mutations, no finished resource
+loads), or for the ``wait_cap_ms`` cap, whichever comes first.  All loops
+stop on the same criteria (target reached, N steps without growth, max
+steps) and the engine records per-page time spent waiting vs working.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Total matches over a list of selectors (overlaps counted, like locator.count()).
+COUNT_JS = """
+(sels) => {
+  let n = 0;
+  for (const s of sels) { try { n += document.querySelectorAll(s).length; } catch (e) {} }
+  return n;
+}
+"""
+
+WAIT_FOR_GROWTH_JS = """
+async ({sels, prev, timeout, settle}) => {
+  const count = () => {
+    let n = 0;
+    for (const s of sels) { try { n += document.querySelectorAll(s).length; } catch (e) {} }
+    return n;
+  };
+  const t0 = performance.now();
+  const n0 = count();
+  if (n0 > prev) return {count: n0, ms: 0, why: 'grew'};
+  return await new Promise(resolve => {
+    let done = false, last = performance.now(), pending = null, po = null;
+    const finish = (why) => {
+      if (done) return;
+      done = true;
+      mo.disconnect();
+      if (po) po.disconnect();
+      clearInterval(tick);
+      clearTimeout(cap);
+      if (pending) clearTimeout(pending);
+      resolve({count: count(), ms: performance.now() - t0, why: why});
+    };
+    // coalesce mutation bursts into one count every 50 ms
+    const check = () => { pending = null; if (count() > prev) finish('grew'); };
+    const mo = new MutationObserver(() => {
+      last = performance.now();
+      if (!pending) pending = setTimeout(check, 50);
+    });
+    mo.observe(document.documentElement, {childList: true, subtree: true});
+    try {
+      po = new PerformanceObserver(() => { last = performance.now(); });
+      po.observe({type: 'resource'});
+    } catch (e) {}
+    const tick = setInterval(() => {
+      if (performance.now() - last >= settle) finish('quiet');
+    }, Math.max(50, settle / 4));
+    const cap = setTimeout(() => finish('timeout'), timeout);
+  });
+}
+"""
+
+# Scroll the first visible comment container by `frac` of its height, else the window.
+SCROLL_JS = """
+({sels, frac}) => {
+  for (const s of sels) {
+    let el;
+    try { el = document.querySelector(s); } catch (e) { continue; }
+    if (el && el.offsetParent !== null && el.clientHeight > 0) {
+      el.scrollBy(0, Math.floor(el.clientHeight * frac));
+      return true;
+    }
+  }
+  window.scrollBy(0, Math.floor(window.innerHeight * frac));
+  return false;
+}
+"""
+
+
+class StopCriteria:
+    """Shared stop rule: target reached, `stale_limit` steps without growth, or `max_cycles`."""
+
+    def __init__(self, max_cycles: int, stale_limit: int, target: Optional[int] = None):
+        self.max_cycles = max_cycles
+        self.stale_limit = stale_limit
+        self.target = target
+        self.cycles = 0
+        self.stale = 0
+        self.best = -1
+        self.reason: Optional[str] = None
+
+    def observe(self, count: int) -> bool:
+        """Record the count after a step; returns False once the loop should stop."""
+        self.cycles += 1
+        if count > self.best:
+            self.best = count
+            self.stale = 0
+        else:
+            self.stale += 1
+        if self.target is not None and count >= self.target:
+            self.reason = "target"
+        elif self.stale >= self.stale_limit:
+            self.reason = "stale"
+        elif self.cycles >= self.max_cycles:
+            self.reason = "max_cycles"
+        return self.reason is None
+
+
+class ScrollEngine:
+    def __init__(self, wait_cap_ms: int = 2500, settle_ms: int = 600):
+        self.wait_cap_ms = wait_cap_ms
+        self.settle_ms = settle_ms
+        self.loops: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def from_cfg(cls, cfg):
+        return cls(cfg.get("SCROLL_WAIT_MS", 2500), cfg.get("SCROLL_SETTLE_MS", 600))
+
+    def _loop(self, name: str) -> Dict[str, Any]:
+        return self.loops.setdefault(name, {"total_s": 0.0, "wait_s": 0.0, "waits": 0,
+                                            "why": {}, "steps": 0, "stop": None})
+
+    def wait_args(self, sels: List[str], prev: int, timeout_ms: Optional[int] = None,
+                  settle_ms: Optional[int] = None) -> Dict[str, Any]:
+        return {"sels": sels, "prev": prev,
+                "timeout": min(timeout_ms or self.wait_cap_ms, self.wait_cap_ms),
+                "settle": settle_ms or self.settle_ms}
+
+    def record_wait(self, loop: str, seconds: float, why: str):
+        st = self._loop(loop)
+        st["wait_s"] += seconds
+        st["waits"] += 1
+        st["why"][why] = st["why"].get(why, 0) + 1
+
+    def record_stop(self, loop: str, stop: StopCriteria):
+        st = self._loop(loop)
+        st["steps"] += stop.cycles
+        st["stop"] = stop.reason
+
+    @contextmanager
+    def loop(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._loop(name)["total_s"] += time.perf_counter() - t0
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for name, st in self.loops.items():
+            out[name] = {
+                "total_ms": round(st["total_s"] * 1000),
+                "wait_ms": round(st["wait_s"] * 1000),
+                "work_ms": round(max(0.0, st["total_s"] - st["wait_s"]) * 1000),
+                "steps": st["steps"],
+                "stop": st["stop"],
+                "waits": dict(st["why"]),
+            }
+        return out
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Per-post crawl state for incremental Lemon8 monitoring.
+
+Stored in the same SQLite DB as the comments.  For every post we keep the
+most recent comment ids (``utils.make_id``), the comment count shown on the
+page and the last crawl time, so repeat runs can skip unchanged posts, stop
+scrolling once the new comments implied by the count are loaded and only
+score/insert new rows.
+
+Comment lists aren't strictly chronological, so the stored count is only
+advanced after a crawl that loaded the whole list, and only once the
+post's rows are committed (``CrawlState.update`` runs on the writer
+thread via ``BatchWriter.after``); otherwise the next run crawls the post
+again.
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils import utc_now_iso, make_id
+
+MAX_SEEN_IDS = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_state (
+    post_url TEXT PRIMARY KEY,
+    seen_ids TEXT NOT NULL,
+    comment_count INTEGER,
+    last_crawled TEXT NOT NULL
+)
+"""
+
+# Reads the "123 comments" / "Comments (123)" badge; null when there is none.
+COMMENT_COUNT_JS = r"""
+() => {
+  const re = /^\s*(?:comments?\s*[(（]?\s*([\d.,]+\s*[kKmM]?)\s*[)）]?|([\d.,]+\s*[kKmM]?)\s+comments?)\s*$/i;
+  for (const el of document.querySelectorAll('span,div,h2,h3,button,a')) {
+    if (el.children.length > 2) continue;
+    const t = (el.textContent || '').trim();
+    if (!t || t.length > 40) continue;
+    const m = t.match(re);
+    if (m) return (m[1] || m[2]).trim();
+  }
+  return null;
+}
+"""
+
+# innerText of every comment item currently in the DOM, in one round-trip.
+COMMENT_TEXTS_JS = """
+(sels) => {
+  const out = [];
+  for (const s of sels) {
+    document.querySelectorAll(s).forEach(el => out.push(el.innerText || ''));
+  }
+  return out;
+}
+"""
+
+
+def parse_count(raw) -> Optional[int]:
+    # only exact counts are useful for change detection; "1.2k" is not
+    if raw is None:
+        return None
+    s = re.sub(r"[\s,]", "", str(raw))
+    if not s.isdigit():
+        return None
+    return int(s)
+
+
+def comment_id(post_url: str, c: Dict[str, Any]) -> str:
+    # the one id scheme for DOM, JSON-LD and embedded-state comments (l8_embedded maps to DOM fields)
+    return make_id(post_url, c.get("author") or "", c.get("text") or "")
+
+
+def expected_new(prev: Optional[Dict[str, Any]], visible: Optional[int]) -> Optional[int]:
+    """New comments implied by the count badge since the last full crawl; None when it can't tell."""
+    if not prev or prev.get("comment_count") is None or visible is None:
+        return None
+    d = visible - prev["comment_count"]
+    return d if d > 0 else None
+
+
+def comment_ids(post_url: str, comments: Iterable[Dict[str, Any]]) -> List[str]:
+    return [comment_id(post_url, c) for c in comments]
+
+
+class CrawlState:
+    def __init__(self, conn, max_ids: int = MAX_SEEN_IDS):
+        self.conn = conn
+        self.max_ids = max_ids
+        conn.execute(SCHEMA)
+        conn.commit()
+
+    def get(self, post_url: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT seen_ids, comment_count, last_crawled FROM crawl_state WHERE post_url = ?",
+            (post_url,),
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "seen_ids": set(json.loads(row[0])),
+            "comment_count": row[1],
+            "last_crawled": row[2],
+        }
+
+    def update(self, post_url: str, ids: List[str], comment_count: Optional[int], conn=None):
+        """
+        `comment_count` only for a crawl that loaded the full list (None keeps
+        the stored one).  With `conn` (the writer's connection, inside its
+        transaction) nothing is committed here.
+        """
+        own = conn is None
+        conn = self.conn if own else conn
+        # newest ids first, then whatever we had before, capped
+        row = conn.execute(
+            "SELECT seen_ids FROM crawl_state WHERE post_url = ?", (post_url,)
+        ).fetchone()
+        merged, seen = [], set()
+        for cid in list(ids) + (json.loads(row[0]) if row else []):
+            if cid not in seen:
+                seen.add(cid)
+                merged.append(cid)
+            if len(merged) >= self.max_ids:
+                break
+        conn.execute(
+            "INSERT INTO crawl_state (post_url, seen_ids, comment_count, last_crawled) "
+            "VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(post_url) DO UPDATE SET seen_ids = excluded.seen_ids, "
+            "comment_count = COALESCE(excluded.comment_count, crawl_state.comment_count), "
+            "last_crawled = excluded.last_crawled",
+            (post_url, json.dumps(merged), comment_count, utc_now_iso()),
+        )
+        if own:
+            conn.commit()
+
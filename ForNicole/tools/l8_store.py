@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Batched, transactional comment storage around ``db.connect``/``upsert_comments``.
+
+``BatchWriter`` owns its own SQLite connection on a background thread.
+Crawlers hand it rows per post through a bounded queue (``put`` blocks
+when the writer falls behind); the thread groups them into one prepared
+``executemany`` per transaction and commits every ``batch_rows`` rows or
+``interval_s`` seconds, whichever comes first.  The DB runs in WAL mode so
+the crawl-state and score-cache writes on the main connection don't block
+on it, and a crash loses at most one uncommitted batch.  An unexpected
+error stops the thread and is re-raised from the next ``put``/``after``/
+``close`` instead of leaving callers blocked on a queue nobody drains.
+
+``after(fn, mark)`` queues a callback that runs on the writer thread, in
+its own transaction, once every row queued before it is committed; the
+incremental crawl state uses it so a post only counts as crawled after
+its rows are stored.  ``after_write`` picks the right moment for any
+sink; rows returned to a caller instead never update the crawl state, so
+that path is not incremental.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db import connect, upsert_comments
+from l8_metrics import get_metrics
+
+ROW_COLUMNS = ("id", "post_url", "post_title", "author", "text", "scraped_at",
+               "model_scores", "rule_score", "flagged")
+INDEXED_COLUMNS = ("post_url", "flagged", "scraped_at")
+
+# only used when db.connect didn't create a comments table
+FALLBACK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_url TEXT,
+    post_title TEXT,
+    author TEXT,
+    text TEXT,
+    scraped_at TEXT,
+    model_scores TEXT,
+    rule_score REAL,
+    flagged INTEGER
+)
+"""
+
+
+def comments_table(conn) -> str:
+    # whichever table db.connect created for rows shaped like build_rows output
+    names = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    for name in names:
+        cols = {r[1] for r in conn.execute(f'PRAGMA table_info("{name}")')}
+        if {"id", "post_url", "flagged", "scraped_at"} <= cols:
+            return name
+    conn.execute(FALLBACK_SCHEMA)
+    conn.commit()
+    return "comments"
+
+
+def tune(conn, busy_timeout_ms: int = 10000) -> str:
+    """WAL + relaxed fsync + dashboard indexes; returns the comments table name."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    table = comments_table(conn)
+    for col in INDEXED_COLUMNS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{col}" ON "{table}" ({col})')
+    conn.commit()
+    return table
+
+
+def upsert_sql(conn, table: str) -> Tuple[str, List[str]]:
+    cols = {r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')}
+    use = [c for c in ROW_COLUMNS if c in cols]
+    return (f'INSERT OR REPLACE INTO "{table}" ({", ".join(use)}) '
+            f'VALUES ({", ".join("?" for _ in use)})', use)
+
+
+class BatchWriter:
+    def __init__(self, db_path: str, log, batch_rows: int = 500, interval_s: float = 2.0,
+                 max_queue: int = 64, metrics=None):
+        self.db_path = db_path
+        self.log = log
+        self.metrics = metrics
+        self.batch_rows = max(1, batch_rows)
+        self.interval_s = max(0.05, interval_s)
+        self._q: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self.rows_written = 0
+        self.commits = 0
+        self.failed_batches = 0
+        self.write_s = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="l8-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def _raise(self):
+        if self._error is not None:
+            raise RuntimeError(f"batch writer stopped: {self._error!r}") from self._error
+
+    def _put(self, item):
+        # blocks while the writer is behind, but wakes up to notice a dead writer
+        while True:
+            self._raise()
+            try:
+                self._q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    # called from crawler threads / the event loop
+    def put(self, rows: List[Dict[str, Any]]):
+        self._raise()
+        if rows:
+            self._put(list(rows))
+
+    def __call__(self, rows: List[Dict[str, Any]]):
+        self.put(rows)
+
+    def after(self, fn: Callable[[Any], None], mark: Optional[int] = None):
+        """
+        Run fn(conn) on the writer thread once everything queued before it is
+        committed.  Skipped if a batch failed after `mark` (``failed_batches``
+        read before the caller queued its rows).
+        """
+        self._put((fn, self.failed_batches if mark is None else mark))
+
+    def close(self, timeout: Optional[float] = None):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            try:
+                self._put(None)
+            except RuntimeError:
+                pass  # died meanwhile; raised below
+        self._thread.join(timeout)
+        self._raise()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+            return
+        try:
+            self.close()
+        except RuntimeError:
+            pass  # keep the original exception
+
+    def _run(self):
+        try:
+            conn = connect(self.db_path)
+            table = tune(conn)
+            sql, cols = upsert_sql(conn, table)
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        try:
+            self._loop(conn, sql, cols)
+        except BaseException as e:
+            # e.g. a row that isn't a dict; put()/close() re-raise it
+            self._error = e
+            self.log.error(f"Batch writer stopped: {e!r}")
+        finally:
+            conn.close()
+
+    def _loop(self, conn, sql: str, cols: List[str]):
+        pending: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.interval_s
+        stop = False
+        while not stop:
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is None:
+                    stop = True
+                elif isinstance(item, tuple):
+                    if pending:
+                        self._flush(conn, sql, cols, pending)
+                        pending = []
+                    self._after(conn, *item)
+                else:
+                    pending.extend(item)
+            except queue.Empty:
+                pass
+            if pending and (stop or len(pending) >= self.batch_rows or time.monotonic() >= deadline):
+                self._flush(conn, sql, cols, pending)
+                pending = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.interval_s
+
+    def _flush(self, conn, sql: str, cols: List[str], rows: List[Dict[str, Any]]):
+        t0 = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(sql, [tuple(r.get(c) for c in cols) for r in rows])
+        except sqlite3.Error as e:
+            # keep the rows: fall back to the plain path for this batch
+            self.log.error(f"Batched write of {len(rows)} rows failed ({e}); retrying with upsert_comments.")
+            try:
+                upsert_comments(conn, rows)
+            except Exception as e2:
+                self.failed_batches += 1
+                self.log.error(f"Dropped {len(rows)} rows: {e2}")
+                return
+        dt = time.perf_counter() - t0
+        self.write_s += dt
+        self.rows_written += len(rows)
+        self.commits += 1
+        if self.metrics is not None:
+            self.metrics.observe("db_write", dt)
+            self.metrics.inc("db_rows", len(rows))
+
+    def _after(self, conn, fn: Callable[[Any], None], mark: int):
+        if self.failed_batches > mark:
+            self.log.warning("Skipping a post-write callback: rows queued before it were dropped.")
+            return
+        try:
+            with conn:
+                fn(conn)
+        except Exception as e:
+            self.log.error(f"Post-write callback failed: {e}")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows_written,
+            "commits": self.commits,
+            "failed_batches": self.failed_batches,
+            "queued": self._q.qsize(),
+            "rows_per_s": round(self.rows_written / self.write_s) if self.write_s else None,
+        }
+
+
+def write_mark(on_rows) -> Optional[int]:
+    """Take before handing rows to `on_rows`; pass to after_write."""
+    return on_rows.failed_batches if isinstance(on_rows, BatchWriter) else None
+
+
+def after_write(on_rows, fn: Callable[[Any], None], mark: Optional[int] = None):
+    # after the rows are committed for a BatchWriter; a plain sink has stored them
+    # by the time it returns.  Rows returned to the caller (no sink) aren't stored
+    # yet, so fn is dropped: that path leaves the crawl state as it was.
+    if isinstance(on_rows, BatchWriter):
+        on_rows.after(fn, mark)
+    elif on_rows is not None:
+        fn(None)
+
+
+def writer_from_cfg(cfg, log) -> BatchWriter:
+    return BatchWriter(cfg["DB_PATH"], log, cfg["WRITE_BATCH_ROWS"], cfg["WRITE_INTERVAL_S"],
+                       cfg["WRITE_QUEUE"], metrics=get_metrics(cfg))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Learned browser-context variant (mobile vs desktop UA) per host and profile.
+
+Every post/profile crawl records whether its variant produced anything in
+the ``ua_variants`` table (same SQLite DB as the comments).  The next crawl
+starts with the variant that has worked best for that profile, falling
+back to the host's record and then to DEFAULT_ORDER.  Ranking uses
+Laplace-smoothed success rates, so one bad crawl doesn't flip a variant
+that has worked for weeks.
+
+Before paying for a second full page load with the fallback variant, the
+crawlers fetch the page HTML once with that variant's user agent (no
+rendering, no scrolling) and try the embedded-state extractors on it.
+"""
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from db import connect
+from utils import utc_now_iso
+
+DEFAULT_ORDER = ("mobile", "desktop")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ua_variants (
+    scope TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    ok INTEGER NOT NULL DEFAULT 0,
+    fail INTEGER NOT NULL DEFAULT 0,
+    last_ok TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (scope, variant)
+)
+"""
+
+
+def scopes(url: str, profile: Optional[str] = None) -> List[str]:
+    out = []
+    if profile:
+        out.append(f"profile:{profile.rstrip('/')}")
+    out.append(f"host:{urlsplit(url).netloc.lower()}")
+    return out
+
+
+class VariantStrategy:
+    def __init__(self, conn, default: Tuple[str, ...] = DEFAULT_ORDER):
+        self.conn = conn
+        self.default = default
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, List[int]]] = {}
+        conn.execute(SCHEMA)
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.commit()
+        for scope, variant, ok, fail in conn.execute("SELECT scope, variant, ok, fail FROM ua_variants"):
+            self._stats.setdefault(scope, {})[variant] = [ok, fail]
+
+    def order(self, url: str, profile: Optional[str] = None) -> List[str]:
+        """Variants to try, best first; the most specific scope with any history decides."""
+        with self._lock:
+            for scope in scopes(url, profile):
+                stats = self._stats.get(scope)
+                if stats:
+                    def rate(v):
+                        ok, fail = stats.get(v, (0, 0))
+                        return (ok + 1) / (ok + fail + 2)
+                    return sorted(self.default, key=lambda v: (-rate(v), self.default.index(v)))
+        return list(self.default)
+
+    def record(self, url: str, profile: Optional[str], variant: str, ok: bool):
+        now = utc_now_iso()
+        with self._lock:
+            for scope in scopes(url, profile):
+                st = self._stats.setdefault(scope, {}).setdefault(variant, [0, 0])
+                st[0 if ok else 1] += 1
+                self.conn.execute(
+                    "INSERT INTO ua_variants (scope, variant, ok, fail, last_ok, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(scope, variant) DO UPDATE SET "
+                    "ok = excluded.ok, fail = excluded.fail, "
+                    "last_ok = coalesce(excluded.last_ok, last_ok), updated_at = excluded.updated_at",
+                    (scope, variant, st[0], st[1], now if ok else None, now))
+            self.conn.commit()
+
+    def summary(self) -> Dict[str, Dict[str, List[int]]]:
+        with self._lock:
+            return {s: {v: list(x) for v, x in st.items()} for s, st in self._stats.items()}
+
+
+_strategies: Dict[str, VariantStrategy] = {}
+_strategies_lock = threading.Lock()
+
+def get_ua_strategy(cfg) -> Optional[VariantStrategy]:
+    # one strategy (own connection) per DB per process; None when learning is off
+    if not cfg.get("UA_LEARNING"):
+        return None
+    path = cfg["DB_PATH"]
+    with _strategies_lock:
+        strat = _strategies.get(path)
+        if strat is None:
+            strat = _strategies[path] = VariantStrategy(connect(path))
+        return strat
+
+
+def variant_order(cfg, url: str, profile: Optional[str] = None) -> List[str]:
+    strat = get_ua_strategy(cfg)
+    return strat.order(url, profile) if strat else list(DEFAULT_ORDER)
+
+
+def record_variant(cfg, url: str, profile: Optional[str], variant: str, ok: bool):
+    strat = get_ua_strategy(cfg)
+    if strat:
+        strat.record(url, profile, variant, ok)
@@ -4,16 +4,30 @@ import json
 import os
 import re
 import sys
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
+from typing import Iterable, List, Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
 
-from utils import utc_now_iso, make_id, jitter_sleep, parse_bool, get_logger, json_dumps
-from db import connect, upsert_comments
+from utils import utc_now_iso, jitter_sleep, parse_bool, get_logger, json_dumps
+from db import connect
 from rules import rule_score
+from l8_cache import ScoreCache, rules_version, model_version
+import l8_embedded as embedded
+from l8_metrics import get_metrics
+from l8_rules import get_rule_engine
+from l8_variants import record_variant, variant_order
+from l8_resources import PRESETS as RESOURCE_PRESETS, get_policy
+from l8_replay import ReplayBrowser, ReplayStore, record_snapshot
+from l8_scoring import get_scorer
+from l8_scroll import ScrollEngine, StopCriteria, COUNT_JS, SCROLL_JS, WAIT_FOR_GROWTH_JS
+from l8_store import after_write, tune, write_mark, writer_from_cfg
+from l8_state import CrawlState, COMMENT_COUNT_JS, COMMENT_TEXTS_JS, parse_count, comment_id, comment_ids, expected_new
 import l8_selectors as sel  # ensure file was renamed from selectors.py
 
 
@@ -28,6 +42,46 @@ def load_env():
         "TOXIC_THRESH": float(os.getenv("TOXIC_THRESH", "0.78")),
         "RULE_THRESH": float(os.getenv("RULE_THRESH", "3.0")),
         "LOG_LEVEL": os.getenv("LOG_LEVEL", "INFO"),
+        # concurrent crawl mode (see l8_async.py)
+        "POOL_SIZE": int(os.getenv("POOL_SIZE", "4")),
+        "PER_HOST_LIMIT": int(os.getenv("PER_HOST_LIMIT", "3")),
+        "RATE_LIMIT_RPS": float(os.getenv("RATE_LIMIT_RPS", "1.5")),
+        "INCREMENTAL": parse_bool(os.getenv("INCREMENTAL", "0")),
+        "RESOURCE_POLICY": os.getenv("RESOURCE_POLICY", "default"),
+        # adaptive scroll waits (see l8_scroll.py)
+        "SCROLL_WAIT_MS": int(os.getenv("SCROLL_WAIT_MS", "2500")),
+        "SCROLL_SETTLE_MS": int(os.getenv("SCROLL_SETTLE_MS", "600")),
+        # save every crawled page to debug/ so it can be replayed offline
+        "SNAPSHOT_PAGES": parse_bool(os.getenv("SNAPSHOT_PAGES", "0")),
+        # persistent Detoxify service (see l8_scoring.py)
+        "DETOX_MODEL": os.getenv("DETOX_MODEL", "multilingual"),
+        "DETOX_BATCH": int(os.getenv("DETOX_BATCH", "32")),
+        "DETOX_THREADS": int(os.getenv("DETOX_THREADS", "0")),
+        "SCORE_CACHE": parse_bool(os.getenv("SCORE_CACHE", "1")),
+        "SCORE_CACHE_SIZE": int(os.getenv("SCORE_CACHE_SIZE", "50000")),
+        # multi-profile daemon (see l8_daemon.py)
+        "DAEMON_WORKERS": int(os.getenv("DAEMON_WORKERS", "2")),
+        "DAEMON_INTERVAL_MIN": float(os.getenv("DAEMON_INTERVAL_MIN", "60")),
+        "DAEMON_MAX_BACKOFF": float(os.getenv("DAEMON_MAX_BACKOFF", "4")),
+        "DAEMON_STATUS_FILE": os.getenv("DAEMON_STATUS_FILE") or None,
+        "MAX_BROWSER_RSS_MB": float(os.getenv("MAX_BROWSER_RSS_MB", "1500")),
+        # background batch writer (see l8_store.py)
+        "WRITE_BATCH_ROWS": int(os.getenv("WRITE_BATCH_ROWS", "500")),
+        "WRITE_INTERVAL_S": float(os.getenv("WRITE_INTERVAL_S", "2.0")),
+        "WRITE_QUEUE": int(os.getenv("WRITE_QUEUE", "64")),
+        # comments scored and handed to the writer per batch (bounds per-post memory)
+        "ROW_BATCH": int(os.getenv("ROW_BATCH", "200")),
+        # trigger-maintained report aggregates + FTS (see l8_report.py)
+        "REPORT_AGGREGATES": parse_bool(os.getenv("REPORT_AGGREGATES", "1")),
+        # compiled rule engine (see l8_rules.py); unset keeps rules.rule_score
+        "RULES_FILE": os.getenv("RULES_FILE") or None,
+        "RULES_RELOAD_S": float(os.getenv("RULES_RELOAD_S", "5")),
+        # per-stage timers/counters (see l8_metrics.py)
+        "METRICS_FILE": os.getenv("METRICS_FILE") or None,
+        "PROM_FILE": os.getenv("PROM_FILE") or None,
+        # learn mobile/desktop UA per host/profile, try fallback page state over HTTP (see l8_variants.py)
+        "UA_LEARNING": parse_bool(os.getenv("UA_LEARNING", "1")),
+        "STATE_FETCH": parse_bool(os.getenv("STATE_FETCH", "1")),
     }
     return cfg
 
@@ -41,13 +95,18 @@ def ensure_debug_dir() -> Path:
     d.mkdir(parents=True, exist_ok=True)
     return d
 
-def save_debug(page, label: str, log):
+def save_debug(page, label: str, log, screenshot=True):
     debug_dir = ensure_debug_dir()
-    base = f"{label}-{ts()}"
+    stamp = ts()
+    base = f"{label}-{stamp}"
     html_path = debug_dir / f"{base}.html"
     png_path = debug_dir / f"{base}.png"
     try:
         html_path.write_text(page.content(), encoding="utf-8")
+        record_snapshot(debug_dir, page.url, label, html_path, stamp)
+        if not screenshot:
+            log.info(f"[DEBUG] Saved snapshot: {html_path}")
+            return
         page.screenshot(path=str(png_path), full_page=True)
         log.warning(f"[DEBUG] Saved snapshot: {html_path} and {png_path}")
     except Exception as e:
@@ -64,9 +123,9 @@ DESKTOP_UA = (
     "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
 )
 
-def make_context(browser, desktop=False):
+def context_options(desktop=False) -> Dict[str, Any]:
     if not desktop:
-        return browser.new_context(
+        return dict(
             viewport={"width": 412, "height": 915},
             device_scale_factor=2.625,
             is_mobile=True,
@@ -74,7 +133,7 @@ def make_context(browser, desktop=False):
             user_agent=ANDROID_UA,
         )
     # desktop fallback (sometimes avoids mobile SEO/app walls)
-    return browser.new_context(
+    return dict(
         viewport={"width": 1366, "height": 900},
         device_scale_factor=1.0,
         is_mobile=False,
@@ -82,6 +141,22 @@ def make_context(browser, desktop=False):
         user_agent=DESKTOP_UA,
     )
 
+def make_context(browser, desktop=False):
+    return browser.new_context(**context_options(desktop))
+
+def fetch_state_scripts(cfg, context, url: str, variant: str) -> List[Dict[str, str]]:
+    """Script bodies of `url` fetched over HTTP with `variant`'s UA (shares the context's cookies)."""
+    if not cfg.get("STATE_FETCH"):
+        return []
+    try:
+        resp = context.request.get(url, timeout=15000, headers={
+            "User-Agent": context_options(variant == "desktop")["user_agent"]})
+        if not resp.ok:
+            return []
+        return embedded.scripts_from_html(resp.text())
+    except Exception:
+        return []
+
 
 # ---------- App-wall killer ----------
 BLOCK_PATTERNS = [
@@ -114,41 +189,86 @@ CSS_SUPPRESS = """
   body { overflow: auto !important; }
 """
 
-MUTATION_OBSERVER_JS = """
+# One guard per page, installed as an init script: the first sweep checks
+# every div, after that only nodes added since the last animation frame.
+# Re-evaluating it is a no-op, so nuke_overlays can call it freely.
+OVERLAY_GUARD_JS = """
 (() => {
+  if (window.__l8OverlayGuard) return window.__l8OverlayGuard.removed;
+  const sels = %s;
+  const guard = window.__l8OverlayGuard = {removed: 0, frames: 0};
+  const pending = new Set();
+  let scheduled = false;
+
+  // size first: after one layout it is a cached read, and most divs fail it
+  // before the computed-style lookup
+  const isOverlay = (el) => {
+    if (!(el.offsetHeight > window.innerHeight*0.6 || el.offsetWidth > window.innerWidth*0.6)) return false;
+    const st = getComputedStyle(el);
+    return (st.position === 'fixed' || st.position === 'sticky') &&
+           parseInt(st.zIndex || '0', 10) >= 1000;
+  };
+  const drop = (el) => { el.remove(); guard.removed++; };
+  // known wrappers and overlay-styled divs anywhere under root, however deeply
+  // an app wall is nested in the added node
+  const check = (root) => {
+    if (!root || root.nodeType !== 1 || !root.isConnected) return;
+    for (const s of sels) {
+      try {
+        if (root.matches(s)) { drop(root); return; }
+        root.querySelectorAll(s).forEach(drop);
+      } catch (e) {}
+    }
+    for (const d of [root, ...root.querySelectorAll('div')]) {
+      if (d.tagName === 'DIV' && d.isConnected && isOverlay(d)) drop(d);
+    }
+  };
+  const flush = () => {
+    scheduled = false;
+    guard.frames++;
+    const before = guard.removed;
+    for (const n of pending) check(n);
+    pending.clear();
+    if (guard.removed > before && document.body) document.body.style.overflow = 'auto';
+  };
+  const schedule = () => {
+    if (scheduled) return;
+    scheduled = true;
+    if (document.hidden || !window.requestAnimationFrame) setTimeout(flush, 100);
+    else requestAnimationFrame(flush);
+  };
+  const sweep = () => {
+    try {
+      const before = guard.removed;
+      for (const s of sels) document.querySelectorAll(s).forEach(drop);
+      document.querySelectorAll('div').forEach(d => { if (d.isConnected && isOverlay(d)) drop(d); });
+      if (guard.removed > before && document.body) document.body.style.overflow = 'auto';
+    } catch (e) {}
+  };
   try {
-    const kill = () => {
-      const sels = %s;
-      let removed = 0;
-      for (const s of sels) {
-        document.querySelectorAll(s).forEach(el => { el.remove(); removed++; });
-      }
-      // also remove any full-screen divs with huge z-index
-      [...document.querySelectorAll('div')]
-        .filter(d => {
-          const st = getComputedStyle(d);
-          return (st.position === 'fixed' || st.position === 'sticky') &&
-                 parseInt(st.zIndex || '0', 10) >= 1000 &&
-                 (d.offsetHeight > window.innerHeight*0.6 || d.offsetWidth > window.innerWidth*0.6);
-        })
-        .forEach(d => { d.remove(); removed++; });
-      if (removed > 0) { document.body.style.overflow = 'auto'; }
-    };
-    kill();
-    const mo = new MutationObserver(() => kill());
-    mo.observe(document.documentElement, {childList: true, subtree: true});
+    new MutationObserver(muts => {
+      for (const m of muts) m.addedNodes.forEach(n => { if (n.nodeType === 1) pending.add(n); });
+      if (pending.size) schedule();
+    }).observe(document, {childList: true, subtree: true});
   } catch (e) {}
+  if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', sweep, {once: true});
+  else sweep();
+  return guard.removed;
 })();
 """ % (json.dumps(REMOVE_SELECTORS))
 
-def install_appwall_blockers(context, page, log):
-    # 1) Block requests that look like app-wall/landing/installer
+def resource_policy(cfg=None):
+    # app-wall patterns are always on; presets add resource types/analytics
+    return get_policy((cfg or {}).get("RESOURCE_POLICY", "default"), BLOCK_PATTERNS)
+
+def install_appwall_blockers(context, page, log, policy=None):
+    policy = policy or resource_policy()
+    # 1) Block app-wall/landing/installer requests plus whatever the policy drops
     def route_handler(route):
-        url = route.request.url.lower()
-        for pat in BLOCK_PATTERNS:
-            if re.search(pat, url):
-                return route.abort()  # drop it
-        return route.continue_()
+        req = route.request
+        if policy.should_block(req.url, req.resource_type):
+            return route.abort()  # drop it
+        return route.fallback()  # lets a replay route (l8_replay) serve it
     try:
         context.route("**/*", route_handler)
     except Exception:
@@ -160,17 +280,17 @@ def install_appwall_blockers(context, page, log):
     except Exception:
         pass
 
-    # 3) Install a mutation observer to auto-remove overlays forever
+    # 3) Install the overlay guard (once per document) to auto-remove overlays
     try:
-        page.add_init_script(MUTATION_OBSERVER_JS)
+        page.add_init_script(OVERLAY_GUARD_JS)
     except Exception:
         pass
 
 
 def nuke_overlays(page):
-    # attempt removal + ESC
+    # make sure the guard is running (no-op if the init script already ran) + ESC
     try:
-        page.evaluate(MUTATION_OBSERVER_JS)
+        page.evaluate(OVERLAY_GUARD_JS)
     except Exception:
         pass
     try:
@@ -179,6 +299,13 @@ def nuke_overlays(page):
         pass
 
 
+def overlays_removed(page) -> int:
+    try:
+        return int(page.evaluate("() => (window.__l8OverlayGuard || {}).removed || 0"))
+    except Exception:
+        return 0
+
+
 # ---------- URL helpers ----------
 def normalize_post_url(url: str) -> str:
     if not url:
@@ -190,110 +317,199 @@ def normalize_post_url(url: str) -> str:
         url = f"{url}#comments"
     return url
 
+_POST_ID_RES = [re.compile(r"/(?:post|article)/([^/?#]+)"), re.compile(r"/@[^/?#]+/(\d+)")]
+
+def post_key(url: str) -> str:
+    """Canonical identity of a post link: the id in its path, else host + path."""
+    for rx in _POST_ID_RES:
+        m = rx.search(url)
+        if m:
+            return m.group(1)
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+# ---------- Adaptive waits ----------
+def wait_for_growth(page, engine, loop: str, sels: List[str], prev: int,
+                    timeout_ms=None, settle_ms=None) -> int:
+    # returns the new item count; `prev` if the page could not be queried
+    t0 = time.perf_counter()
+    try:
+        res = page.evaluate(WAIT_FOR_GROWTH_JS, engine.wait_args(sels, prev, timeout_ms, settle_ms))
+    except Exception:
+        res = None
+    engine.record_wait(loop, time.perf_counter() - t0, res["why"] if res else "error")
+    return int(res["count"]) if res else prev
+
+def count_matches(page, sels: List[str]) -> int:
+    try:
+        return int(page.evaluate(COUNT_JS, sels))
+    except Exception:
+        return 0
+
 
 # ---------- Link harvesting ----------
+LINK_SELECTORS = ["a[href]", "[data-href]"]
+
+POST_LINK_PATTERNS = [
+    r"https?://[^\s\"'>]+/post/[^\s\"'>]+",
+    r"https?://[^\s\"'>]+/article/[^\s\"'>]+",
+    r"https?://[^\s\"'>]+/share/post/[^\s\"'>]+",
+    r"https?://[^\s\"'>]+/@[^\s\"'>]+/\d+",   # direct numeric id path
+]
+
+class LinkSet:
+    """Post links in first-seen order, one per post_key (the first URL seen for a post wins)."""
+    __slots__ = ("_by_key",)
+
+    def __init__(self, urls: Iterable[str] = ()):
+        self._by_key: Dict[str, str] = {}
+        self.update(urls)
+
+    def add(self, url: str) -> bool:
+        key = post_key(url)
+        if key in self._by_key:
+            return False
+        self._by_key[key] = url
+        return True
+
+    def update(self, urls: Iterable[str]) -> int:
+        return sum(self.add(u) for u in urls)
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def __iter__(self):
+        return iter(self._by_key.values())
+
+
+def finalize_post_links(seen: Iterable[str], max_posts: int) -> List[str]:
+    # normalize & uniq by post id
+    return list(LinkSet(normalize_post_url(u) for u in seen))[:max_posts]
+
+# Matching hrefs the page hasn't returned yet.  Remembers each element's
+# last href (virtualized feeds recycle nodes) and every href returned, so
+# a scroll iteration only ships what the scroll added.
+NEW_POST_HREFS_JS = """
+(patterns) => {
+  const st = window.__l8Links || (window.__l8Links = {els: new WeakMap(), hrefs: new Set()});
+  const rx = patterns.map(p => new RegExp(p));
+  const out = [];
+  for (const e of document.querySelectorAll('a, [data-href]')) {
+    const cands = [e.tagName === 'A' ? (e.href || e.getAttribute('href')) : null, e.getAttribute('data-href')];
+    const sig = cands.join(' ');
+    if (st.els.get(e) === sig) continue;
+    st.els.set(e, sig);
+    for (const h of cands) {
+      if (!h || st.hrefs.has(h)) continue;
+      st.hrefs.add(h);
+      if (rx.some(r => r.test(h))) out.push(String(h));
+    }
+  }
+  return out;
+}
+"""
+
 def _extract_links_from_dom(page, patterns: List[str]) -> List[str]:
-    hrefs = page.eval_on_selector_all(
-        "a",
-        "els => els.map(e => (e.href || e.getAttribute('href'))).filter(Boolean)"
-    ) or []
-    hrefs += page.eval_on_selector_all(
-        "[data-href]",
-        "els => els.map(e => e.getAttribute('data-href')).filter(Boolean)"
-    ) or []
-    uniq = []
-    for h in hrefs:
-        s = str(h)
-        for pat in patterns:
-            if re.search(pat, s):
-                if s not in uniq:
-                    uniq.append(s)
-                break
-    return uniq
+    # only hrefs added since the previous call on this document
+    try:
+        return page.evaluate(NEW_POST_HREFS_JS, patterns) or []
+    except Exception:
+        return []
 
-def _extract_links_from_json_scripts(page, patterns: List[str], max_scripts: int = 40) -> List[str]:
-    links: List[str] = []
-    scripts = page.locator("script")
-    count = scripts.count()
-    for i in range(min(count, max_scripts)):
-        try:
-            raw = scripts.nth(i).inner_text(timeout=600)
-        except Exception:
-            continue
+def script_bodies(page, new_only: bool = False) -> List[Dict[str, str]]:
+    # every inline JSON-ish <script> body in one round-trip (or only those not returned before)
+    js = embedded.NEW_SCRIPT_BODIES_JS if new_only else embedded.SCRIPT_BODIES_JS
+    try:
+        return page.evaluate(js, embedded.MAX_SCRIPT_CHARS) or []
+    except Exception:
+        return []
+
+def links_from_scripts(scripts: List[Dict[str, str]], patterns: List[str], max_scripts: int = 40) -> List[str]:
+    links: Dict[str, None] = {}
+    for s in scripts[:max_scripts]:
+        raw = embedded.unescape_urls(s.get("text") or "")
         if not raw or ("post" not in raw and "article" not in raw and "share" not in raw):
             continue
         for pat in patterns:
             for m in re.findall(pat, raw):
-                if m not in links:
-                    links.append(m)
-    return links
-
-def get_post_links_from_profile(page, max_posts: int, log) -> List[str]:
-    patterns = [
-        r"https?://[^\s\"'>]+/post/[^\s\"'>]+",
-        r"https?://[^\s\"'>]+/article/[^\s\"'>]+",
-        r"https?://[^\s\"'>]+/share/post/[^\s\"'>]+",
-        r"https?://[^\s\"'>]+/@[^\s\"'>]+/\d+",   # direct numeric id path
-    ]
-
-    page.wait_for_timeout(600)
-    nuke_overlays(page)
-
-    seen: List[str] = []
-    failures = 0
-    last = -1
-
-    for _ in range(22):  # a bit more scrolls
-        for u in _extract_links_from_dom(page, patterns):
-            if u not in seen:
-                seen.append(u)
-        for u in _extract_links_from_json_scripts(page, patterns):
-            if u not in seen:
-                seen.append(u)
-
-        if len(seen) >= max_posts:
-            break
-
-        # scroll + keep killing overlays
-        page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
-        page.wait_for_timeout(500)
+                links.setdefault(m, None)
+    return list(links)
+
+def _extract_links_from_json_scripts(page, patterns: List[str], max_scripts: int = 40,
+                                     scripts=None) -> List[str]:
+    # scripts added or changed since the previous call, unless given
+    if scripts is None:
+        scripts = script_bodies(page, new_only=True)
+    return links_from_scripts(scripts, patterns, max_scripts)
+
+def get_post_links_from_profile(page, max_posts: int, log, engine=None) -> List[str]:
+    patterns = POST_LINK_PATTERNS
+    engine = engine or ScrollEngine()
+
+    with engine.loop("harvest"):
+        anchors = wait_for_growth(page, engine, "harvest", LINK_SELECTORS, 0, timeout_ms=600)
         nuke_overlays(page)
 
-        if len(seen) == last:
-            failures += 1
-            page.evaluate("window.scrollBy(0, -Math.floor(window.innerHeight*0.4));")
-            page.wait_for_timeout(300)
+        stop = StopCriteria(max_cycles=22, stale_limit=3, target=max_posts)
+        # state-first: the embedded feed often lists every post already
+        scripts = script_bodies(page, new_only=True)
+        blobs = embedded.parse_blobs(scripts)
+        seen = LinkSet(embedded.post_links(blobs, patterns))
+        if seen and (len(seen) >= max_posts or not embedded.has_more(blobs)):
+            log.info(f"Found {len(seen)} post links in embedded state; skipping scroll.")
+            stop.reason = "state"
+            engine.record_stop("harvest", stop)
+            return finalize_post_links(seen, max_posts)
+
+        # each pass only sees hrefs/scripts the page hasn't returned before
+        while True:
+            seen.update(_extract_links_from_dom(page, patterns))
+            seen.update(_extract_links_from_json_scripts(page, patterns, scripts=scripts))
+            scripts = None
+
+            if not stop.observe(len(seen)):
+                break
+
+            # scroll + keep killing overlays
+            page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
+            anchors = wait_for_growth(page, engine, "harvest", LINK_SELECTORS, anchors)
             nuke_overlays(page)
-        else:
-            failures = 0
-            last = len(seen)
 
-        if failures >= 3:
-            break
+            if stop.stale:
+                page.evaluate("window.scrollBy(0, -Math.floor(window.innerHeight*0.4));")
+                anchors = wait_for_growth(page, engine, "harvest", LINK_SELECTORS, anchors)
+                nuke_overlays(page)
+        engine.record_stop("harvest", stop)
 
-    # normalize & uniq by path
-    out = [normalize_post_url(u) for u in seen]
-    uniq, seen_path = [], set()
-    for u in out:
-        path = re.sub(r"[?#].*$", "", u)
-        if path not in seen_path:
-            seen_path.add(path)
-            uniq.append(u)
-        if len(uniq) >= max_posts:
-            break
-    return uniq
+    return finalize_post_links(seen, max_posts)
 
 
 # ---------- Comments ----------
+COMMENTS_TAB_CHOICES = [
+    "text=/^Comments?\\b/i",
+    "button:has-text('Comments')",
+    "a:has-text('Comments')",
+    "[role=tab]:has-text('Comments')",
+    "[data-tab='comments']",
+]
+
+COMMENT_CONTAINERS = [
+    "[class*='comment'] [class*='list']",
+    "[class*='Comments'] [class*='list']",
+    "[data-scroll='comments']",
+    "section[role='feed']",
+]
+
+COMMENT_COUNT_SELECTORS = [
+    ".article-comment-item-wrapper .article-comment-item",
+    ".comment-reply-list .article-comment-item",
+    "[class*='comment'] [class*='item']",
+    "[data-e2e*='comment']",
+]
+
 def try_open_comments_tab(page):
-    choices = [
-        "text=/^Comments?\\b/i",
-        "button:has-text('Comments')",
-        "a:has-text('Comments')",
-        "[role=tab]:has-text('Comments')",
-        "[data-tab='comments']",
-    ]
-    for s in choices:
+    for s in COMMENTS_TAB_CHOICES:
         try:
             el = page.locator(s).first
             if el and el.is_visible():
@@ -304,86 +520,159 @@ def try_open_comments_tab(page):
             continue
     return False
 
-def load_more_comments(page, target_min=60, max_cycles=32):
-    containers = [
-        "[class*='comment'] [class*='list']",
-        "[class*='Comments'] [class*='list']",
-        "[data-scroll='comments']",
-        "section[role='feed']",
-    ]
-    item_selectors = [
-        ".article-comment-item-wrapper .article-comment-item",
-        ".comment-reply-list .article-comment-item",
-        "[class*='comment'] [class*='item']",
-        "[data-e2e*='comment']",
-    ]
-    def count_items():
-        total = 0
-        for css in item_selectors:
-            try:
-                total += page.locator(css).count()
-            except Exception:
-                pass
-        return total
+def read_comment_count(page):
+    try:
+        return parse_count(page.evaluate(COMMENT_COUNT_JS))
+    except Exception:
+        return None
+
+def loaded_ids(url: str, texts) -> set:
+    ids = set()
+    for t in texts or ():
+        c = comment_from_text(t)
+        if c:
+            ids.add(comment_id(url, c))
+    return ids
+
+def batch_all_known(ids: set, known: set, loaded: set) -> bool:
+    # the comments loaded since the last check (`loaded`, updated here) are all stored already
+    fresh = ids - loaded
+    loaded |= ids
+    return bool(fresh) and fresh <= known
+
+def loaded_all_new(page, url: str, known: set, want: int) -> bool:
+    # True once `want` loaded comments are ones we haven't stored; the list isn't
+    # chronological, so a known comment says nothing about what's below it
+    try:
+        texts = page.evaluate(COMMENT_TEXTS_JS, sel.COMMENT_ITEMS)
+    except Exception:
+        return False
+    return len(loaded_ids(url, texts) - known) >= want
 
-    last, cycles = -1, 0
-    while cycles < max_cycles:
-        # scroll container if visible, else page
-        scrolled = False
-        for ccss in containers:
-            try:
-                cont = page.locator(ccss).first
-                if cont and cont.is_visible():
-                    page.evaluate("el => el.scrollBy(0, Math.floor(el.clientHeight*0.9));", cont)
-                    scrolled = True
-                    break
-            except Exception:
-                pass
-        if not scrolled:
-            page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
+def loaded_only_known(page, url: str, known: set, loaded: set) -> bool:
+    # no count badge to say how many are new: stop at the first scroll batch that
+    # brought in nothing but stored comments (may miss new ones sorted further down)
+    try:
+        texts = page.evaluate(COMMENT_TEXTS_JS, sel.COMMENT_ITEMS)
+    except Exception:
+        return False
+    return batch_all_known(loaded_ids(url, texts), known, loaded)
 
-        page.wait_for_timeout(350)
-        nuke_overlays(page)
-        cur = count_items()
-        if cur == last:
+def scroll_comments(page, frac: float):
+    # scroll the comment container if visible, else the page
+    try:
+        page.evaluate(SCROLL_JS, {"sels": COMMENT_CONTAINERS, "frac": frac})
+    except Exception:
+        pass
+
+def load_more_comments(page, target_min=60, max_cycles=32, stop_when=None, engine=None):
+    engine = engine or ScrollEngine()
+    with engine.loop("comments"):
+        stop = StopCriteria(max_cycles=max_cycles, stale_limit=1, target=target_min)
+        cur = count_matches(page, COMMENT_COUNT_SELECTORS)
+        while True:
+            scroll_comments(page, 0.9)
+            grown = wait_for_growth(page, engine, "comments", COMMENT_COUNT_SELECTORS, cur)
+            nuke_overlays(page)
+            if grown <= cur:
+                # nudge back up once; some lists only load on a reverse scroll
+                scroll_comments(page, -0.4)
+                grown = wait_for_growth(page, engine, "comments", COMMENT_COUNT_SELECTORS, cur)
+                nuke_overlays(page)
+            cur = grown
+            if not stop.observe(cur):
+                break
+            if stop_when and stop_when():
+                stop.reason = "known"
+                break
+        engine.record_stop("comments", stop)
+
+def expand_all_comments(page, engine=None, max_clicks=60):
+    engine = engine or ScrollEngine()
+    with engine.loop("expand"):
+        n = count_matches(page, COMMENT_COUNT_SELECTORS)
+        for ex in sel.EXPANDERS:
+            # progress = new items or expanders consumed; 3 useless clicks in a row -> stop
+            stop = StopCriteria(max_cycles=max_clicks, stale_limit=3)
             try:
-                for ccss in containers:
-                    cont = page.locator(ccss).first
-                    if cont and cont.is_visible():
-                        page.evaluate("el => el.scrollBy(0, -Math.floor(el.clientHeight*0.4));", cont)
+                while page.locator(ex).first.is_visible():
+                    page.locator(ex).first.click()
+                    n = wait_for_growth(page, engine, "expand", COMMENT_COUNT_SELECTORS, n,
+                                        timeout_ms=1500, settle_ms=250)
+                    if not stop.observe(n - page.locator(ex).count()):
                         break
-                else:
-                    page.evaluate("window.scrollBy(0, -Math.floor(window.innerHeight*0.4));")
             except Exception:
                 pass
-            page.wait_for_timeout(250)
-            nuke_overlays(page)
-            cur = count_items()
-            if cur == last:
-                break
-        last = cur
-        cycles += 1
-        if cur >= target_min:
-            break
+            engine.record_stop("expand", stop)
 
-def expand_all_comments(page):
-    for ex in sel.EXPANDERS:
-        try:
-            while page.locator(ex).first.is_visible():
-                page.locator(ex).first.click()
-                page.wait_for_timeout(250)
-        except Exception:
-            continue
+def comment_from_text(text: str):
+    lines = [l.strip() for l in (text or "").splitlines() if l.strip()]
+    if not lines:
+        return None
+    author = lines[0][:80]
+    body = " ".join(lines[1:]) if len(lines) > 1 else ""
+    return {"author": author, "text": body}
 
-def extract_comments(page) -> Tuple[str, List[Dict[str, Any]]]:
-    try:
-        post_title = page.title()
-    except Exception:
-        post_title = None
+def comments_from_ld_json(raw: str) -> List[Dict[str, Any]]:
+    out = []
+    data = json.loads(raw)
+    if isinstance(data, dict) and "comment" in data:
+        for c in data.get("comment") or []:
+            author = c.get("author", None)
+            if isinstance(author, dict):
+                author = author.get("name")
+            text = c.get("text")
+            if text:
+                out.append({"author": author, "text": text})
+    return out
 
-    comments: List[Dict[str, Any]] = []
-    found = False
+# Walks every comment node in one round-trip.  Nodes matched by several
+# selectors are returned once; `parent` is the index of the closest matched
+# ancestor (reply threads) and `ts` the first datetime/time-ish text found.
+BULK_EXTRACT_JS = r"""
+(sels) => {
+  const nodes = [];
+  const index = new Map();
+  for (const s of sels) {
+    let found;
+    try { found = document.querySelectorAll(s); } catch (e) { continue; }
+    found.forEach(el => {
+      if (!index.has(el)) { index.set(el, nodes.length); nodes.push(el); }
+    });
+  }
+  return nodes.map(el => {
+    let parent = null;
+    for (let p = el.parentElement; p; p = p.parentElement) {
+      if (index.has(p)) { parent = index.get(p); break; }
+    }
+    let ts = null;
+    const t = el.querySelector('time, [datetime], [class*="time"], [class*="date"]');
+    if (t) ts = t.getAttribute('datetime') || (t.textContent || '').trim() || null;
+    return {text: el.innerText || '', parent: parent, ts: ts};
+  });
+}
+"""
 
+def comments_from_bulk(records) -> List[Dict[str, Any]]:
+    comments: List[Dict[str, Any]] = []
+    pos: Dict[int, int] = {}
+    for i, r in enumerate(records or []):
+        c = comment_from_text(r.get("text"))
+        if not c:
+            continue
+        parent = r.get("parent")
+        c["reply_to"] = pos.get(parent) if parent is not None else None
+        c["posted_at"] = r.get("ts")
+        pos[i] = len(comments)
+        comments.append(c)
+    return comments
+
+def extract_comments_bulk(page) -> List[Dict[str, Any]]:
+    return comments_from_bulk(page.evaluate(BULK_EXTRACT_JS, sel.COMMENT_ITEMS))
+
+def extract_comments_per_locator(page) -> List[Dict[str, Any]]:
+    # one inner_text round-trip per item; kept as fallback for the bulk path
+    comments: List[Dict[str, Any]] = []
     for css in sel.COMMENT_ITEMS:
         loc = page.locator(css)
         try:
@@ -393,22 +682,34 @@ def extract_comments(page) -> Tuple[str, List[Dict[str, Any]]]:
         for i in range(count):
             try:
                 item = loc.nth(i)
-                text = item.inner_text(timeout=1500).strip()
-                if not text:
-                    continue
-                lines = [l.strip() for l in text.splitlines() if l.strip()]
-                if not lines:
+                c = comment_from_text(item.inner_text(timeout=1500))
+                if not c:
                     continue
-                author = lines[0][:80]
-                body = " ".join(lines[1:]) if len(lines) > 1 else ""
-                comments.append({"author": author, "text": body})
-                found = True
+                comments.append(c)
             except PWTimeoutError:
                 continue
             except Exception:
                 continue
+    return comments
 
-    if found and comments:
+def page_title(page):
+    try:
+        return page.title()
+    except Exception:
+        return None
+
+def extract_comments(page, bulk=True) -> Tuple[str, List[Dict[str, Any]]]:
+    post_title = page_title(page)
+
+    comments: List[Dict[str, Any]] = []
+    if bulk:
+        try:
+            comments = extract_comments_bulk(page)
+        except Exception:
+            comments = []
+    if not comments:
+        comments = extract_comments_per_locator(page)
+    if comments:
         return post_title, comments
 
     # JSON-LD fallback
@@ -420,131 +721,284 @@ def extract_comments(page) -> Tuple[str, List[Dict[str, Any]]]:
     for i in range(scount):
         try:
             raw = scripts.nth(i).inner_text(timeout=800)
-            data = json.loads(raw)
-            if isinstance(data, dict) and "comment" in data:
-                for c in data.get("comment") or []:
-                    author = c.get("author", None)
-                    if isinstance(author, dict):
-                        author = author.get("name")
-                    text = c.get("text")
-                    if text:
-                        comments.append({"author": author, "text": text})
+            comments.extend(comments_from_ld_json(raw))
         except Exception:
             continue
     return post_title, comments
 
 
 # ---------- Scoring ----------
-def detox_scores(texts: List[str]):
-    try:
-        from detoxify import Detoxify
-        model = Detoxify("multilingual")
-        res = model.predict(texts)
-        keys = list(res.keys())
-        out = []
-        for i in range(len(texts)):
-            out.append({k: float(res[k][i]) for k in keys})
-        return out
-    except Exception:
-        return [None for _ in texts]
+def detox_scores(texts: List[str], cfg=None):
+    # model is loaded once per process and reused (l8_scoring.get_scorer)
+    return get_scorer(cfg or {}).predict(texts)
 
-def score_and_flag(cfg, comments: List[Dict[str, Any]]):
+def rule_scores(texts: List[str], engine=None) -> List[float]:
+    # compiled RULES_FILE engine when configured (l8_rules), else rules.rule_score per text
+    if engine is not None:
+        return engine.score_batch(texts)
+    return [float(rule_score(t)) for t in texts]
+
+def score_and_flag(cfg, comments: List[Dict[str, Any]], ml_scores=None, cache=None):
     texts = [c.get("text") or "" for c in comments]
-    ml_scores = detox_scores(texts) if cfg["USE_DETOX"] else [None for _ in texts]
-    out = []
-    for i, c in enumerate(comments):
-        rs = float(rule_score(c.get("text") or ""))
-        ms = ml_scores[i]
-        flagged = rs >= cfg["RULE_THRESH"] or (ms and any(v >= cfg["TOXIC_THRESH"] for v in ms.values()))
-        out.append((rs, ms, flagged))
-    return out
+    if ml_scores is None:
+        if not cfg["USE_DETOX"]:
+            ml_scores = [None for _ in texts]
+        elif cache is not None:
+            ml_scores = cache.cached("detox", model_version(cfg["DETOX_MODEL"]), texts,
+                                     lambda ts: detox_scores(ts, cfg))
+        else:
+            ml_scores = detox_scores(texts, cfg)
+    engine = get_rule_engine(cfg)
+    if cache is not None:
+        version = engine.version if engine is not None else rules_version()
+        r_scores = cache.cached("rules", version, texts, lambda ts: rule_scores(ts, engine))
+    else:
+        r_scores = rule_scores(texts, engine)
+    rule_thresh, toxic_thresh = cfg["RULE_THRESH"], cfg["TOXIC_THRESH"]
+    return [(float(rs), ms, is_flagged(float(rs), ms, rule_thresh, toxic_thresh))
+            for rs, ms in zip(r_scores, ml_scores)]
+
+
+def is_flagged(rule_score_: float, ml_scores, rule_thresh: float, toxic_thresh: float) -> bool:
+    return rule_score_ >= rule_thresh or bool(ml_scores and any(v >= toxic_thresh for v in ml_scores.values()))
+
+
+def build_rows(cfg, url: str, post_title, comments: List[Dict[str, Any]],
+               ml_scores=None, cache=None, scraped_at: Optional[str] = None) -> List[Dict[str, Any]]:
+    scored = score_and_flag(cfg, comments, ml_scores, cache)
+    scraped_at = scraped_at or utc_now_iso()
+    rows = []
+    for c, (rs, ms, flagged) in zip(comments, scored):
+        cid = comment_id(url, c)
+        rows.append({
+            "id": cid, "post_url": url, "post_title": post_title,
+            "author": c.get("author"), "text": c.get("text"),
+            "scraped_at": scraped_at,
+            "model_scores": json_dumps(ms) if ms else None,
+            "rule_score": rs, "flagged": flagged,
+        })
+    return rows
+
+
+def iter_rows(cfg, url: str, post_title, comments: List[Dict[str, Any]], cache=None, pm=None):
+    """Score and build rows ROW_BATCH comments at a time; one scraped_at for the whole post."""
+    step = max(1, cfg.get("ROW_BATCH") or len(comments) or 1)
+    scraped_at = utc_now_iso()
+    for i in range(0, len(comments), step):
+        with pm.stage("score") if pm is not None else nullcontext():
+            rows = build_rows(cfg, url, post_title, comments[i:i + step], cache=cache, scraped_at=scraped_at)
+        yield rows  # outside the timer: time blocked in the consumer isn't scoring
 
 
 # ---------- Crawlers ----------
-def crawl_single_url(cfg, browser, url: str, log, try_desktop=False):
-    ctx = make_context(browser, desktop=try_desktop)
-    page = ctx.new_page()
+def crawl_single_url(cfg, browser, url: str, log, try_desktop=False, state=None, cache=None, profile=None,
+                     on_rows=None):
+    """
+    Returns (post_title, rows).  With `on_rows`, rows are handed over one
+    scored batch at a time (a BatchWriter blocks when it is behind) and the
+    returned list is empty, so memory doesn't grow with the post.  Without
+    it the crawl state isn't updated (nothing is stored yet), so returned
+    rows come back on the next incremental run too.
+    """
+    url = normalize_post_url(url)
+    pm = get_metrics(cfg).post(url, profile)
+    variants = ["desktop"] if try_desktop else variant_order(cfg, url, profile)
+    rows: List[Dict[str, Any]] = []
+    n = 0
+    variant = variants[0]  # replaced by the one that served the page, after any fallback
+    try:
+        post_title, comments, commit, variant = _crawl_single_url(cfg, browser, url, log, pm, variants, state,
+                                                                  cache, profile)
+        mark = write_mark(on_rows)
+        for batch in iter_rows(cfg, url, post_title, comments, cache, pm):
+            n += len(batch)
+            if on_rows is not None:
+                on_rows(batch)
+            else:
+                rows.extend(batch)
+        if commit is not None:
+            # crawl state only once the rows are stored (on the writer thread for a BatchWriter)
+            after_write(on_rows, commit, mark)
+        return post_title, rows
+    finally:
+        pm.close(comments=n, variant=variant)
+
+
+def _crawl_single_url(cfg, browser, url: str, log, pm, variants: List[str], state=None, cache=None,
+                      profile=None):
+    """(post_title, new comments, crawl-state commit or None, variant that served the page)."""
+    variant = variants[0]
+    fallback = variants[1] if len(variants) > 1 else None
+    ctx = make_context(browser, desktop=variant == "desktop")
+    page = pm.wrap(ctx.new_page())
     page.set_default_timeout(12000)
-    install_appwall_blockers(ctx, page, log)
+    install_appwall_blockers(ctx, page, log, resource_policy(cfg))
     try:
-        url = normalize_post_url(url)
-        page.goto(url, wait_until="domcontentloaded", timeout=35000)
-        page.wait_for_load_state("networkidle", timeout=15000)
+        with pm.stage("goto"):
+            page.goto(url, wait_until="domcontentloaded", timeout=35000)
+        with pm.stage("networkidle"):
+            page.wait_for_load_state("networkidle", timeout=15000)
         nuke_overlays(page)
 
-        try_opened = try_open_comments_tab(page)
-        for _ in range(3):
-            page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
-            page.wait_for_timeout(250)
-            nuke_overlays(page)
-        load_more_comments(page, target_min=60, max_cycles=32)
-        expand_all_comments(page)
-
-        post_title, comments = extract_comments(page)
-        if not comments and not try_desktop:
-            # fallback once with desktop UA
-            log.info("No comments found; retrying with desktop UA fallback.")
-            return crawl_single_url(cfg, browser, url, log, try_desktop=True)
+        # state-first: complete comment state in the page means no scrolling at all
+        with pm.stage("state"):
+            blobs = embedded.parse_blobs(script_bodies(page))
+            state_comments = embedded.comments(blobs)
+            state_done = bool(state_comments) and not embedded.has_more(blobs, "comment")
+
+        try_opened = try_open_comments_tab(page) if not state_done else False
+        prev = state.get(url) if state else None
+        visible = read_comment_count(page) if state else None
+        if prev and visible is not None and prev["comment_count"] == visible:
+            log.info(f"Comment count unchanged ({visible}); skipping {url}")
+            pm.inc("unchanged_skips")
+            return None, [], None, variant
+        known = prev["seen_ids"] if prev else set()
+        want = expected_new(prev, visible)
+        full = state_done  # whole list loaded: only then may the visible count be stored
+
+        if state_done:
+            log.info(f"Found {len(state_comments)} comments in embedded state on {url}; skipping scroll.")
+            pm.inc("state_hits")
+            post_title, comments = page_title(page), state_comments
+        else:
+            engine = ScrollEngine.from_cfg(cfg)
+            with pm.stage("scroll"):
+                with engine.loop("comments"):
+                    n = count_matches(page, COMMENT_COUNT_SELECTORS)
+                    for _ in range(3):
+                        page.evaluate("window.scrollBy(0, Math.floor(window.innerHeight*0.9));")
+                        n = wait_for_growth(page, engine, "comments", COMMENT_COUNT_SELECTORS, n, timeout_ms=800)
+                        nuke_overlays(page)
+                stop_when = None
+                if want:
+                    stop_when = lambda: loaded_all_new(page, url, known, want)
+                elif known:
+                    loaded: set = set()
+                    stop_when = lambda: loaded_only_known(page, url, known, loaded)
+                # incremental runs load the whole list (no 60-comment target) so the count can be stored,
+                # unless they can tell every new comment is already loaded
+                load_more_comments(page, target_min=None if state is not None else 60, max_cycles=32,
+                                   stop_when=stop_when, engine=engine)
+                full = engine.summary()["comments"]["stop"] == "stale"
+            with pm.stage("expand"):
+                expand_all_comments(page, engine=engine)
+            log.info(f"Scroll timing for {url}: {engine.summary()}")
+            log.debug(f"Overlay guard removed {overlays_removed(page)} elements on {url}")
+
+            with pm.stage("extract"):
+                post_title, comments = extract_comments(page)
+            if not comments and state_comments:
+                comments = state_comments
+        if cfg.get("SNAPSHOT_PAGES"):
+            save_debug(page, "post", log, screenshot=False)
+        if not comments and fallback:
+            record_variant(cfg, url, profile, variant, False)
+            pm.inc(f"{fallback}_fallbacks")
+            # cheap first: the fallback variant's page state over plain HTTP, no render/scroll
+            with pm.stage("state_fetch"):
+                fetched = embedded.state_comments(fetch_state_scripts(cfg, ctx, url, fallback))
+            if not fetched:
+                log.info(f"No comments found; retrying with {fallback} UA fallback.")
+                return _crawl_single_url(cfg, browser, url, log, pm, variants[1:], state, cache, profile)
+            log.info(f"Found {len(fetched)} comments in {fallback} page state; skipping a second page load.")
+            pm.inc("state_fetch_hits")
+            comments, variant, full = fetched, fallback, False
 
         if not comments:
+            record_variant(cfg, url, profile, variant, False)
             log.warning("No comments found via DOM/JSON-LD; saving snapshot.")
             save_debug(page, "no-comments", log)
-            return post_title, []
-
-        scored = score_and_flag(cfg, comments)
-        scraped_at = utc_now_iso()
-        rows = []
-        for c, (rs, ms, flagged) in zip(comments, scored):
-            cid = make_id(url, c.get("author") or "", c.get("text") or "")
-            rows.append({
-                "id": cid, "post_url": url, "post_title": post_title,
-                "author": c.get("author"), "text": c.get("text"),
-                "scraped_at": scraped_at,
-                "model_scores": json_dumps(ms) if ms else None,
-                "rule_score": rs, "flagged": flagged,
-            })
-        return post_title, rows
+            return post_title, [], None, variant
+        record_variant(cfg, url, profile, variant, True)
+
+        commit = None
+        if state is not None:
+            ids = comment_ids(url, comments)
+            full = full or (visible is not None and len(comments) >= visible)
+            count = visible if full else None
+            commit = lambda conn=None: state.update(url, ids, count, conn)
+            comments = [c for c, cid in zip(comments, ids) if cid not in known]
+            if not comments:
+                log.info(f"No new comments on {url}.")
+
+        return post_title, comments, commit, variant
     finally:
         ctx.close()
 
-def crawl_profile(cfg, browser, profile_url: str, log, try_desktop=False):
-    ctx = make_context(browser, desktop=try_desktop)
-    page = ctx.new_page()
+def crawl_profile(cfg, browser, profile_url: str, log, try_desktop=False, state=None, cache=None,
+                  on_rows=None, variants=None):
+    """
+    Rows go to `on_rows` in ROW_BATCH batches when given; otherwise they are
+    collected and returned, without updating the crawl state.
+    """
+    if variants is None:
+        variants = ["desktop"] if try_desktop else variant_order(cfg, profile_url, profile_url)
+    variant = variants[0]
+    fallback = variants[1] if len(variants) > 1 else None
+    pm = get_metrics(cfg).post(profile_url, profile_url)
+    ctx = make_context(browser, desktop=variant == "desktop")
+    page = pm.wrap(ctx.new_page())
     page.set_default_timeout(12000)
-    install_appwall_blockers(ctx, page, log)
+    install_appwall_blockers(ctx, page, log, resource_policy(cfg))
     posts_all: List[Dict[str, Any]] = []
+    posts: List[str] = []
     try:
         # load + region hint retry
         try:
-            page.goto(profile_url, wait_until="domcontentloaded", timeout=35000)
-            page.wait_for_load_state("networkidle", timeout=15000)
+            with pm.stage("goto"):
+                page.goto(profile_url, wait_until="domcontentloaded", timeout=35000)
+            with pm.stage("networkidle"):
+                page.wait_for_load_state("networkidle", timeout=15000)
         except PWTimeoutError:
+            pm.inc("retries")
             sep = "&" if "?" in profile_url else "?"
             alt = f"{profile_url}{sep}region=US"
-            page.goto(alt, wait_until="domcontentloaded", timeout=35000)
-            page.wait_for_load_state("networkidle", timeout=15000)
+            with pm.stage("goto"):
+                page.goto(alt, wait_until="domcontentloaded", timeout=35000)
+            with pm.stage("networkidle"):
+                page.wait_for_load_state("networkidle", timeout=15000)
 
         nuke_overlays(page)
         jitter_sleep()
 
-        posts = get_post_links_from_profile(page, cfg["MAX_POSTS"], log)
-        if not posts and not try_desktop:
-            log.info("No post links; retrying profile with desktop UA fallback.")
-            ctx.close()
-            return crawl_profile(cfg, browser, profile_url, log, try_desktop=True)
+        engine = ScrollEngine.from_cfg(cfg)
+        with pm.stage("harvest"):
+            posts = get_post_links_from_profile(page, cfg["MAX_POSTS"], log, engine=engine)
+        log.info(f"Scroll timing for {profile_url}: {engine.summary()}")
+        if cfg.get("SNAPSHOT_PAGES"):
+            save_debug(page, "profile", log, screenshot=False)
+        if not posts and fallback:
+            record_variant(cfg, profile_url, profile_url, variant, False)
+            pm.inc(f"{fallback}_fallbacks")
+            with pm.stage("state_fetch"):
+                blobs = embedded.parse_blobs(fetch_state_scripts(cfg, ctx, profile_url, fallback))
+                posts = finalize_post_links(embedded.post_links(blobs, POST_LINK_PATTERNS), cfg["MAX_POSTS"])
+            if not posts:
+                log.info(f"No post links; retrying profile with {fallback} UA fallback.")
+                ctx.close()
+                return crawl_profile(cfg, browser, profile_url, log, state=state, cache=cache,
+                                     on_rows=on_rows, variants=variants[1:])
+            log.info(f"Found {len(posts)} post links in {fallback} page state; skipping a second page load.")
+            pm.inc("state_fetch_hits")
+            variant = fallback
 
         if not posts:
+            record_variant(cfg, profile_url, profile_url, variant, False)
             log.warning("No post links found after scroll/parsing; saving snapshot.")
             save_debug(page, "no-post-links", log)
             return []
+        record_variant(cfg, profile_url, profile_url, variant, True)
 
         log.info("Found post links:\n" + "\n".join(posts))
         for p in posts:
             jitter_sleep(0.6, 1.2)
-            _, rows = crawl_single_url(cfg, browser, p, log)
+            _, rows = crawl_single_url(cfg, browser, p, log, state=state, cache=cache, profile=profile_url,
+                                       on_rows=on_rows)
             posts_all.extend(rows)
         return posts_all
     finally:
+        pm.close(kind="profile", posts=len(posts), variant=variant)
         ctx.close()
 
 
@@ -557,28 +1011,112 @@ def main():
     parser.add_argument("--single-url", help="Single post URL")
     parser.add_argument("--max-posts", type=int, default=cfg["MAX_POSTS"])
     parser.add_argument("--headful", action="store_true", help="Run with browser UI (debug)")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Crawl profile posts in parallel (async context pool)")
+    parser.add_argument("--pool-size", type=int, default=cfg["POOL_SIZE"],
+                        help="Browser contexts in the concurrent pool")
+    parser.add_argument("--per-host", type=int, default=cfg["PER_HOST_LIMIT"],
+                        help="Max concurrent pages per host")
+    parser.add_argument("--rate", type=float, default=cfg["RATE_LIMIT_RPS"],
+                        help="Global page loads per second (0 = unlimited)")
+    parser.add_argument("--incremental", action="store_true", default=cfg["INCREMENTAL"],
+                        help="Skip unchanged posts and only store new comments")
+    parser.add_argument("--resources", choices=list(RESOURCE_PRESETS), default=cfg["RESOURCE_POLICY"],
+                        help="Request blocking preset (extract-only skips images/fonts/media/analytics)")
+    parser.add_argument("--snapshot", action="store_true", default=cfg["SNAPSHOT_PAGES"],
+                        help="Save every crawled page to debug/ for offline replay")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="Serve pages from snapshots in DIR instead of the network")
+    parser.add_argument("--metrics", default=cfg["METRICS_FILE"],
+                        help="Append per-post/run timings and counters as JSON lines to this file")
+    parser.add_argument("--prom", default=cfg["PROM_FILE"],
+                        help="Write Prometheus text-format metrics to this file")
+    parser.add_argument("--daemon", metavar="PROFILES_FILE",
+                        help="Keep one browser running and crawl every profile in the file on a schedule")
+    parser.add_argument("--workers", type=int, default=cfg["DAEMON_WORKERS"],
+                        help="Profiles crawled at once in daemon mode")
+    parser.add_argument("--max-rss-mb", type=float, default=cfg["MAX_BROWSER_RSS_MB"],
+                        help="Restart the daemon's browser when this process tree's RSS "
+                             "(driver + Chromium included) passes this (0 = never)")
+    parser.add_argument("--status-file", default=cfg["DAEMON_STATUS_FILE"],
+                        help="Write daemon queue depth/lag/memory as JSON to this file")
     args = parser.parse_args()
 
-    if not args.profile_url and not args.single_url:
-        log.error("Provide --profile-url or --single-url (or set PROFILE_URL in .env).")
+    if not args.profile_url and not args.single_url and not args.daemon:
+        log.error("Provide --profile-url, --single-url or --daemon (or set PROFILE_URL in .env).")
         sys.exit(3)
 
     cfg["MAX_POSTS"] = args.max_posts
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not args.headful)
-        conn = connect(cfg["DB_PATH"])
-        try:
-            if args.single_url:
-                _, rows = crawl_single_url(cfg, browser, args.single_url, log)
-                upsert_comments(conn, rows)
-                log.info(f"Saved {len(rows)} comments from single URL.")
-            else:
-                rows = crawl_profile(cfg, browser, args.profile_url, log)
-                upsert_comments(conn, rows)
-                log.info(f"Saved {len(rows)} comments from profile crawl.")
-        finally:
-            browser.close()
+    cfg["POOL_SIZE"] = args.pool_size
+    cfg["PER_HOST_LIMIT"] = args.per_host
+    cfg["RATE_LIMIT_RPS"] = args.rate
+    cfg["SNAPSHOT_PAGES"] = args.snapshot
+    cfg["RESOURCE_POLICY"] = args.resources
+    cfg["METRICS_FILE"] = args.metrics
+    cfg["PROM_FILE"] = args.prom
+    get_rule_engine(cfg, log)  # fail fast on a bad RULES_FILE
+    replay = ReplayStore(args.replay) if args.replay else None
+    if replay is not None:
+        log.info(f"Replaying {len(replay)} snapshots from {args.replay}; network disabled.")
+        cfg["STATE_FETCH"] = False  # context.request bypasses the replay routes
+
+    conn = connect(cfg["DB_PATH"])
+    tune(conn)
+    if cfg["REPORT_AGGREGATES"]:
+        import l8_report
+        l8_report.install(conn, log)
+    state = CrawlState(conn) if args.incremental else None
+    cache = ScoreCache(conn, cfg["SCORE_CACHE_SIZE"]) if cfg["SCORE_CACHE"] else None
+    writer = writer_from_cfg(cfg, log)
+    try:
+        if args.daemon:
+            import l8_daemon
+            cfg["DAEMON_WORKERS"] = args.workers
+            cfg["MAX_BROWSER_RSS_MB"] = args.max_rss_mb
+            cfg["DAEMON_STATUS_FILE"] = args.status_file
+            l8_daemon.run_daemon(
+                cfg, args.daemon, log, on_rows=writer,
+                headless=not args.headful, state=state, cache=cache, replay=replay,
+            )
+        elif args.concurrent and not args.single_url:
+            import asyncio
+            import l8_async
+            saved = asyncio.run(l8_async.run_profile(
+                cfg, args.profile_url, log, on_rows=writer,
+                headless=not args.headful, state=state, cache=cache, replay=replay,
+            ))
+            log.info(f"Crawled {saved} comments from concurrent profile crawl.")
+        else:
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=not args.headful)
+                if replay is not None:
+                    browser = ReplayBrowser(browser, replay)
+                try:
+                    if args.single_url:
+                        crawl_single_url(cfg, browser, args.single_url, log, state=state, cache=cache,
+                                         on_rows=writer)
+                        log.info(f"Crawled single URL {args.single_url}.")
+                    else:
+                        crawl_profile(cfg, browser, args.profile_url, log, state=state, cache=cache,
+                                      on_rows=writer)
+                finally:
+                    browser.close()
+    finally:
+        writer.close()
+        log.info(f"Saved {writer.rows_written} comments: {writer.summary()}")
+        get_metrics(cfg).close(writer=writer.summary(), requests=resource_policy(cfg).summary())
+    log_run_stats(cfg, log, cache)
+
+
+def log_run_stats(cfg, log, cache=None):
+    log.info(f"Requests: {resource_policy(cfg).summary()}")
+    if cfg["USE_DETOX"]:
+        log.info(f"Detoxify throughput: {get_scorer(cfg).stats.summary()}")
+    if cache is not None:
+        log.info(f"Score cache: {cache.summary()}")
+    engine = get_rule_engine(cfg)
+    if engine is not None:
+        log.info(f"Rule hits: {engine.summary()}")
 
 
 if __name__ == "__main__":
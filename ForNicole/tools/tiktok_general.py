@@ -2,9 +2,12 @@ import os
 import random
 import asyncio
 from datetime import datetime
-from collections import Counter, defaultdict
+from collections import OrderedDict, deque
 
-import pandas as pd
+from tt_pipeline import EventPipeline, LiveEvent
+from tt_rates import ActivityRates
+from tt_sinks import EventLog, make_sinks
+from tt_sketch import CountMinSketch, SpaceSaving
 
 # ---------- CONFIGURATION ----------
 API_KEYS = [
@@ -18,6 +21,23 @@ os.environ["EULERSTREAM_API_KEY"] = selected_key
 UNIQUE_ID = "aznboi_"    # Change to desired username
 SAVE_TO_CSV = True       # Set to True to export logs
 CSV_FILE = "tiktok_live_events.csv"
+# Extra outputs, comma-separated kind:path (csv / jsonl / sqlite), e.g. "jsonl:tiktok_live_events.jsonl"
+LOG_SINKS = os.getenv("LOG_SINKS", "")
+LOG_BATCH = 200          # events per write
+LOG_INTERVAL_S = 1.0     # max seconds an event waits in the buffer
+# Memory caps for long streams (see tt_sketch.py for the error bounds)
+EVENT_LOG_MAX = 5000     # recent events kept in memory; the sinks have the full log
+TOP_USERS = 10000        # users tracked exactly for top-K and engagement records
+TOP_WORDS = 2000         # keywords tracked for trending
+SKETCH_EPSILON = 0.0005  # engagement upper bounds over-count by <= 0.05% of events...
+SKETCH_DELTA = 0.01      # ...with 99% probability
+# Chat spike = 10 s comment rate above the stream's EWMA baseline + SPIKE_Z std devs (see tt_rates.py)
+SPIKE_Z = 3.0
+SPIKE_MIN_PER_MIN = 25   # never alert below this many comments per minute
+# Ingestion queue between client handlers and analytics/logging (see tt_pipeline.py)
+QUEUE_MAX = 10000        # events buffered before the policy kicks in
+QUEUE_WORKERS = 1        # consumer tasks; >1 only helps async handlers that await I/O
+QUEUE_POLICY = "drop_oldest"   # or "drop_newest", "block" (backpressure onto the client)
 
 # ---------- INITIALIZATION ----------
 from TikTokLive import TikTokLiveClient
@@ -28,28 +48,65 @@ from TikTokLive.events import (
 # --- For text analytics & simple predictions ---
 import re
 
-class LiveAnalytics:
+def open_event_log():
+    # CSV_FILE plus LOG_SINKS, written in batches off the event loop (see tt_sinks.py)
+    spec = ",".join(s for s in (f"csv:{CSV_FILE}" if SAVE_TO_CSV else "", LOG_SINKS) if s)
+    sinks = make_sinks(spec)
+    return EventLog(sinks, LOG_BATCH, LOG_INTERVAL_S) if sinks else None
+
+class Engagement:
+    __slots__ = ("comments", "gifts", "likes", "shares")
+
     def __init__(self):
+        self.comments = self.gifts = self.likes = self.shares = 0
+
+    def __getitem__(self, event_type):
+        return getattr(self, event_type)
+
+class LiveAnalytics:
+    def __init__(self, sink=None, room=None):
+        self.sink = sink
+        self.room = room         # unique_id, set when several rooms share the sinks
         self.chat_counter = 0
-        self.event_log = []
-        self.user_counts = Counter()
-        self.word_counts = Counter()
-        self.engagement = defaultdict(lambda: {"comments": 0, "gifts": 0, "likes": 0, "shares": 0})
-        self.last_minute_comments = []
+        self.event_log = deque(maxlen=EVENT_LOG_MAX)
+        # bounded top-K counters: memory stays flat however long the stream runs
+        self.user_counts = SpaceSaving(TOP_USERS)
+        self.word_counts = SpaceSaving(TOP_WORDS)
+        self.engagement = {}     # user -> Engagement, only for users tracked in user_counts
+        self.parked = OrderedDict()   # evicted user -> their Engagement, restored if they come back (LRU, TOP_USERS)
+        self.engagement_sketch = CountMinSketch(SKETCH_EPSILON, SKETCH_DELTA)   # "type:user" -> count
+        # per-type 10 s / 60 s / 5 min rates on the monotonic clock
+        self.rates = ActivityRates(z=SPIKE_Z, min_per_min=SPIKE_MIN_PER_MIN)
 
     def log_event(self, event_type, user, message):
         now = datetime.utcnow().isoformat()
-        self.event_log.append({"time": now, "event": event_type, "user": user, "message": message})
-        if SAVE_TO_CSV:
-            pd.DataFrame([self.event_log[-1]]).to_csv(CSV_FILE, mode="a", header=not os.path.exists(CSV_FILE), index=False)
+        record = {"time": now, "event": event_type, "user": user, "message": message}
+        if self.room is not None:
+            record["room"] = self.room
+        self.event_log.append(record)
+        if self.sink is not None:
+            self.sink.append(self.event_log[-1])  # buffered; never blocks the handler
 
     def update_analytics(self, event_type, user, message=None):
-        self.engagement[user][event_type] += 1
-        self.user_counts[user] += 1
+        evicted = self.user_counts.add(user)
+        if evicted is not None:
+            old = self.engagement.pop(evicted, None)
+            if old is not None:
+                self.parked[evicted] = old
+                if len(self.parked) > TOP_USERS:
+                    self.parked.popitem(last=False)
+        rec = self.engagement.get(user)
+        if rec is None:
+            # a user re-entering the top-K resumes their exact counts from before the
+            # eviction; anyone else starts at 0 (sketch estimates carry collision noise)
+            rec = self.engagement[user] = self.parked.pop(user, None) or Engagement()
+        if event_type in Engagement.__slots__:
+            setattr(rec, event_type, rec[event_type] + 1)
+        self.engagement_sketch.add(f"{event_type}:{user}")
+        self.rates.add(event_type)
         if event_type == "comments" and message:
             words = re.findall(r"\w+", message.lower())
             self.word_counts.update(words)
-            self.last_minute_comments.append(datetime.utcnow())
 
     def trending_keywords(self, topn=5):
         return self.word_counts.most_common(topn)
@@ -57,89 +114,134 @@ class LiveAnalytics:
     def most_active_users(self, topn=5):
         return self.user_counts.most_common(topn)
 
-    def engagement_score(self, user):
-        data = self.engagement[user]
+    @staticmethod
+    def _weighted(data):
         # Weighted engagement (customize as needed)
         return data["comments"] + 2 * data["gifts"] + 0.5 * data["likes"] + data["shares"]
 
+    def engagement_score(self, user):
+        # exact counts while tracked (or parked after an eviction); events seen while
+        # untracked are missing, so this is a lower bound -- see engagement_upper_bound
+        data = self.engagement.get(user) or self.parked.get(user)
+        return self._weighted(data) if data is not None else 0
+
+    def engagement_upper_bound(self, user):
+        # Count-Min estimate: never low, but over-counts by up to epsilon * N per type
+        return self._weighted({t: self.engagement_sketch.estimate(f"{t}:{user}") for t in Engagement.__slots__})
+
+    def activity_rates(self):
+        # {"comments": {"10s": per-second rate, "60s": ..., "300s": ..., "baseline": ..., "threshold": ...}, ...}
+        return self.rates.snapshot()
+
     def recent_activity_spike(self):
-        # Detect spikes in chat within last 60s
-        now = datetime.utcnow()
-        self.last_minute_comments = [t for t in self.last_minute_comments if (now - t).total_seconds() < 60]
-        return len(self.last_minute_comments) > 25   # Threshold for "spike" (customize as needed)
+        # Detect spikes in chat: O(1), adaptive to the stream's normal chat rate
+        return self.rates["comments"].spike()
 
 analytics = LiveAnalytics()
 
-# ---------- MAIN SCRIPT ----------
-async def main():
-    client = TikTokLiveClient(unique_id=UNIQUE_ID)
-    print(f"Using API key: {selected_key[:8]}... Monitoring: @{UNIQUE_ID}")
-
+# ---------- EVENT HANDLING (queue consumers) ----------
+# event kind -> (analytics bucket or None, printed line)
+EVENT_ACTIONS = {
+    "comment": ("comments", "[COMMENT] {nick}: {text}"),
+    "gift": ("gifts", "[GIFT] {nick} sent a gift: {text}"),
+    "like": ("likes", "[LIKE] {nick} liked the stream."),
+    "share": ("shares", "[SHARE] {nick} shared the stream."),
+    "follow": (None, "[FOLLOW] {nick} followed the streamer."),
+    "envelope": (None, "[ENVELOPE] {nick} triggered a red envelope event."),
+}
+
+def make_handler(analytics, echo=True):
+    # One handler per room: tt_supervisor.py builds one for each room's LiveAnalytics
+    prefix = f"[@{analytics.room}] " if analytics.room else ""
+
+    def handle_event(ev: LiveEvent):
+        bucket, line = EVENT_ACTIONS[ev.kind]
+        analytics.log_event(ev.kind, ev.user, ev.text)
+        if bucket:
+            analytics.update_analytics(bucket, ev.user, ev.text if ev.kind == "comment" else None)
+        if echo:
+            print(prefix + line.format(nick=ev.nickname, text=ev.text))
+
+        if ev.kind == "comment":
+            # Respond to !command
+            if ev.text and ev.text.startswith("!"):
+                # Here you can integrate GPT/LLM or custom responses
+                print(f"{prefix}>>> Command received: {ev.text}")
+                # await client.send_message("Your reply here") # Uncomment if you want to auto-respond
+
+            # Notify on viral spike
+            if analytics.recent_activity_spike():
+                print(f"{prefix}[ALERT] 🔥 Viral chat spike detected! Analyze or respond accordingly.")
+
+    return handle_event
+
+handle_event = make_handler(analytics)
+
+def add_listeners(client, pipeline):
+    # Handlers only enqueue a compact record; the pipeline workers do the rest.
     # --- Comment Listener ---
     @client.on(CommentEvent)
     async def on_comment(event: CommentEvent):
-        analytics.log_event("comment", event.user.unique_id, event.comment)
-        analytics.update_analytics("comments", event.user.unique_id, event.comment)
-        print(f"[COMMENT] {event.user.nickname}: {event.comment}")
-
-        # Respond to !command
-        if event.comment.startswith("!"):
-            # Here you can integrate GPT/LLM or custom responses
-            print(f">>> Command received: {event.comment}")
-            # await client.send_message("Your reply here") # Uncomment if you want to auto-respond
-
-        # Notify on viral spike
-        if analytics.recent_activity_spike():
-            print("[ALERT] 🔥 Viral chat spike detected! Analyze or respond accordingly.")
+        await pipeline.put(LiveEvent("comment", event.user.unique_id, event.user.nickname, event.comment))
 
     # --- Gift Listener ---
     @client.on(GiftEvent)
     async def on_gift(event: GiftEvent):
-        analytics.log_event("gift", event.user.unique_id, event.gift.describe())
-        analytics.update_analytics("gifts", event.user.unique_id)
-        print(f"[GIFT] {event.user.nickname} sent a gift: {event.gift.describe()}")
+        await pipeline.put(LiveEvent("gift", event.user.unique_id, event.user.nickname, event.gift.describe()))
 
     # --- Like Listener ---
     @client.on(LikeEvent)
     async def on_like(event: LikeEvent):
-        analytics.log_event("like", event.user.unique_id, None)
-        analytics.update_analytics("likes", event.user.unique_id)
-        print(f"[LIKE] {event.user.nickname} liked the stream.")
+        await pipeline.put(LiveEvent("like", event.user.unique_id, event.user.nickname))
 
     # --- Share Listener ---
     @client.on(ShareEvent)
     async def on_share(event: ShareEvent):
-        analytics.log_event("share", event.user.unique_id, None)
-        analytics.update_analytics("shares", event.user.unique_id)
-        print(f"[SHARE] {event.user.nickname} shared the stream.")
+        await pipeline.put(LiveEvent("share", event.user.unique_id, event.user.nickname))
 
     # --- Follow Listener ---
     @client.on(FollowEvent)
     async def on_follow(event: FollowEvent):
-        analytics.log_event("follow", event.user.unique_id, None)
-        print(f"[FOLLOW] {event.user.nickname} followed the streamer.")
+        await pipeline.put(LiveEvent("follow", event.user.unique_id, event.user.nickname))
 
     # --- Envelope/Other Events (advanced) ---
     @client.on(EnvelopeEvent)
     async def on_envelope(event: EnvelopeEvent):
-        analytics.log_event("envelope", event.user.unique_id, "Red envelope event")
-        print(f"[ENVELOPE] {event.user.nickname} triggered a red envelope event.")
+        await pipeline.put(LiveEvent("envelope", event.user.unique_id, event.user.nickname, "Red envelope event"))
 
     # --- (Optional) Add more event handlers as needed ---
 
+def print_summary(analytics):
+    print("\n--- TikTokLive Analytics Summary" + (f" @{analytics.room}" if analytics.room else "") + " ---")
+    print(f"Top Users: {analytics.most_active_users()}")
+    print(f"Trending Keywords: {analytics.trending_keywords()}")
+    print("Engagement Scores:")
+    for user, _ in analytics.most_active_users():
+        print(f"  {user}: {analytics.engagement_score(user)} (<= {analytics.engagement_upper_bound(user)})")
+    print(f"Activity rates (events/s): {analytics.activity_rates()}")
+
+# ---------- MAIN SCRIPT ----------
+async def main():
+    analytics.sink = open_event_log()
+    pipeline = EventPipeline(handle_event, QUEUE_WORKERS, QUEUE_MAX, QUEUE_POLICY).start()
+    client = TikTokLiveClient(unique_id=UNIQUE_ID)
+    print(f"Using API key: {selected_key[:8]}... Monitoring: @{UNIQUE_ID}")
+
+    add_listeners(client, pipeline)
+
     # --- Main run loop ---
     try:
         await client.start()
     except Exception as e:
         print(f"[ERROR] {e}")
     finally:
+        await pipeline.close()
         # On shutdown, show summary analytics
-        print("\n--- TikTokLive Analytics Summary ---")
-        print(f"Top Users: {analytics.most_active_users()}")
-        print(f"Trending Keywords: {analytics.trending_keywords()}")
-        print("Engagement Scores:")
-        for user, _ in analytics.most_active_users():
-            print(f"  {user}: {analytics.engagement_score(user)}")
+        print_summary(analytics)
+        if analytics.sink is not None:
+            analytics.sink.close()
+            print(f"Event log: {analytics.sink.summary()}")
+        print(f"Ingestion queue: {pipeline.stats()}")
         print("Goodbye.")
 
 # ---------- RUN ----------
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Ingestion queue between TikTokLive event handlers and the work done per event.
+
+Handlers only build a compact ``LiveEvent`` and ``await pipeline.put(ev)``;
+``workers`` consumer tasks (one by default) take events off a bounded
+``asyncio.Queue`` and run the handler (analytics, logging, commands,
+alerts).  When the queue is full the policy decides:
+
+    drop_oldest  discard the oldest queued event (default: fresh events matter more)
+    drop_newest  discard the incoming event
+    block        wait for room (backpressure onto the client's event dispatch)
+
+Workers run on the event loop, so a sync handler runs inline: with the
+CPU-light handlers in tiktok_general.py a second worker only adds task
+switches, hence one consumer by default.  More workers pay off only for
+async handlers that await I/O (e.g. a chat reply or an HTTP call), which
+the workers overlap; slow sync work belongs in ``loop.run_in_executor``
+inside such a handler.
+
+``stats()`` reports queue depth (current and max), drops, handler errors
+and queueing lag (enqueue -> start of handling, on the monotonic clock).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+class LiveEvent:
+    __slots__ = ("kind", "user", "nickname", "text", "t")
+
+    def __init__(self, kind: str, user: str, nickname: Optional[str] = None, text: Optional[str] = None):
+        self.kind = kind
+        self.user = user
+        self.nickname = nickname
+        self.text = text
+        self.t = time.monotonic()
+
+
+Handler = Callable[[LiveEvent], Union[None, Awaitable[None]]]
+
+
+class EventPipeline:
+    def __init__(self, handler: Handler, workers: int = 1, maxsize: int = 10000, policy: str = "drop_oldest"):
+        if policy not in POLICIES:
+            raise ValueError(f"queue policy must be one of {', '.join(POLICIES)}, not {policy!r}")
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.lag_max_s = 0.0
+        self.lag_sum_s = 0.0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def put(self, ev: LiveEvent):
+        q = self.queue
+        if q.full():
+            if self.policy == "drop_newest":
+                self.dropped += 1
+                return
+            if self.policy == "drop_oldest":
+                try:
+                    q.get_nowait()
+                    q.task_done()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+        if self.policy == "block":
+            await q.put(ev)
+        else:
+            q.put_nowait(ev)
+        self.enqueued += 1
+        depth = q.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    async def _worker(self):
+        q = self.queue
+        while True:
+            ev = await q.get()
+            try:
+                lag = time.monotonic() - ev.t
+                self.lag_sum_s += lag
+                if lag > self.lag_max_s:
+                    self.lag_max_s = lag
+                res = self.handler(ev)
+                if asyncio.iscoroutine(res):
+                    await res
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[PIPELINE] {ev.kind} handler failed: {e}")
+            finally:
+                q.task_done()
+
+    async def close(self, timeout: float = 5.0):
+        """Let the workers drain what's queued (up to `timeout`), then stop them."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        handled = self.processed + self.errors
+        return {
+            "depth": self.queue.qsize(), "max_depth": self.max_depth,
+            "enqueued": self.enqueued, "processed": self.processed,
+            "dropped": self.dropped, "errors": self.errors,
+            "lag_avg_ms": round(1000 * self.lag_sum_s / handled, 2) if handled else None,
+            "lag_max_ms": round(1000 * self.lag_max_s, 2),
+        }
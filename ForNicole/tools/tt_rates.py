@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Sliding-window event rates for the TikTok LIVE monitor.
+
+``RateWindow`` keeps one counter per second in a ring sized to the
+longest window (5 min by default) on the monotonic clock, plus a running
+sum for each window (10 s, 60 s, 5 min).  ``add`` and ``count``/``rate``
+are O(1); moving the clock forward costs one step per elapsed second
+(capped at the ring size after an idle gap), not per stored event.
+
+Every second that leaves the shortest window also updates an EWMA
+baseline (mean and variance of events per second).  ``spike()`` compares
+the short window's rate against ``baseline + z * stddev``, so the
+threshold follows each stream's normal level instead of a fixed count and
+isn't raised by the burst it is measuring; it stays off until
+``warmup_s`` seconds have been seen and below ``min_per_min``.
+"""
+import math
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+WINDOWS = (10, 60, 300)
+
+
+class RateWindow:
+    __slots__ = ("windows", "size", "clock", "alpha", "z", "warmup_s", "min_per_min",
+                 "_counts", "_sums", "_now", "mean", "var", "seen_s")
+
+    def __init__(self, windows: Tuple[int, ...] = WINDOWS, alpha: float = 0.02, z: float = 3.0,
+                 warmup_s: int = 60, min_per_min: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        self.windows = tuple(sorted(set(int(w) for w in windows)))
+        self.size = self.windows[-1] + 1
+        self.clock = clock
+        self.alpha = alpha
+        self.z = z
+        self.warmup_s = warmup_s
+        self.min_per_min = min_per_min
+        self._counts = array("q", bytes(8 * self.size))
+        self._sums: Dict[int, int] = {w: 0 for w in self.windows}
+        self._now = int(clock())
+        self.mean = 0.0      # EWMA of events per closed second
+        self.var = 0.0
+        self.seen_s = 0
+
+    def _advance(self, t: int):
+        if t <= self._now:
+            return
+        counts, size = self._counts, self.size
+        short = self.windows[0]
+        if t - self._now >= size:
+            # idle longer than the ring: the baseline still sees the last short window and the quiet seconds
+            for s in range(self._now - short + 1, self._now + 1):
+                self._observe(counts[s % size])
+            for _ in range(min(t - self._now - short, 4 * size)):
+                self._observe(0)
+            for i in range(size):
+                counts[i] = 0
+            for w in self.windows:
+                self._sums[w] = 0
+            self._now = t
+            return
+        for s in range(self._now + 1, t + 1):
+            # the baseline lags the short window, so a spike in progress doesn't raise its own bar
+            self._observe(counts[(s - short) % size])
+            for w in self.windows:
+                self._sums[w] -= counts[(s - w) % size]  # second s-w leaves window w
+            counts[s % size] = 0
+        self._now = t
+
+    def _observe(self, v: int):
+        d = v - self.mean
+        self.mean += self.alpha * d
+        self.var = (1 - self.alpha) * (self.var + self.alpha * d * d)
+        self.seen_s += 1
+
+    def add(self, n: int = 1):
+        self._advance(int(self.clock()))
+        self._counts[self._now % self.size] += n
+        for w in self.windows:
+            self._sums[w] += n
+
+    def count(self, window: int) -> int:
+        self._advance(int(self.clock()))
+        return self._sums[window]
+
+    def rate(self, window: int) -> float:
+        """Events per second over the last `window` seconds."""
+        return self.count(window) / window
+
+    def threshold(self) -> float:
+        """Per-second rate above which the short window counts as a spike."""
+        return self.mean + self.z * math.sqrt(self.var)
+
+    def spike(self, window: Optional[int] = None) -> bool:
+        window = window or self.windows[0]
+        r = self.rate(window)
+        if self.seen_s < self.warmup_s or r * 60 < self.min_per_min:
+            return False
+        return r > self.threshold()
+
+    def snapshot(self) -> Dict[str, float]:
+        out = {f"{w}s": round(self.rate(w), 3) for w in self.windows}
+        out["baseline"] = round(self.mean, 3)
+        out["threshold"] = round(self.threshold(), 3)
+        return out
+
+
+class ActivityRates:
+    """One RateWindow per event type ("comments", "likes", "gifts", ...), created on first use."""
+
+    def __init__(self, types: Iterable[str] = ("comments", "likes", "gifts", "shares"), **kw):
+        self._kw = kw
+        self.by_type: Dict[str, RateWindow] = {t: RateWindow(**kw) for t in types}
+
+    def __getitem__(self, event_type: str) -> RateWindow:
+        rw = self.by_type.get(event_type)
+        if rw is None:
+            rw = self.by_type[event_type] = RateWindow(**self._kw)
+        return rw
+
+    def add(self, event_type: str, n: int = 1):
+        self[event_type].add(n)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {t: rw.snapshot() for t, rw in self.by_type.items()}
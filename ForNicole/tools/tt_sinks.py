@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Buffered event log for the TikTok LIVE monitor.
+
+``EventLog.append`` only pushes a record onto an in-memory ring buffer
+(a bounded deque), so event handlers never touch the disk.  A background
+thread drains the buffer in batches, when ``batch_size`` records are
+waiting or ``interval_s`` has passed, and hands each batch to every sink.
+Sinks keep their file/connection open for the whole run:
+
+    csv:tiktok_live_events.csv     CsvSink    (header written once, for a new/empty file)
+    jsonl:tiktok_live_events.jsonl JsonlSink
+    sqlite:tiktok_live.sqlite      SqliteSink (one executemany + commit per batch, WAL)
+
+If the writer falls ``capacity`` records behind, the oldest buffered
+records are dropped and counted in ``dropped`` instead of blocking the
+event loop.  ``close`` flushes whatever is buffered; the flush thread
+closes the sinks itself after its last write, so a ``close`` that times
+out never closes a sink under a write in progress.
+"""
+import csv
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+FIELDS = ("time", "event", "user", "message")
+ROOM_FIELDS = FIELDS + ("room",)   # several rooms sharing the sinks (tt_supervisor.py)
+
+
+class CsvSink:
+    def __init__(self, path: str, fields: Sequence[str] = FIELDS):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._fh = open(path, "a", newline="", encoding="utf-8")
+        self._w = csv.DictWriter(self._fh, fieldnames=list(fields), extrasaction="ignore")
+        if new:
+            self._w.writeheader()
+
+    def write(self, records: List[Dict[str, Any]]):
+        self._w.writerows(records)
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+
+class JsonlSink:
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def write(self, records: List[Dict[str, Any]]):
+        self._fh.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records))
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+
+class SqliteSink:
+    def __init__(self, path: str, table: str = "live_events", fields: Sequence[str] = FIELDS):
+        self.path = path
+        self.fields = list(fields)
+        # opened on the writer thread's first write: sqlite connections are per-thread
+        self._conn: Optional[sqlite3.Connection] = None
+        self._table = table
+        self._sql = (f'INSERT INTO "{table}" ({", ".join(self.fields)}) '
+                     f'VALUES ({", ".join("?" for _ in self.fields)})')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        cols = ", ".join(f"{f} TEXT" for f in self.fields)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{self._table}" ({cols})')
+        conn.commit()
+        return conn
+
+    def write(self, records: List[Dict[str, Any]]):
+        if self._conn is None:
+            self._conn = self._connect()
+        with self._conn:
+            self._conn.executemany(self._sql, [tuple(r.get(f) for f in self.fields) for r in records])
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+SINKS = {"csv": CsvSink, "jsonl": JsonlSink, "sqlite": SqliteSink}
+
+
+def make_sinks(spec: str, fields: Sequence[str] = FIELDS, table: str = "live_events") -> List[Any]:
+    """'csv:events.csv,jsonl:events.jsonl' -> sink objects (unknown kinds raise ValueError)."""
+    out = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        kind, _, path = part.partition(":")
+        if kind not in SINKS or not path:
+            raise ValueError(f"bad log sink {part!r} (expected one of {', '.join(SINKS)} as kind:path)")
+        if kind == "csv":
+            out.append(CsvSink(path, fields))
+        elif kind == "sqlite":
+            out.append(SqliteSink(path, table, fields))
+        else:
+            out.append(SINKS[kind](path))
+    return out
+
+
+class EventLog:
+    def __init__(self, sinks: List[Any], batch_size: int = 200, interval_s: float = 1.0,
+                 capacity: int = 50000):
+        self.sinks = sinks
+        self.batch_size = max(1, batch_size)
+        self.interval_s = max(0.05, interval_s)
+        self._buf: deque = deque(maxlen=max(self.batch_size, capacity))
+        self._cond = threading.Condition()
+        self._stop = False
+        self.appended = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="tt-event-log", daemon=True)
+        self._thread.start()
+
+    def append(self, record: Dict[str, Any]):
+        with self._cond:
+            if len(self._buf) == self._buf.maxlen:
+                self.dropped += 1  # deque drops the oldest
+            self._buf.append(record)
+            self.appended += 1
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify()
+
+    def _take(self) -> List[Dict[str, Any]]:
+        # caller holds the lock
+        batch = list(self._buf)
+        self._buf.clear()
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stop and len(self._buf) < self.batch_size:
+                    self._cond.wait(self.interval_s)
+                batch = self._take()
+                stop = self._stop
+            if batch:
+                self._write(batch)
+            if stop:
+                # closed here, after the last write, so a slow close() timeout can't
+                # close a sink under a write still in progress
+                self._close_sinks()
+                return
+
+    def _close_sinks(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception as e:
+                # a broken sink must not stop the others (or the stream)
+                self.errors += 1
+                print(f"[LOG] {type(sink).__name__} write failed: {e}")
+        self.written += len(batch)
+        self.batches += 1
+
+    def close(self, timeout: Optional[float] = 10.0):
+        with self._cond:
+            if self._stop:
+                return
+            self._stop = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"[LOG] event log still flushing after {timeout}s; its thread closes the sinks when done.")
+
+    def summary(self) -> Dict[str, int]:
+        return {"appended": self.appended, "written": self.written, "dropped": self.dropped,
+                "batches": self.batches, "errors": self.errors, "buffered": len(self._buf)}
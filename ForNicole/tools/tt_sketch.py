@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Fixed-memory counters for long TikTok LIVE streams.
+
+``CountMinSketch(epsilon, delta)`` keeps ``depth = ceil(ln(1/delta))`` rows
+of ``width = ceil(e/epsilon)`` counters.  ``estimate(x)`` never
+under-counts, and with probability at least ``1 - delta`` it over-counts
+by at most ``epsilon * N`` (N = total increments so far).  The memory is
+``width * depth`` 64-bit counters, whatever the number of distinct keys.
+
+``SpaceSaving(k)`` tracks at most ``k`` keys for top-K queries
+(``most_common``, same shape as ``Counter.most_common``).  A key that isn't
+tracked replaces the current minimum and inherits its count as ``error``,
+so for every tracked key ``count - error <= true count <= count``.  The
+minimum counter is at most ``N / k``, so any key seen more than ``N / k``
+times is always tracked.  ``add`` returns the evicted key (if any) so
+callers can drop per-key state with it.
+
+    python tt_sketch.py --n 1000000      # check both bounds on a Zipf stream
+"""
+import argparse
+import heapq
+import math
+import random
+from array import array
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class CountMinSketch:
+    __slots__ = ("width", "depth", "total", "_rows")
+
+    def __init__(self, epsilon: float = 0.0005, delta: float = 0.01):
+        self.width = max(1, math.ceil(math.e / epsilon))
+        self.depth = max(1, math.ceil(math.log(1 / delta)))
+        self.total = 0
+        self._rows = [array("q", bytes(8 * self.width)) for _ in range(self.depth)]
+
+    def _cols(self, key: Hashable):
+        # double hashing over the 64-bit str/bytes hash: one hash per key, not per row
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        w = self.width
+        return [(h1 + i * h2) % w for i in range(self.depth)]
+
+    def add(self, key: Hashable, n: int = 1) -> int:
+        """Adds `n` and returns the new estimate."""
+        self.total += n
+        est = None
+        for row, c in zip(self._rows, self._cols(key)):
+            v = row[c] + n
+            row[c] = v
+            est = v if est is None or v < est else est
+        return est
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[c] for row, c in zip(self._rows, self._cols(key)))
+
+    def error_bound(self) -> float:
+        """Max over-count (epsilon * N) that holds with probability 1 - delta."""
+        return math.e / self.width * self.total
+
+    def nbytes(self) -> int:
+        return sum(r.itemsize * len(r) for r in self._rows)
+
+
+class SpaceSaving:
+    __slots__ = ("k", "total", "counts", "_heap")
+
+    def __init__(self, k: int = 1000):
+        self.k = max(1, k)
+        self.total = 0
+        self.counts: Dict[Hashable, List[int]] = {}   # key -> [count, error]
+        self._heap: List[Tuple[int, Any]] = []         # (count, key), stale entries skipped lazily
+
+    def add(self, key: Hashable, n: int = 1) -> Optional[Hashable]:
+        self.total += n
+        entry = self.counts.get(key)
+        evicted = None
+        if entry is not None:
+            entry[0] += n
+        elif len(self.counts) < self.k:
+            entry = self.counts[key] = [n, 0]
+        else:
+            while True:
+                cnt, low = heapq.heappop(self._heap)
+                cur = self.counts.get(low)
+                if cur is not None and cur[0] == cnt:
+                    break
+            del self.counts[low]
+            evicted = low
+            entry = self.counts[key] = [cnt + n, cnt]
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.k + 64:
+            self._heap = [(c[0], x) for x, c in self.counts.items()]
+            heapq.heapify(self._heap)
+        return evicted
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __getitem__(self, key: Hashable) -> int:
+        entry = self.counts.get(key)
+        return entry[0] if entry else 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.counts
+
+    def __len__(self):
+        return len(self.counts)
+
+    def error(self, key: Hashable) -> int:
+        entry = self.counts.get(key)
+        return entry[1] if entry else 0
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        items = sorted(((x, c[0]) for x, c in self.counts.items()), key=lambda t: t[1], reverse=True)
+        return items if n is None else items[:n]
+
+
+# ---------- Self-check ----------
+def zipf_stream(n: int, vocab: int, s: float = 1.1, seed: int = 5) -> List[str]:
+    rng = random.Random(seed)
+    weights = [1 / (i ** s) for i in range(1, vocab + 1)]
+    return [f"w{i}" for i in rng.choices(range(vocab), weights=weights, k=n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Count-Min / Space-Saving error bounds on a Zipf stream")
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--vocab", type=int, default=200_000)
+    parser.add_argument("--epsilon", type=float, default=0.0005)
+    parser.add_argument("--delta", type=float, default=0.01)
+    parser.add_argument("--k", type=int, default=1000)
+    args = parser.parse_args()
+
+    stream = zipf_stream(args.n, args.vocab)
+    exact = Counter(stream)
+    cms = CountMinSketch(args.epsilon, args.delta)
+    ss = SpaceSaving(args.k)
+    for x in stream:
+        cms.add(x)
+        ss.add(x)
+
+    bound = cms.error_bound()
+    errs = [cms.estimate(x) - c for x, c in exact.items()]
+    under = sum(e < 0 for e in errs)
+    over = sum(e > bound for e in errs)
+    print(f"count-min {cms.width}x{cms.depth} ({cms.nbytes() // 1024} KiB): max over-count {max(errs)}, "
+          f"bound {bound:.0f}, under-counts {under}, over bound {over}/{len(errs)} "
+          f"({over / len(errs):.4f} <= delta {args.delta})")
+
+    bad = [x for x, (c, e) in ss.counts.items() if not c - e <= exact[x] <= c]
+    missing = [x for x, c in exact.items() if c > args.n / args.k and x not in ss]
+    top = [x for x, _ in exact.most_common(10)]
+    print(f"space-saving k={args.k}: {len(bad)} counts outside [count-error, count], "
+          f"{len(missing)} keys above N/k={args.n / args.k:.0f} untracked, "
+          f"top-10 recall {len(set(top) & {x for x, _ in ss.most_common(10)})}/10")
+    if under or over / len(errs) > args.delta or bad or missing:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Watch many TikTok LIVE rooms from one process.
+
+    python tt_supervisor.py creator_a creator_b creator_c
+    python tt_supervisor.py --rooms-file rooms.txt --quiet --sinks jsonl:rooms.jsonl
+
+Each room is a task on the shared event loop with its own client,
+``LiveAnalytics`` and ``EventPipeline`` (see tiktok_general.py); all rooms
+write to one ``EventLog`` whose records carry a ``room`` column.
+
+A room that can't connect, or whose connection ends, is retried with
+exponential backoff (``--backoff``, doubling up to ``--max-backoff``, with
+jitter); the delay resets once a connection has stayed up for
+``--stable-s``.  Offline creators are polled at ``--offline-poll`` instead.
+
+Connections are signed with keys from ``API_KEYS``: ``KeyPool`` hands out
+the key with the fewest signs in the last minute, holds every key to
+``--key-per-min`` signs per minute (callers wait for a free slot), and
+benches a key for ``--key-cooldown`` seconds after a rate-limit error.
+
+Every ``--health-interval`` seconds one line per room reports its status,
+connects/failures, events, queue depth/drops, comment rate and last error.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import tiktok_general as tg
+from tiktok_general import (
+    API_KEYS, LiveAnalytics, TikTokLiveClient, add_listeners, make_handler, print_summary,
+)
+from tt_pipeline import EventPipeline
+from tt_sinks import ROOM_FIELDS, EventLog, make_sinks
+
+try:
+    from TikTokLive.client.errors import SignatureRateLimitError, UserOfflineError
+except ImportError:  # older TikTokLive releases
+    SignatureRateLimitError = UserOfflineError = None
+
+
+def _is(e: BaseException, cls, name: str) -> bool:
+    return isinstance(e, cls) if cls is not None else type(e).__name__ == name
+
+
+class KeyPool:
+    """Sign-API keys with per-key accounting over a sliding minute."""
+
+    def __init__(self, keys: List[str], per_min: int = 10, cooldown_s: float = 60.0):
+        if not keys:
+            raise ValueError("KeyPool needs at least one API key")
+        self.per_min = max(1, per_min)
+        self.cooldown_s = cooldown_s
+        self._recent: Dict[str, deque] = {k: deque() for k in keys}    # monotonic times of recent signs
+        self._bench_until: Dict[str, float] = {k: 0.0 for k in keys}
+        self.uses: Dict[str, int] = {k: 0 for k in keys}
+        self.limited: Dict[str, int] = {k: 0 for k in keys}
+        self._lock = asyncio.Lock()
+
+    def _expire(self, now: float):
+        for q in self._recent.values():
+            while q and now - q[0] >= 60.0:
+                q.popleft()
+
+    async def acquire(self) -> str:
+        # the lock keeps waiting rooms in FIFO order instead of racing for the next free slot
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                free = [k for k, q in self._recent.items()
+                        if len(q) < self.per_min and self._bench_until[k] <= now]
+                if free:
+                    key = min(free, key=lambda k: len(self._recent[k]))
+                    self._recent[key].append(now)
+                    self.uses[key] += 1
+                    return key
+                # sleep until the earliest slot frees up or a bench ends
+                wake = [q[0] + 60.0 for q in self._recent.values() if q]
+                wake += [t for t in self._bench_until.values() if t > now]
+                await asyncio.sleep(max(0.05, min(wake) - now))
+
+    def rate_limited(self, key: str):
+        self.limited[key] += 1
+        self._bench_until[key] = time.monotonic() + self.cooldown_s
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        self._expire(now)
+        return {k[:8]: {"last_min": len(q), "uses": self.uses[k], "rate_limited": self.limited[k],
+                        "benched_s": round(max(0.0, self._bench_until[k] - now))}
+                for k, q in self._recent.items()}
+
+
+class Room:
+    def __init__(self, unique_id: str, sink: Optional[EventLog], keys: KeyPool, args):
+        self.unique_id = unique_id
+        self.keys = keys
+        self.args = args
+        self.analytics = LiveAnalytics(sink, room=unique_id)
+        self.pipeline = EventPipeline(make_handler(self.analytics, echo=not args.quiet),
+                                      args.workers, args.queue_max, tg.QUEUE_POLICY)
+        self.client = None
+        self.status = "idle"
+        self.connects = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.connected_at: Optional[float] = None
+        self.uptime_s = 0.0
+
+    async def _session(self):
+        key = await self.keys.acquire()
+        self.status = "connecting"
+        self.client = TikTokLiveClient(unique_id=self.unique_id,
+                                       web_kwargs={"signer_kwargs": {"sign_api_key": key}})
+        add_listeners(self.client, self.pipeline)
+        try:
+            task = await self.client.start()
+            self.status = "live"
+            self.connects += 1
+            self.connected_at = time.monotonic()
+            if task is not None:
+                await task
+        except Exception as e:
+            if _is(e, SignatureRateLimitError, "SignatureRateLimitError"):
+                self.keys.rate_limited(key)
+            raise
+        finally:
+            if self.connected_at is not None:
+                self.uptime_s += time.monotonic() - self.connected_at
+            try:
+                await self.client.disconnect()
+            except Exception:
+                pass
+
+    async def run(self):
+        self.pipeline.start()
+        delay = self.args.backoff
+        try:
+            while True:
+                self.connected_at = None
+                try:
+                    await self._session()
+                    self.last_error = None
+                    wait, self.status = delay, "ended"
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = f"{type(e).__name__}: {e}"[:200]
+                    if _is(e, UserOfflineError, "UserOfflineError"):
+                        wait, self.status = self.args.offline_poll, "offline"
+                    else:
+                        wait, self.status = delay, "backoff"
+                if self.connected_at is not None and time.monotonic() - self.connected_at >= self.args.stable_s:
+                    delay = self.args.backoff
+                elif self.status != "offline":
+                    delay = min(delay * 2, self.args.max_backoff)
+                await asyncio.sleep(wait * random.uniform(0.8, 1.2))
+        finally:
+            self.status = "stopped"
+            await self.pipeline.close()
+
+    def health(self) -> Dict[str, Any]:
+        q = self.pipeline.stats()
+        up = self.uptime_s + (time.monotonic() - self.connected_at if self.status == "live" else 0.0)
+        return {"room": self.unique_id, "status": self.status, "connects": self.connects,
+                "failures": self.failures, "uptime_s": round(up), "events": q["processed"],
+                "queue": q["depth"], "dropped": q["dropped"],
+                "comments_per_min": round(self.analytics.rates["comments"].rate(60) * 60, 1),
+                "last_error": self.last_error}
+
+
+class Supervisor:
+    def __init__(self, rooms: List[str], keys: KeyPool, sink: Optional[EventLog], args):
+        self.keys = keys
+        self.sink = sink
+        self.args = args
+        self.rooms = [Room(r, sink, keys, args) for r in dict.fromkeys(rooms)]
+
+    def report(self):
+        print(f"\n--- Rooms ({time.strftime('%H:%M:%S')}) ---")
+        for room in self.rooms:
+            h = room.health()
+            print(f"@{h.pop('room')}: " + " ".join(f"{k}={v}" for k, v in h.items() if v is not None))
+        print(f"Keys: {self.keys.stats()}")
+        if self.sink is not None:
+            print(f"Event log: {self.sink.summary()}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.args.health_interval)
+            self.report()
+
+    async def run(self):
+        tasks = [asyncio.create_task(r.run(), name=f"room:{r.unique_id}") for r in self.rooms]
+        health = asyncio.create_task(self._health_loop())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            health.cancel()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(health, *tasks, return_exceptions=True)
+            for room in self.rooms:
+                print_summary(room.analytics)
+            self.report()
+            if self.sink is not None:
+                self.sink.close()
+
+
+def read_rooms(args) -> List[str]:
+    rooms = list(args.rooms)
+    if args.rooms_file:
+        with open(args.rooms_file, encoding="utf-8") as fh:
+            rooms += [ln.strip() for ln in fh if ln.strip() and not ln.lstrip().startswith("#")]
+    rooms += [r.strip() for r in os.getenv("TT_ROOMS", "").split(",") if r.strip()]
+    return [r.lstrip("@") for r in rooms]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor many TikTok LIVE rooms from one process")
+    parser.add_argument("rooms", nargs="*", help="creator unique_ids (also --rooms-file, TT_ROOMS=a,b)")
+    parser.add_argument("--rooms-file", help="one unique_id per line, # comments allowed")
+    parser.add_argument("--sinks", default=os.getenv("LOG_SINKS", "csv:tiktok_rooms_events.csv"),
+                        help="shared event log, comma-separated kind:path (csv / jsonl / sqlite)")
+    parser.add_argument("--quiet", action="store_true", help="don't print every event, only alerts/commands")
+    parser.add_argument("--workers", type=int, default=1, help="queue consumer tasks per room (>1 only helps async handlers)")
+    parser.add_argument("--queue-max", type=int, default=tg.QUEUE_MAX, help="queued events per room")
+    parser.add_argument("--backoff", type=float, default=5.0, help="first reconnect delay (s)")
+    parser.add_argument("--max-backoff", type=float, default=300.0)
+    parser.add_argument("--stable-s", type=float, default=120.0,
+                        help="a connection up this long resets the backoff")
+    parser.add_argument("--offline-poll", type=float, default=120.0, help="recheck offline creators every N s")
+    parser.add_argument("--key-per-min", type=int, default=10, help="sign requests per key per minute")
+    parser.add_argument("--key-cooldown", type=float, default=60.0, help="bench a rate-limited key for N s")
+    parser.add_argument("--health-interval", type=float, default=60.0)
+    args = parser.parse_args()
+
+    rooms = read_rooms(args)
+    if not rooms:
+        parser.error("no rooms given")
+    sinks = make_sinks(args.sinks, ROOM_FIELDS, table="live_room_events")
+    sink = EventLog(sinks, tg.LOG_BATCH, tg.LOG_INTERVAL_S) if sinks else None
+    keys = KeyPool(API_KEYS, args.key_per_min, args.key_cooldown)
+    print(f"Monitoring {len(set(rooms))} rooms with {len(API_KEYS)} API keys.")
+    try:
+        asyncio.run(Supervisor(rooms, keys, sink, args).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()